@@ -0,0 +1,20 @@
+"""
+Backfill export status of expense groups
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.fyle.models import ExpenseGroup
+
+
+class Command(BaseCommand):
+    """
+    Set export_status / exported_object_type of expense groups from their exported QBO objects
+    """
+    help = 'Backfill export status of expense groups from their exported QBO objects'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            exported_count = ExpenseGroup.backfill_export_status()
+
+        self.stdout.write('Expense groups marked exported: {0}'.format(exported_count))
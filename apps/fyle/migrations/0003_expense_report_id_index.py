@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fyle', '0002_auto_20200420_0434'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='expense',
+            name='report_id',
+            field=models.CharField(db_index=True, help_text='Report ID', max_length=255),
+        ),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations, models
+
+EXPORTED_OBJECT_TYPES = {
+    'bill': 'BILL',
+    'cheque': 'CHECK',
+    'creditcardpurchase': 'CREDIT CARD PURCHASE',
+    'journalentry': 'JOURNAL ENTRY'
+}
+
+
+def backfill_export_status(apps, schema_editor):
+    """
+    Mark expense groups with an exported QBO object exported
+    """
+    expense_group_model = apps.get_model('fyle', 'ExpenseGroup')
+
+    for related_name, exported_object_type in EXPORTED_OBJECT_TYPES.items():
+        expense_group_model.objects.filter(**{
+            '{0}__export_state'.format(related_name): 'EXPORTED'
+        }).update(export_status='EXPORTED', exported_object_type=exported_object_type)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fyle', '0003_expense_report_id_index'),
+        ('quickbooks_online', '0004_export_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expensegroup',
+            name='export_status',
+            field=models.CharField(default='READY', help_text='Export status - READY / EXPORTED', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='expensegroup',
+            name='exported_object_type',
+            field=models.CharField(
+                help_text='Exported QBO object - BILL / CHECK / CREDIT CARD PURCHASE / JOURNAL ENTRY',
+                max_length=255, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='expensegroup',
+            index=models.Index(fields=['workspace', 'export_status', 'updated_at'], name='expense_group_export_idx'),
+        ),
+        migrations.RunPython(backfill_export_status, migrations.RunPython.noop),
+    ]
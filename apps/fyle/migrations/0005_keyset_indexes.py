@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fyle', '0004_expense_group_export_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expensegroup',
+            index=models.Index(fields=['workspace', 'updated_at', 'id'], name='expense_group_keyset_idx'),
+        ),
+    ]
@@ -1,14 +1,74 @@
 """
 Fyle Models
 """
-from itertools import groupby
-from typing import List, Dict
+from datetime import datetime
+from typing import List, Dict, Set, Tuple
 
+from django.conf import settings
 from django.db import models
 from django.contrib.postgres.fields import JSONField
+from django.utils.dateparse import parse_datetime
 from fyle_accounting_mappings.models import MappingSetting
 
 from apps.workspaces.models import Workspace, WorkspaceGeneralSettings
+from fyle_qbo_api.utils import bulk_upsert, chunk_list
+
+
+EXPORTED_OBJECT_TYPES = {
+    'bill': 'BILL',
+    'cheque': 'CHECK',
+    'creditcardpurchase': 'CREDIT CARD PURCHASE',
+    'journalentry': 'JOURNAL ENTRY'
+}
+
+UPSERT_COUNT_KEYS = {
+    'INSERTED': 'new',
+    'UPDATED': 'changed',
+    'UNCHANGED': 'skipped'
+}
+
+
+def _parse_datetime(value) -> datetime:
+    """
+    Parse a datetime string from fyle
+    :param value: datetime string or datetime
+    :return: datetime
+    """
+    return parse_datetime(value) if isinstance(value, str) else value
+
+
+def _get_expense_row(expense: Dict) -> Dict:
+    """
+    Map a fyle expense to expense table fields
+    :param expense: expense from fyle
+    :return: dict of expense fields
+    """
+    return {
+        'expense_id': expense['id'],
+        'employee_email': expense['employee_email'],
+        'category': expense['category_name'],
+        'sub_category': expense['sub_category'],
+        'project': expense['project_name'],
+        'expense_number': expense['expense_number'],
+        'claim_number': expense['claim_number'],
+        'amount': expense['amount'],
+        'currency': expense['currency'],
+        'foreign_amount': expense['foreign_amount'],
+        'foreign_currency': expense['foreign_currency'],
+        'settlement_id': expense['settlement_id'],
+        'reimbursable': expense['reimbursable'],
+        'exported': expense['exported'],
+        'state': expense['state'],
+        'vendor': expense['vendor'],
+        'cost_center': expense['cost_center_name'],
+        'purpose': expense['purpose'],
+        'report_id': expense['report_id'],
+        'spent_at': expense['spent_at'],
+        'approved_at': expense['approved_at'],
+        'expense_created_at': expense['created_at'],
+        'expense_updated_at': expense['updated_at'],
+        'fund_source': expense['fund_source']
+    }
 
 
 class Expense(models.Model):
@@ -34,7 +94,7 @@ class Expense(models.Model):
     vendor = models.CharField(max_length=255, null=True, blank=True, help_text='Vendor')
     cost_center = models.CharField(max_length=255, null=True, blank=True, help_text='Fyle Expense Cost Center')
     purpose = models.TextField(null=True, blank=True, help_text='Purpose')
-    report_id = models.CharField(max_length=255, help_text='Report ID')
+    report_id = models.CharField(max_length=255, help_text='Report ID', db_index=True)
     spent_at = models.DateTimeField(null=True, help_text='Expense spent at')
     approved_at = models.DateTimeField(null=True, help_text='Expense approved at')
     expense_created_at = models.DateTimeField(help_text='Expense created at')
@@ -48,40 +108,52 @@ class Expense(models.Model):
         """
         Bulk create expense objects
         """
+        expense_objects, _ = Expense.bulk_upsert_expense_objects(expenses)
+
+        return expense_objects
+
+    @staticmethod
+    def bulk_upsert_expense_objects(expenses: List[Dict]) -> Tuple[List['Expense'], Dict]:
+        """
+        Insert new and changed expense objects in chunks, skipping the ones whose expense_updated_at
+        matches the stored one
+        :param expenses: expenses from fyle
+        :return: expense objects, counts of new / changed / skipped rows
+        """
+        expense_rows = [_get_expense_row(expense) for expense in expenses]
+
         expense_objects = []
 
-        for expense in expenses:
-            expense_object, _ = Expense.objects.update_or_create(
-                expense_id=expense['id'],
-                defaults={
-                    'employee_email': expense['employee_email'],
-                    'category': expense['category_name'],
-                    'sub_category': expense['sub_category'],
-                    'project': expense['project_name'],
-                    'expense_number': expense['expense_number'],
-                    'claim_number': expense['claim_number'],
-                    'amount': expense['amount'],
-                    'currency': expense['currency'],
-                    'foreign_amount': expense['foreign_amount'],
-                    'foreign_currency': expense['foreign_currency'],
-                    'settlement_id': expense['settlement_id'],
-                    'reimbursable': expense['reimbursable'],
-                    'exported': expense['exported'],
-                    'state': expense['state'],
-                    'vendor': expense['vendor'],
-                    'cost_center': expense['cost_center_name'],
-                    'purpose': expense['purpose'],
-                    'report_id': expense['report_id'],
-                    'spent_at': expense['spent_at'],
-                    'approved_at': expense['approved_at'],
-                    'expense_created_at': expense['created_at'],
-                    'expense_updated_at': expense['updated_at'],
-                    'fund_source': expense['fund_source']
-                }
-            )
-            expense_objects.append(expense_object)
+        for chunk in chunk_list(expense_rows, settings.BULK_UPSERT_CHUNK_SIZE):
+            stored_expenses = {
+                expense.expense_id: expense for expense in Expense.objects.filter(
+                    expense_id__in=[row['expense_id'] for row in chunk]
+                )
+            }
 
-        return expense_objects
+            changed_rows = []
+
+            for row in chunk:
+                stored_expense = stored_expenses.get(row['expense_id'])
+
+                if stored_expense and stored_expense.expense_updated_at == _parse_datetime(row['expense_updated_at']):
+                    stored_expense.upsert_action = 'UNCHANGED'
+                    expense_objects.append(stored_expense)
+                else:
+                    changed_rows.append(row)
+
+            expense_objects.extend(bulk_upsert(Expense, changed_rows, conflict_field='expense_id'))
+
+        upsert_counts = {
+            'new': 0,
+            'changed': 0,
+            'skipped': 0
+        }
+
+        for expense_object in expense_objects:
+            upsert_counts[UPSERT_COUNT_KEYS[expense_object.upsert_action]] += 1
+
+        return expense_objects, upsert_counts
 
 
 class ExpenseGroup(models.Model):
@@ -95,17 +167,64 @@ class ExpenseGroup(models.Model):
     fund_source = models.CharField(max_length=255, help_text='Expense fund source')
     expenses = models.ManyToManyField(Expense, help_text="Expenses under this Expense Group")
     description = JSONField(max_length=255, help_text='Description', null=True)
+    export_status = models.CharField(max_length=255, help_text='Export status - READY / EXPORTED', default='READY')
+    exported_object_type = models.CharField(
+        max_length=255, help_text='Exported QBO object - BILL / CHECK / CREDIT CARD PURCHASE / JOURNAL ENTRY', null=True
+    )
     created_at = models.DateTimeField(auto_now_add=True, help_text='Created at')
     updated_at = models.DateTimeField(auto_now=True, help_text='Updated at')
 
     class Meta:
         unique_together = ('fyle_group_id', 'workspace')
+        indexes = [
+            models.Index(fields=['workspace', 'export_status', 'updated_at'], name='expense_group_export_idx'),
+            models.Index(fields=['workspace', 'updated_at', 'id'], name='expense_group_keyset_idx')
+        ]
 
     @staticmethod
-    def create_expense_groups_by_report_id_fund_source(expense_objects: List[Expense], workspace_id):
+    def mark_exported(expense_group_id: int, exported_object_type: str):
         """
-        Group expense by report_id and fund_source
+        Mark an expense group exported, call inside the transaction linking its export object
+        :param expense_group_id: expense group id
+        :param exported_object_type: BILL / CHECK / CREDIT CARD PURCHASE / JOURNAL ENTRY
+        :return: None
+        """
+        ExpenseGroup.objects.filter(id=expense_group_id).update(
+            export_status='EXPORTED', exported_object_type=exported_object_type
+        )
+
+    @staticmethod
+    def backfill_export_status():
         """
+        Set export status of expense groups from their exported QBO objects
+        :return: number of expense groups marked exported
+        """
+        exported_count = 0
+
+        for related_name, exported_object_type in EXPORTED_OBJECT_TYPES.items():
+            exported_count += ExpenseGroup.objects.filter(**{
+                '{0}__export_state'.format(related_name): 'EXPORTED'
+            }).exclude(
+                export_status='EXPORTED', exported_object_type=exported_object_type
+            ).update(export_status='EXPORTED', exported_object_type=exported_object_type)
+
+        return exported_count
+
+    @staticmethod
+    def create_expense_groups_by_report_id_fund_source(report_ids: Set[str], workspace_id):
+        """
+        Group expense by report_id and fund_source, regrouping every expense of the reports.
+        Expenses stay in exported groups, groups left empty are deleted unless something references them
+        :param report_ids: reports with new or changed expenses
+        :param workspace_id: workspace id
+        :return: expense groups of the reports
+        """
+        if not report_ids:
+            return []
+
+        # the other expenses of a touched report may have moved with it, group the whole report again
+        expense_objects = Expense.objects.filter(report_id__in=report_ids)
+
         department_setting: MappingSetting = MappingSetting.objects.filter(
             workspace_id=workspace_id,
             destination_field='DEPARTMENT'
@@ -113,94 +232,93 @@ class ExpenseGroup(models.Model):
 
         general_settings = WorkspaceGeneralSettings.objects.get(workspace_id=workspace_id)
 
-        reimbursable_expenses = list(filter(lambda expense: expense.fund_source == 'PERSONAL', expense_objects))
+        export_objects = {
+            'PERSONAL': general_settings.reimbursable_expenses_object
+        }
 
-        ccc_expenses = list(filter(lambda expense: expense.fund_source == 'CCC', expense_objects))
+        if general_settings.corporate_credit_card_expenses_object:
+            export_objects['CCC'] = general_settings.corporate_credit_card_expenses_object
 
-        if department_setting and general_settings.reimbursable_expenses_object != 'JOURNAL_ENTRY':
-            reimbursable_expense_groups = groupby(
-                reimbursable_expenses, lambda expense: (
-                    expense.report_id, expense.employee_email,
-                    expense.claim_number, expense.fund_source,
-                    expense.project if department_setting.source_field == 'PROJECT' else expense.cost_center
-                )
-            )
-        else:
-            reimbursable_expense_groups = groupby(
-                reimbursable_expenses, lambda expense: (
-                    expense.report_id, expense.employee_email,
-                    expense.claim_number, expense.fund_source
-                )
-            )
-
-        group_types = [reimbursable_expense_groups]
-
-        if general_settings.corporate_credit_card_expenses_object and ccc_expenses:
-            if department_setting and general_settings.corporate_credit_card_expenses_object != 'JOURNAL_ENTRY':
-                ccc_expense_groups = groupby(
-                    ccc_expenses, lambda expense: (
-                        expense.report_id, expense.employee_email,
-                        expense.claim_number, expense.fund_source,
-                        expense.project if department_setting.source_field == 'PROJECT' else expense.cost_center
-                    )
-                )
-            else:
-                ccc_expense_groups = groupby(
-                    ccc_expenses, lambda expense: (
-                        expense.report_id, expense.employee_email,
-                        expense.claim_number, expense.fund_source
-                    )
-                )
-            group_types.append(ccc_expense_groups)
-
-        expense_group_objects = []
-
-        for expense_groups in group_types:
-            for expense_group, _ in expense_groups:
-                report_id = expense_group[0]
-                employee_email = expense_group[1]
-                claim_number = expense_group[2]
-                fund_source = expense_group[3]
-                department = None
-                if len(expense_group) > 4:
-                    department = expense_group[4]
-
-                kwargs = {}
-
-                if department:
-                    kwargs = {
-                        '{0}'.format(department_setting.source_field.lower()): department,
-                    }
-
-                expense_ids = Expense.objects.filter(
-                    report_id=report_id,
-                    fund_source=fund_source,
-                    **kwargs
-                ).values_list(
-                    'id', flat=True
-                )
-                
+        current_group_expenses = {}
+        exported_group_expenses = set()
+
+        for expense_group_id, expense_id, expense_group_expense_id, export_status in \
+                ExpenseGroup.expenses.through.objects.filter(
+                    expensegroup__workspace_id=workspace_id, expense__report_id__in=report_ids
+                ).values_list('expensegroup_id', 'expense_id', 'id', 'expensegroup__export_status'):
+            current_group_expenses[(expense_group_id, expense_id)] = expense_group_expense_id
+
+            if export_status == 'EXPORTED':
+                exported_group_expenses.add((expense_group_id, expense_id))
+
+        exported_expense_ids = {expense_id for _, expense_id in exported_group_expenses}
+
+        expense_groups = {}
+
+        for expense in expense_objects:
+            # an exported expense is not grouped again
+            if expense.fund_source not in export_objects or expense.id in exported_expense_ids:
+                continue
+
+            department = None
+            if department_setting and export_objects[expense.fund_source] != 'JOURNAL_ENTRY':
+                department = expense.project if department_setting.source_field == 'PROJECT' else expense.cost_center
+
+            fyle_group_id = '{0}-{1}'.format(expense.claim_number, expense.fund_source) if not department \
+                else '{0}-{1}-{2}'.format(expense.claim_number, expense.fund_source, department)
+
+            if fyle_group_id not in expense_groups:
                 description = {
-                    'employee_email': employee_email,
-                    'claim_number': claim_number,
-                    'fund_source': fund_source,
+                    'employee_email': expense.employee_email,
+                    'claim_number': expense.claim_number,
+                    'fund_source': expense.fund_source,
                 }
 
                 if department_setting:
                     description[department_setting.source_field.lower()] = department
 
-                expense_group_object, _ = ExpenseGroup.objects.update_or_create(
-                    fyle_group_id='{0}-{1}'.format(claim_number, fund_source) if not department
-                    else '{0}-{1}-{2}'.format(claim_number, fund_source, department),
-                    workspace_id=workspace_id,
-                    fund_source=fund_source,
-                    defaults={
+                expense_groups[fyle_group_id] = {
+                    'row': {
+                        'fyle_group_id': fyle_group_id,
+                        'workspace_id': workspace_id,
+                        'fund_source': expense.fund_source,
                         'description': description
-                    }
-                )
+                    },
+                    'expense_ids': []
+                }
+
+            expense_groups[fyle_group_id]['expense_ids'].append(expense.id)
+
+        expense_group_objects = bulk_upsert(
+            ExpenseGroup, [expense_group['row'] for expense_group in expense_groups.values()],
+            conflict_field='fyle_group_id', update_fields=['description'], skip_unchanged=True,
+            scope_fields=['workspace_id']
+        )
+
+        group_expenses = {
+            (expense_group_object.id, expense_id)
+            for expense_group_object in expense_group_objects
+            for expense_id in expense_groups[expense_group_object.fyle_group_id]['expense_ids']
+        }
+
+        ExpenseGroup.expenses.through.objects.bulk_create([
+            ExpenseGroup.expenses.through(expensegroup_id=expense_group_id, expense_id=expense_id)
+            for expense_group_id, expense_id in group_expenses.difference(current_group_expenses)
+        ], batch_size=settings.BULK_UPSERT_CHUNK_SIZE)
+
+        # an exported group keeps the expenses it was exported with
+        removed_group_expenses = set(current_group_expenses).difference(group_expenses, exported_group_expenses)
 
-                expense_group_object.expenses.add(*expense_ids)
+        if removed_group_expenses:
+            ExpenseGroup.expenses.through.objects.filter(
+                id__in=[current_group_expenses[group_expense] for group_expense in removed_group_expenses]
+            ).delete()
 
-                expense_group_objects.append(expense_group_object)
+            # groups referenced by task logs or export objects are kept, they are no longer returned for export
+            ExpenseGroup.objects.filter(
+                id__in={expense_group_id for expense_group_id, _ in removed_group_expenses},
+                export_status='READY', expenses__isnull=True, tasklog__isnull=True,
+                **{'{0}__isnull'.format(related_name): True for related_name in EXPORTED_OBJECT_TYPES}
+            ).delete()
 
         return expense_group_objects
@@ -12,6 +12,18 @@ class ExpenseGroupSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class ExpenseGroupCompactSerializer(serializers.ModelSerializer):
+    """
+    Expense group serializer with expense count and total instead of expense ids
+    """
+    expenses_count = serializers.IntegerField(read_only=True)
+    expenses_total = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = ExpenseGroup
+        exclude = ['expenses']
+
+
 class ExpenseSerializer(serializers.ModelSerializer):
     """
     Expense serializer
@@ -1,10 +1,13 @@
 import logging
 from typing import List
 import traceback
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 from django.conf import settings
 from django.db import transaction
+from django.db.models import prefetch_related_objects
+
+from django_q.tasks import async_task
 
 from apps.workspaces.models import FyleCredential, Workspace
 from apps.tasks.models import TaskLog
@@ -29,7 +32,7 @@ def schedule_expense_group_creation(workspace_id: int, user: str):
     fyle_connector = FyleConnector(fyle_credentials.refresh_token, workspace_id)
     fyle_sdk_connection = fyle_connector.connection
 
-    jobs = FyleJobsSDK(settings.FYLE_JOBS_URL, fyle_sdk_connection)
+    jobs = FyleJobsSDK(settings.FYLE_JOBS_URL, fyle_sdk_connection, workspace_id)
 
     task_log = TaskLog.objects.create(
         workspace_id=workspace_id,
@@ -65,53 +68,100 @@ def create_expense_groups(workspace_id: int, state: List[str], fund_source: List
     :return: task log
     """
 
-    async_create_expense_groups(workspace_id, state, fund_source, task_log)
-
     task_log.detail = {
         'message': 'Creating expense groups'
     }
     task_log.save(update_fields=['task_id', 'detail'])
 
+    async_task(async_create_expense_groups, workspace_id, state, fund_source, task_log)
+
     return task_log
 
 
-def async_create_expense_groups(workspace_id: int, state: List[str], fund_source: List[str], task_log: TaskLog):
+def async_create_expense_groups(workspace_id: int, state: List[str], fund_source: List[str],
+                                task_log: TaskLog) -> List[int]:
+    """
+    Fetch expenses from Fyle and group them
+    :param workspace_id: workspace id
+    :param state: expense state
+    :param fund_source: expense fund source
+    :param task_log: Task log object
+    :return: ids of the expense groups created or changed by this fetch
+    """
+    expense_group_ids = []
+
     try:
-        with transaction.atomic():
+        workspace = Workspace.objects.get(pk=workspace_id)
 
-            workspace = Workspace.objects.get(pk=workspace_id)
+        expenses_synced_till = workspace.expenses_synced_till
 
-            last_synced_at = workspace.last_synced_at
+        updated_at = []
 
-            updated_at = []
+        if expenses_synced_till:
+            # expenses updated around the watermark may still be committing in Fyle, fetch them again
+            fetch_from = expenses_synced_till - timedelta(seconds=settings.FYLE_SYNC_OVERLAP_SECONDS)
+            updated_at.append('gte:{0}'.format(datetime.strftime(
+                fetch_from.astimezone(timezone.utc), '%Y-%m-%dT%H:%M:%S.000Z'
+            )))
 
-            if last_synced_at:
-                updated_at.append('gte:{0}'.format(datetime.strftime(last_synced_at, '%Y-%m-%dT%H:%M:%S.000Z')))
+        fyle_credentials = FyleCredential.objects.get(workspace_id=workspace_id)
 
-            workspace.last_synced_at = datetime.now()
-            workspace.save()
+        fyle_connector = FyleConnector(fyle_credentials.refresh_token, workspace_id)
 
-            fyle_credentials = FyleCredential.objects.get(workspace_id=workspace_id)
+        # fetch every page before opening the transaction, no locks are held across Fyle calls and their retries
+        expense_pages = list(fyle_connector.iter_expenses(
+            state=state,
+            updated_at=updated_at,
+            fund_source=fund_source
+        ))
 
-            fyle_connector = FyleConnector(fyle_credentials.refresh_token, workspace_id)
+        upsert_counts = {
+            'new': 0,
+            'changed': 0,
+            'skipped': 0
+        }
+        report_ids = set()
 
-            expenses = fyle_connector.get_expenses(
-                state=state,
-                updated_at=updated_at,
-                fund_source=fund_source
-            )
+        # expenses are upserted with their groups and the watermark, a changed expense is never left ungrouped
+        with transaction.atomic():
+            for expenses in expense_pages:
+                expense_objects, page_upsert_counts = Expense.bulk_upsert_expense_objects(expenses)
 
-            expense_objects = Expense.create_expense_objects(expenses)
+                for expense_object in expense_objects:
+                    if not expenses_synced_till or expense_object.expense_updated_at > expenses_synced_till:
+                        expenses_synced_till = expense_object.expense_updated_at
+
+                for action, count in page_upsert_counts.items():
+                    upsert_counts[action] += count
+
+                report_ids.update(
+                    expense_object.report_id for expense_object in expense_objects
+                    if expense_object.upsert_action != 'UNCHANGED'
+                )
 
             expense_group_objects = ExpenseGroup.create_expense_groups_by_report_id_fund_source(
-                expense_objects, workspace_id
+                report_ids, workspace_id
             )
 
-            task_log.detail = ExpenseGroupSerializer(expense_group_objects, many=True).data
+            workspace.last_synced_at = datetime.now(tz=timezone.utc)
+            workspace.expenses_synced_till = expenses_synced_till
+            workspace.save(update_fields=['last_synced_at', 'expenses_synced_till', 'updated_at'])
 
-            task_log.status = 'COMPLETE'
+        logger.info('Expenses synced for workspace_id %s: %s', workspace_id, upsert_counts)
 
-            task_log.save(update_fields=['detail', 'status'])
+        prefetch_related_objects(expense_group_objects, 'expenses')
+
+        # the detail stays the list of expense groups API clients read, the counts get their own field
+        task_log.detail = ExpenseGroupSerializer(expense_group_objects, many=True).data
+        task_log.counts = {
+            'expenses': upsert_counts
+        }
+
+        task_log.status = 'COMPLETE'
+
+        task_log.save(update_fields=['detail', 'counts', 'status'])
+
+        expense_group_ids = [expense_group_object.id for expense_group_object in expense_group_objects]
 
     except FyleCredential.DoesNotExist:
         logger.exception('Fyle credentials not found %s', workspace_id)
@@ -129,3 +179,5 @@ def async_create_expense_groups(workspace_id: int, state: List[str], fund_source
         task_log.status = 'FATAL'
         task_log.save(update_fields=['detail', 'status'])
         logger.exception('Something unexpected happened workspace_id: %s\n%s', task_log.workspace_id, error)
+
+    return expense_group_ids
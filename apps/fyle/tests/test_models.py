@@ -0,0 +1,58 @@
+"""
+Fyle model tests
+"""
+from datetime import datetime, timezone
+
+from django.test import TestCase
+
+from apps.fyle.models import Expense, ExpenseGroup
+from apps.workspaces.models import Workspace, WorkspaceGeneralSettings
+
+
+class CreateExpenseGroupsTest(TestCase):
+    """
+    Grouping synced expenses, new groups go through the raw upsert
+    """
+    def setUp(self):
+        self.workspace = Workspace.objects.create(name='Test Workspace', fyle_org_id='orTest', qbo_realm_id='1234')
+        WorkspaceGeneralSettings.objects.create(
+            workspace=self.workspace, reimbursable_expenses_object='BILL', employee_field_mapping='VENDOR'
+        )
+
+        now = datetime.now(tz=timezone.utc)
+        self.expenses = [
+            Expense.objects.create(
+                employee_email='user@fyle.in',
+                expense_id='txTest{0}'.format(index),
+                expense_number='E/2020/04/T/{0}'.format(index),
+                claim_number='C/2020/04/R/1',
+                amount=10.0,
+                currency='USD',
+                settlement_id='setTest',
+                state='PAYMENT_PROCESSING',
+                report_id='rpTest',
+                expense_created_at=now,
+                expense_updated_at=now,
+                fund_source='PERSONAL'
+            ) for index in range(2)
+        ]
+
+    def test_new_expense_group_is_ready(self):
+        expense_groups = ExpenseGroup.create_expense_groups_by_report_id_fund_source({'rpTest'}, self.workspace.id)
+
+        self.assertEqual(len(expense_groups), 1)
+
+        expense_group = ExpenseGroup.objects.get(workspace=self.workspace, fyle_group_id='C/2020/04/R/1-PERSONAL')
+
+        self.assertEqual(expense_group.export_status, 'READY')
+        self.assertIsNone(expense_group.exported_object_type)
+        self.assertEqual(
+            set(expense_group.expenses.values_list('id', flat=True)), {expense.id for expense in self.expenses}
+        )
+
+    def test_regrouping_keeps_expense_group(self):
+        first_groups = ExpenseGroup.create_expense_groups_by_report_id_fund_source({'rpTest'}, self.workspace.id)
+        second_groups = ExpenseGroup.create_expense_groups_by_report_id_fund_source({'rpTest'}, self.workspace.id)
+
+        self.assertEqual([group.id for group in first_groups], [group.id for group in second_groups])
+        self.assertEqual(ExpenseGroup.objects.filter(workspace=self.workspace).count(), 1)
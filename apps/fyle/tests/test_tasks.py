@@ -0,0 +1,86 @@
+"""
+Fyle task tests
+"""
+from unittest import mock
+
+from django.test import TestCase
+
+from apps.fyle.models import ExpenseGroup
+from apps.fyle.tasks import async_create_expense_groups
+from apps.tasks.models import TaskLog
+from apps.workspaces.models import Workspace, WorkspaceGeneralSettings, FyleCredential
+
+
+def get_fyle_expense(index: int, updated_at: str = '2020-04-20T10:00:00.000Z') -> dict:
+    """
+    Expense as returned by the Fyle API
+    :param index: expense index
+    :param updated_at: expense updated at
+    :return: expense
+    """
+    return {
+        'id': 'txTest{0}'.format(index),
+        'employee_email': 'user@fyle.in',
+        'category_name': 'Travel',
+        'sub_category': None,
+        'project_name': None,
+        'expense_number': 'E/2020/04/T/{0}'.format(index),
+        'claim_number': 'C/2020/04/R/1',
+        'amount': 10.0,
+        'currency': 'USD',
+        'foreign_amount': None,
+        'foreign_currency': None,
+        'settlement_id': 'setTest',
+        'reimbursable': True,
+        'exported': False,
+        'state': 'PAYMENT_PROCESSING',
+        'vendor': None,
+        'cost_center_name': None,
+        'purpose': None,
+        'report_id': 'rpTest',
+        'spent_at': '2020-04-19T00:00:00.000Z',
+        'approved_at': '2020-04-19T10:00:00.000Z',
+        'created_at': '2020-04-19T09:00:00.000Z',
+        'updated_at': updated_at,
+        'fund_source': 'PERSONAL'
+    }
+
+
+class AsyncCreateExpenseGroupsTest(TestCase):
+    """
+    Fetching expenses from Fyle and grouping them
+    """
+    def setUp(self):
+        self.workspace = Workspace.objects.create(name='Test Workspace', fyle_org_id='orTest', qbo_realm_id='1234')
+        WorkspaceGeneralSettings.objects.create(
+            workspace=self.workspace, reimbursable_expenses_object='BILL', employee_field_mapping='VENDOR'
+        )
+        FyleCredential.objects.create(workspace=self.workspace, refresh_token='refresh_token')
+
+    def sync(self, expenses: list) -> TaskLog:
+        """
+        Run a fetch returning the given expenses in one page
+        :param expenses: Fyle expenses
+        :return: task log of the fetch
+        """
+        task_log = TaskLog.objects.create(workspace=self.workspace, type='FETCHING_EXPENSES', status='IN_PROGRESS')
+
+        with mock.patch('apps.fyle.tasks.FyleConnector') as fyle_connector:
+            fyle_connector.return_value.iter_expenses.return_value = iter([expenses])
+            async_create_expense_groups(self.workspace.id, ['PAYMENT_PROCESSING'], ['PERSONAL'], task_log)
+
+        task_log.refresh_from_db()
+        return task_log
+
+    def test_counts_are_persisted(self):
+        task_log = self.sync([get_fyle_expense(0), get_fyle_expense(1)])
+
+        self.assertEqual(task_log.status, 'COMPLETE')
+        self.assertEqual(task_log.counts, {'expenses': {'new': 2, 'changed': 0, 'skipped': 0}})
+        self.assertEqual(len(task_log.detail), 1)
+        self.assertEqual(task_log.detail[0]['fyle_group_id'], 'C/2020/04/R/1-PERSONAL')
+
+        task_log = self.sync([get_fyle_expense(0), get_fyle_expense(1, '2020-04-21T10:00:00.000Z')])
+
+        self.assertEqual(task_log.counts, {'expenses': {'new': 0, 'changed': 1, 'skipped': 1}})
+        self.assertEqual(ExpenseGroup.objects.filter(workspace=self.workspace).count(), 1)
@@ -0,0 +1,112 @@
+"""
+Fyle view tests
+"""
+from datetime import datetime, timezone
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+
+from apps.fyle.models import Expense, ExpenseGroup
+from apps.fyle.views import ExpenseGroupView
+from apps.workspaces.models import Workspace
+
+
+class ExpenseGroupViewQueryCountTest(TestCase):
+    """
+    The expense groups list runs the same number of queries however many expense groups a page holds
+    """
+    EXPENSES_PER_GROUP = 3
+
+    def setUp(self):
+        self.workspace = Workspace.objects.create(name='Test Workspace', fyle_org_id='orTest', qbo_realm_id='1234')
+        self.factory = APIRequestFactory()
+        # authentication and workspace membership are covered elsewhere, only the list queries are counted here
+        self.view = ExpenseGroupView.as_view(authentication_classes=[], permission_classes=[])
+        self.group_count = 0
+
+    def create_expense_groups(self, count: int):
+        """
+        Create expense groups of EXPENSES_PER_GROUP expenses each
+        :param count: number of expense groups
+        :return: None
+        """
+        now = datetime.now(tz=timezone.utc)
+
+        for _ in range(count):
+            self.group_count += 1
+
+            expense_group = ExpenseGroup.objects.create(
+                fyle_group_id='C/2020/04/R/{0}-PERSONAL'.format(self.group_count),
+                workspace=self.workspace,
+                fund_source='PERSONAL',
+                description={'claim_number': 'C/2020/04/R/{0}'.format(self.group_count)}
+            )
+
+            expense_group.expenses.set([
+                Expense.objects.create(
+                    employee_email='user@fyle.in',
+                    expense_id='tx{0}_{1}'.format(self.group_count, index),
+                    expense_number='E/2020/04/T/{0}'.format(index),
+                    claim_number='C/2020/04/R/{0}'.format(self.group_count),
+                    amount=10.0,
+                    currency='USD',
+                    settlement_id='set{0}'.format(self.group_count),
+                    state='PAYMENT_PROCESSING',
+                    report_id='rp{0}'.format(self.group_count),
+                    expense_created_at=now,
+                    expense_updated_at=now,
+                    fund_source='PERSONAL'
+                ) for index in range(self.EXPENSES_PER_GROUP)
+            ])
+
+    def count_list_queries(self, params: dict) -> int:
+        """
+        List the expense groups of the workspace
+        :param params: query params
+        :return: number of queries run
+        """
+        request = self.factory.get('/api/workspaces/{0}/fyle/expense_groups/'.format(self.workspace.id), params)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.view(request, workspace_id=self.workspace.id)
+            response.render()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], self.group_count)
+
+        return len(queries)
+
+    def assert_constant_queries(self, params: dict):
+        """
+        Assert that growing the number of expense groups does not grow the number of queries
+        :param params: query params
+        :return: None
+        """
+        self.create_expense_groups(2)
+        queries_with_few_groups = self.count_list_queries(params)
+
+        self.create_expense_groups(10)
+        queries_with_more_groups = self.count_list_queries(params)
+
+        self.assertEqual(queries_with_few_groups, queries_with_more_groups)
+
+    def test_list_queries_are_constant(self):
+        self.assert_constant_queries({})
+
+    def test_compact_list_queries_are_constant(self):
+        self.assert_constant_queries({'compact': 'true'})
+
+    def test_compact_list_counts_and_totals_expenses(self):
+        self.create_expense_groups(2)
+        request = self.factory.get(
+            '/api/workspaces/{0}/fyle/expense_groups/'.format(self.workspace.id), {'compact': 'true'}
+        )
+
+        response = self.view(request, workspace_id=self.workspace.id)
+
+        for expense_group in response.data['results']:
+            self.assertNotIn('expenses', expense_group)
+            self.assertEqual(expense_group['expenses_count'], self.EXPENSES_PER_GROUP)
+            self.assertEqual(expense_group['expenses_total'], 10.0 * self.EXPENSES_PER_GROUP)
@@ -1,15 +1,34 @@
-from typing import List
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Iterator
 
 from django.conf import settings
 
-from fylesdk import FyleSDK, UnauthorizedClientError, NotFoundClientError, InternalServerError, WrongParamsError
+from fylesdk import FyleSDK, UnauthorizedClientError, NotFoundClientError, InternalServerError, WrongParamsError, \
+    FyleSDKError
 
 from fyle_accounting_mappings.models import ExpenseAttribute
 
-import requests
+from fyle_qbo_api.utils import request_with_retry, call_with_retry
 
 import json
 
+# workspace id -> cached FyleSDK connection, least recently used first
+_connection_cache = OrderedDict()
+_connection_cache_lock = threading.Lock()
+
+
+def _get_token_digest(refresh_token: str) -> str:
+    """
+    Digest of a refresh token, detects token changes without keeping the token in the cache
+    :param refresh_token: refresh token
+    :return: hex digest
+    """
+    return hashlib.sha256(refresh_token.encode('utf-8')).hexdigest()
+
+
 class FyleConnector:
     """
     Fyle utility functions
@@ -21,12 +40,41 @@ class FyleConnector:
         base_url = settings.FYLE_BASE_URL
         self.workspace_id = workspace_id
 
-        self.connection = FyleSDK(
-            base_url=base_url,
-            client_id=client_id,
-            client_secret=client_secret,
-            refresh_token=refresh_token
-        )
+        cached_connection = None
+        token_digest = _get_token_digest(refresh_token)
+
+        if workspace_id is not None:
+            with _connection_cache_lock:
+                cached_connection = _connection_cache.get(workspace_id)
+
+                if cached_connection is not None:
+                    _connection_cache.move_to_end(workspace_id)
+
+        if cached_connection and cached_connection['token_digest'] == token_digest \
+                and time.monotonic() < cached_connection['expires_at']:
+            self.connection = cached_connection['connection']
+        else:
+            # FyleSDK authenticates on construction, reuse it for the lifetime of its access token
+            self.connection = FyleSDK(
+                base_url=base_url,
+                client_id=client_id,
+                client_secret=client_secret,
+                refresh_token=refresh_token
+            )
+
+            if workspace_id is not None:
+                with _connection_cache_lock:
+                    # replaces the connection of a rotated refresh token
+                    _connection_cache[workspace_id] = {
+                        'connection': self.connection,
+                        'token_digest': token_digest,
+                        'expires_at': time.monotonic() + settings.FYLE_ACCESS_TOKEN_LIFETIME
+                        - settings.FYLE_TOKEN_REFRESH_MARGIN
+                    }
+                    _connection_cache.move_to_end(workspace_id)
+
+                    while len(_connection_cache) > settings.FYLE_CONNECTION_CACHE_SIZE:
+                        _connection_cache.popitem(last=False)
 
     def _post_request(self, url, body):
         """
@@ -39,8 +87,11 @@ class FyleConnector:
             'Authorization': 'Bearer {0}'.format(access_token)
         }
 
-        response = requests.post(
+        # Fyle POST endpoints used here only read data, retrying them is safe
+        response = request_with_retry(
+            'POST',
             url,
+            idempotent=True,
             headers=api_headers,
             data=body
         )
@@ -60,6 +111,9 @@ class FyleConnector:
         elif response.status_code == 500:
             raise InternalServerError('Internal server error', response.text)
 
+        else:
+            raise FyleSDKError('Error: {0}'.format(response.status_code), response.text)
+
     def _get_request(self, url, params):
         """
         Create a HTTP get request.
@@ -83,7 +137,8 @@ class FyleConnector:
 
                 api_params[k] = p
 
-        response = requests.get(
+        response = request_with_retry(
+            'GET',
             url,
             headers=api_headers,
             params=api_params
@@ -104,11 +159,14 @@ class FyleConnector:
         elif response.status_code == 500:
             raise InternalServerError('Internal server error', response.text)
 
+        else:
+            raise FyleSDKError('Error: {0}'.format(response.status_code), response.text)
+
     def get_employee_profile(self):
         """
         Get expenses from fyle
         """
-        employee_profile = self.connection.Employees.get_my_profile()
+        employee_profile = call_with_retry(self.connection.Employees.get_my_profile)
 
         return employee_profile['data']
 
@@ -132,21 +190,58 @@ class FyleConnector:
 
         return self._get_request(api_url, params)
 
+    @staticmethod
+    def __filter_expenses(expenses: List[Dict]) -> List[Dict]:
+        """
+        Remove personal expenses that are not reimbursable
+        """
+        return [
+            expense for expense in expenses
+            if not (not expense['reimbursable'] and expense['fund_source'] == 'PERSONAL')
+        ]
+
     def get_expenses(self, state: List[str], updated_at: List[str], fund_source: List[str]):
         """
         Get expenses from fyle
         """
-        expenses = self.connection.Expenses.get_all(state=state, updated_at=updated_at, fund_source=fund_source)
-        expenses = list(
-            filter(lambda expense: not (not expense['reimbursable'] and expense['fund_source'] == 'PERSONAL'),
-                   expenses))
+        expenses = []
+
+        for page in self.iter_expenses(state=state, updated_at=updated_at, fund_source=fund_source):
+            expenses.extend(page)
+
         return expenses
 
+    def iter_expenses(self, state: List[str], updated_at: List[str], fund_source: List[str],
+                      page_size: int = None) -> Iterator[List[Dict]]:
+        """
+        Get expenses from fyle one page at a time
+        :param state: expense states
+        :param updated_at: updated at filters
+        :param fund_source: expense fund sources
+        :param page_size: number of expenses fetched per request
+        :return: generator of expense pages
+        """
+        page_size = page_size or settings.FYLE_EXPENSES_PAGE_SIZE
+
+        count = call_with_retry(lambda: self.connection.Expenses.count(
+            state=state, updated_at=updated_at, fund_source=fund_source
+        ))['count']
+
+        for offset in range(0, count, page_size):
+            expenses = call_with_retry(lambda offset=offset: self.connection.Expenses.get(
+                offset=offset, limit=page_size, state=state, updated_at=updated_at, fund_source=fund_source
+            ))['data']
+
+            expenses = self.__filter_expenses(expenses)
+
+            if expenses:
+                yield expenses
+
     def sync_employees(self):
         """
         Get employees from fyle
         """
-        employees = self.connection.Employees.get_all()
+        employees = call_with_retry(self.connection.Employees.get_all)
 
         employee_attributes = []
 
@@ -166,7 +261,7 @@ class FyleConnector:
         """
         Get categories from fyle
         """
-        categories = self.connection.Categories.get(active_only=active_only)['data']
+        categories = call_with_retry(lambda: self.connection.Categories.get(active_only=active_only))['data']
 
         category_attributes = []
 
@@ -189,7 +284,7 @@ class FyleConnector:
         """
         Get cost centers from fyle
         """
-        cost_centers = self.connection.CostCenters.get(active_only=active_only)['data']
+        cost_centers = call_with_retry(lambda: self.connection.CostCenters.get(active_only=active_only))['data']
 
         cost_center_attributes = []
 
@@ -210,7 +305,7 @@ class FyleConnector:
         """
         Get projects from fyle
         """
-        projects = self.connection.Projects.get(active_only=active_only)['data']
+        projects = call_with_retry(lambda: self.connection.Projects.get(active_only=active_only))['data']
 
         project_attributes = []
 
@@ -226,6 +321,18 @@ class FyleConnector:
 
         return project_attributes
 
+    def get_attachment(self, expense_id: str) -> Dict or None:
+        """
+        Get the attachment of an expense
+        """
+        attachment = call_with_retry(lambda: self.connection.Expenses.get_attachments(expense_id))
+        if attachment['data']:
+            attachment = attachment['data'][0]
+            attachment['expense_id'] = expense_id
+            return attachment
+
+        return None
+
     def get_attachments(self, expense_ids: List[str]):
         """
         Get attachments against expense_ids
@@ -233,10 +340,8 @@ class FyleConnector:
         attachments = []
         if expense_ids:
             for expense_id in expense_ids:
-                attachment = self.connection.Expenses.get_attachments(expense_id)
-                if attachment['data']:
-                    attachment = attachment['data'][0]
-                    attachment['expense_id'] = expense_id
+                attachment = self.get_attachment(expense_id)
+                if attachment:
                     attachments.append(attachment)
             return attachments
 
@@ -1,3 +1,5 @@
+from django.db.models import Count, Prefetch, Sum
+
 from rest_framework.views import status
 from rest_framework import generics
 from rest_framework.response import Response
@@ -5,13 +7,15 @@ from rest_framework.response import Response
 from fyle_accounting_mappings.models import ExpenseAttribute
 from fyle_accounting_mappings.serializers import ExpenseAttributeSerializer
 
+from fyle_qbo_api.pagination import KeysetPagination
+
 from apps.workspaces.models import FyleCredential, WorkspaceGeneralSettings
 from apps.tasks.models import TaskLog
 
 from .tasks import create_expense_groups, schedule_expense_group_creation
 from .utils import FyleConnector
 from .models import Expense, ExpenseGroup
-from .serializers import ExpenseGroupSerializer, ExpenseSerializer
+from .serializers import ExpenseGroupSerializer, ExpenseGroupCompactSerializer, ExpenseSerializer
 
 
 class ExpenseGroupView(generics.ListCreateAPIView):
@@ -19,48 +23,44 @@ class ExpenseGroupView(generics.ListCreateAPIView):
     List Fyle Expenses
     """
     serializer_class = ExpenseGroupSerializer
+    pagination_class = KeysetPagination
+
+    def is_compact(self):
+        """
+        Whether the request asks for expense counts and totals instead of expense ids
+        """
+        return self.request.query_params.get('compact') == 'true'
+
+    def get_serializer_class(self):
+        if self.request.method == 'GET' and self.is_compact():
+            return ExpenseGroupCompactSerializer
+
+        return ExpenseGroupSerializer
 
     def get_queryset(self):
         state = self.request.query_params.get('state', 'ALL')
-        general_settings_queryset = WorkspaceGeneralSettings.objects.all()
-        general_settings = general_settings_queryset.get(workspace_id=self.kwargs['workspace_id'])
-
-        if state == 'ALL':
-            return ExpenseGroup.objects.filter(workspace_id=self.kwargs['workspace_id']).order_by('-updated_at')
-
-        elif state == 'COMPLETE':
-            expense_groups = []
-            if general_settings.reimbursable_expenses_object == 'CHECK':
-                expense_groups = ExpenseGroup.objects.filter(workspace_id=self.kwargs['workspace_id'],
-                                                             cheque__id__isnull=False).order_by('-updated_at')
-            elif general_settings.reimbursable_expenses_object == 'JOURNAL ENTRY':
-                expense_groups = ExpenseGroup.objects.filter(workspace_id=self.kwargs['workspace_id'],
-                                                             journalentry__id__isnull=False).order_by('-updated_at')
-            elif general_settings.reimbursable_expenses_object == 'BILL':
-                expense_groups = ExpenseGroup.objects.filter(workspace_id=self.kwargs['workspace_id'],
-                                                             bill__id__isnull=False).order_by('-updated_at')
-            if general_settings.corporate_credit_card_expenses_object == 'JOURNAL ENTRY':
-                ccc_expense_groups = ExpenseGroup.objects.filter(workspace_id=self.kwargs['workspace_id'],
-                                                                 journalentry__id__isnull=False).order_by(
-                                                                     '-updated_at')
-                expense_groups = expense_groups | ccc_expense_groups
-
-            elif general_settings.corporate_credit_card_expenses_object == 'CREDIT CARD PURCHASE':
-                ccc_expense_groups = ExpenseGroup.objects.filter(workspace_id=self.kwargs['workspace_id'],
-                                                                 creditcardpurchase__id__isnull=False).order_by(
-                                                                     '-updated_at')
-                expense_groups = expense_groups | ccc_expense_groups
-
-            return expense_groups
+
+        expense_groups = ExpenseGroup.objects.filter(workspace_id=self.kwargs['workspace_id'])
+
+        if state == 'COMPLETE':
+            expense_groups = expense_groups.filter(export_status='EXPORTED')
 
         elif state == 'READY':
-            return ExpenseGroup.objects.filter(
-                workspace_id=self.kwargs['workspace_id'],
-                bill__id__isnull=True,
-                cheque__id__isnull=True,
-                creditcardpurchase__id__isnull=True,
-                journalentry__id__isnull=True
-            ).order_by('-updated_at')
+            expense_groups = expense_groups.filter(export_status='READY')
+
+        elif state != 'ALL':
+            return ExpenseGroup.objects.none()
+
+        if self.is_compact():
+            expense_groups = expense_groups.annotate(
+                expenses_count=Count('expenses'), expenses_total=Sum('expenses__amount')
+            )
+        else:
+            expense_groups = expense_groups.prefetch_related(
+                Prefetch('expenses', queryset=Expense.objects.only('id'))
+            )
+
+        return expense_groups.order_by('-updated_at')
 
     def post(self, request, *args, **kwargs):
         """
@@ -83,7 +83,7 @@ class ExpenseGroupView(generics.ListCreateAPIView):
             task_log=task_log,
         )
         return Response(
-            status=status.HTTP_200_OK
+            status=status.HTTP_202_ACCEPTED
         )
 
 
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mappings', '0002_auto_20200420_0434'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='employeemapping',
+            index=models.Index(fields=['workspace', 'updated_at', 'id'], name='employee_mapping_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='categorymapping',
+            index=models.Index(fields=['workspace', 'updated_at', 'id'], name='category_mapping_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='projectmapping',
+            index=models.Index(fields=['workspace', 'updated_at', 'id'], name='project_mapping_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='costcentermapping',
+            index=models.Index(fields=['workspace', 'updated_at', 'id'], name='cost_center_mapping_keyset_idx'),
+        ),
+    ]
@@ -40,6 +40,9 @@ class EmployeeMapping(models.Model):
 
     class Meta:
         unique_together = ('employee_email', 'workspace')
+        indexes = [
+            models.Index(fields=['workspace', 'updated_at', 'id'], name='employee_mapping_keyset_idx')
+        ]
 
 
 class CategoryMapping(models.Model):
@@ -57,6 +60,9 @@ class CategoryMapping(models.Model):
 
     class Meta:
         unique_together = ('category', 'sub_category', 'workspace')
+        indexes = [
+            models.Index(fields=['workspace', 'updated_at', 'id'], name='category_mapping_keyset_idx')
+        ]
 
 
 class ProjectMapping(models.Model):
@@ -73,6 +79,9 @@ class ProjectMapping(models.Model):
 
     class Meta:
         unique_together = ('project', 'workspace')
+        indexes = [
+            models.Index(fields=['workspace', 'updated_at', 'id'], name='project_mapping_keyset_idx')
+        ]
 
 
 class CostCenterMapping(models.Model):
@@ -89,3 +98,6 @@ class CostCenterMapping(models.Model):
 
     class Meta:
         unique_together = ('cost_center', 'workspace')
+        indexes = [
+            models.Index(fields=['workspace', 'updated_at', 'id'], name='cost_center_mapping_keyset_idx')
+        ]
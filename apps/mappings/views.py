@@ -2,6 +2,7 @@ from rest_framework import generics
 from rest_framework.response import Response
 from rest_framework.views import status
 
+from fyle_qbo_api.pagination import KeysetPagination
 from fyle_qbo_api.utils import assert_valid
 
 from .serializers import GeneralMappingSerializer, EmployeeMappingSerializer, \
@@ -58,6 +59,7 @@ class EmployeeMappingView(generics.ListCreateAPIView):
     Employee mappings view
     """
     serializer_class = EmployeeMappingSerializer
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         return EmployeeMapping.objects.filter(workspace_id=self.kwargs['workspace_id']).order_by('-updated_at').all()
@@ -84,6 +86,7 @@ class CategoryMappingView(generics.ListCreateAPIView):
     Category mappings view
     """
     serializer_class = CategoryMappingSerializer
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         return CategoryMapping.objects.filter(workspace_id=self.kwargs['workspace_id']).order_by('-updated_at').all()
@@ -110,6 +113,7 @@ class CostCenterMappingView(generics.ListCreateAPIView):
     Cost center mappings view
     """
     serializer_class = CostCenterMappingSerializer
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         return CostCenterMapping.objects.filter(workspace_id=self.kwargs['workspace_id']).order_by('-updated_at').all()
@@ -136,6 +140,7 @@ class ProjectMappingView(generics.ListCreateAPIView):
     Project mappings view
     """
     serializer_class = ProjectMappingSerializer
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         return ProjectMapping.objects.filter(workspace_id=self.kwargs['workspace_id']).order_by('-updated_at').all()
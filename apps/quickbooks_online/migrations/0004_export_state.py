@@ -0,0 +1,128 @@
+# Generated by Django 3.0.3 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+EXPORT_MODELS = [
+    ('bill', 'Bill'),
+    ('cheque', 'Purchase'),
+    ('creditcardpurchase', 'Purchase'),
+    ('journalentry', 'JournalEntry')
+]
+
+
+def backfill_qbo_ids(apps, schema_editor):
+    """
+    Copy the QBO ids of existing exports from their task logs
+    """
+    task_log_model = apps.get_model('tasks', 'TaskLog')
+    task_log_fields = {
+        'bill': 'bill',
+        'cheque': 'cheque',
+        'creditcardpurchase': 'credit_card_purchase',
+        'journalentry': 'journal_entry'
+    }
+
+    for model_name, object_type in EXPORT_MODELS:
+        export_model = apps.get_model('quickbooks_online', model_name)
+        task_log_field = task_log_fields[model_name]
+
+        task_logs = task_log_model.objects.filter(**{'{0}__isnull'.format(task_log_field): False}).values_list(
+            '{0}_id'.format(task_log_field), 'detail'
+        )
+
+        for export_object_id, detail in task_logs:
+            if detail and object_type in detail and 'Id' in detail[object_type]:
+                export_model.objects.filter(id=export_object_id).update(qbo_id=detail[object_type]['Id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0002_auto_20200420_0434'),
+        ('quickbooks_online', '0003_auto_20200421_1033'),
+    ]
+
+    # Rows created before this migration were posted inside their export transaction, so they start as EXPORTED
+    operations = [
+        migrations.AddField(
+            model_name='bill',
+            name='qbo_id',
+            field=models.CharField(help_text='QBO object id', max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='bill',
+            name='qbo_request_id',
+            field=models.CharField(help_text='QBO request id used to post the export', max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='bill',
+            name='export_state',
+            field=models.CharField(default='EXPORTED', help_text='Export state - PREPARED / EXPORTED', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='bill',
+            name='export_state',
+            field=models.CharField(default='PREPARED', help_text='Export state - PREPARED / EXPORTED', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='cheque',
+            name='qbo_id',
+            field=models.CharField(help_text='QBO object id', max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='cheque',
+            name='qbo_request_id',
+            field=models.CharField(help_text='QBO request id used to post the export', max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='cheque',
+            name='export_state',
+            field=models.CharField(default='EXPORTED', help_text='Export state - PREPARED / EXPORTED', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='cheque',
+            name='export_state',
+            field=models.CharField(default='PREPARED', help_text='Export state - PREPARED / EXPORTED', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='creditcardpurchase',
+            name='qbo_id',
+            field=models.CharField(help_text='QBO object id', max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='creditcardpurchase',
+            name='qbo_request_id',
+            field=models.CharField(help_text='QBO request id used to post the export', max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='creditcardpurchase',
+            name='export_state',
+            field=models.CharField(default='EXPORTED', help_text='Export state - PREPARED / EXPORTED', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='creditcardpurchase',
+            name='export_state',
+            field=models.CharField(default='PREPARED', help_text='Export state - PREPARED / EXPORTED', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='journalentry',
+            name='qbo_id',
+            field=models.CharField(help_text='QBO object id', max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='journalentry',
+            name='qbo_request_id',
+            field=models.CharField(help_text='QBO request id used to post the export', max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='journalentry',
+            name='export_state',
+            field=models.CharField(default='EXPORTED', help_text='Export state - PREPARED / EXPORTED', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='journalentry',
+            name='export_state',
+            field=models.CharField(default='PREPARED', help_text='Export state - PREPARED / EXPORTED', max_length=255),
+        ),
+        migrations.RunPython(backfill_qbo_ids, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quickbooks_online', '0004_export_state'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(fields=['updated_at', 'id'], name='bill_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cheque',
+            index=models.Index(fields=['updated_at', 'id'], name='cheque_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='creditcardpurchase',
+            index=models.Index(fields=['updated_at', 'id'], name='ccp_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='journalentry',
+            index=models.Index(fields=['updated_at', 'id'], name='journal_entry_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.0.3 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quickbooks_online', '0005_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bill',
+            name='qbo_batch_request_id',
+            field=models.CharField(help_text='QBO request id of the batch the export was posted in', max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='cheque',
+            name='qbo_batch_request_id',
+            field=models.CharField(help_text='QBO request id of the batch the export was posted in', max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='creditcardpurchase',
+            name='qbo_batch_request_id',
+            field=models.CharField(help_text='QBO request id of the batch the export was posted in', max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='journalentry',
+            name='qbo_batch_request_id',
+            field=models.CharField(help_text='QBO request id of the batch the export was posted in', max_length=255, null=True),
+        ),
+    ]
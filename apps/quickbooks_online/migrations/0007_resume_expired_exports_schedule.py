@@ -0,0 +1,41 @@
+# Generated by Django 3.0.3 on 2026-10-18 14:45
+
+from django.db import migrations
+
+SCHEDULE_NAME = 'resume_expired_exports'
+
+
+def create_schedule(apps, schema_editor):
+    """
+    Run resume_expired_exports every 5 minutes
+    """
+    schedule_model = apps.get_model('django_q', 'Schedule')
+    schedule_model.objects.update_or_create(
+        name=SCHEDULE_NAME,
+        defaults={
+            'func': 'apps.quickbooks_online.tasks.resume_expired_exports',
+            'schedule_type': 'I',
+            'minutes': 5,
+            'repeats': -1
+        }
+    )
+
+
+def delete_schedule(apps, schema_editor):
+    """
+    Drop the resume_expired_exports schedule
+    """
+    schedule_model = apps.get_model('django_q', 'Schedule')
+    schedule_model.objects.filter(name=SCHEDULE_NAME).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_q', '0009_auto_20171009_0915'),
+        ('quickbooks_online', '0006_qbo_batch_request_id'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_schedule, delete_schedule)
+    ]
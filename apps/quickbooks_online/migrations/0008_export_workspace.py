@@ -0,0 +1,52 @@
+# Generated by Django 3.0.3 on 2026-10-18 15:05
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+EXPORT_MODELS = ['bill', 'cheque', 'creditcardpurchase', 'journalentry']
+
+
+def backfill_workspaces(apps, schema_editor):
+    """
+    Copy the workspace of existing exports from their expense groups
+    """
+    expense_group_model = apps.get_model('fyle', 'ExpenseGroup')
+
+    for model_name in EXPORT_MODELS:
+        apps.get_model('quickbooks_online', model_name).objects.update(workspace_id=Subquery(
+            expense_group_model.objects.filter(id=OuterRef('expense_group_id')).values('workspace_id')[:1]
+        ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fyle', '0005_keyset_indexes'),
+        ('workspaces', '0004_workspace_expenses_synced_till'),
+        ('quickbooks_online', '0007_resume_expired_exports_schedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bill',
+            name='workspace',
+            field=models.ForeignKey(help_text='Workspace of the expense group', null=True, on_delete=django.db.models.deletion.PROTECT, to='workspaces.Workspace'),
+        ),
+        migrations.AddField(
+            model_name='cheque',
+            name='workspace',
+            field=models.ForeignKey(help_text='Workspace of the expense group', null=True, on_delete=django.db.models.deletion.PROTECT, to='workspaces.Workspace'),
+        ),
+        migrations.AddField(
+            model_name='creditcardpurchase',
+            name='workspace',
+            field=models.ForeignKey(help_text='Workspace of the expense group', null=True, on_delete=django.db.models.deletion.PROTECT, to='workspaces.Workspace'),
+        ),
+        migrations.AddField(
+            model_name='journalentry',
+            name='workspace',
+            field=models.ForeignKey(help_text='Workspace of the expense group', null=True, on_delete=django.db.models.deletion.PROTECT, to='workspaces.Workspace'),
+        ),
+        migrations.RunPython(backfill_workspaces, migrations.RunPython.noop),
+    ]
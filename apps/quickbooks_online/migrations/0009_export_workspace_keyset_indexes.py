@@ -0,0 +1,66 @@
+# Generated by Django 3.0.3 on 2026-10-18 15:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quickbooks_online', '0008_export_workspace'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bill',
+            name='workspace',
+            field=models.ForeignKey(help_text='Workspace of the expense group', on_delete=django.db.models.deletion.PROTECT, to='workspaces.Workspace'),
+        ),
+        migrations.AlterField(
+            model_name='cheque',
+            name='workspace',
+            field=models.ForeignKey(help_text='Workspace of the expense group', on_delete=django.db.models.deletion.PROTECT, to='workspaces.Workspace'),
+        ),
+        migrations.AlterField(
+            model_name='creditcardpurchase',
+            name='workspace',
+            field=models.ForeignKey(help_text='Workspace of the expense group', on_delete=django.db.models.deletion.PROTECT, to='workspaces.Workspace'),
+        ),
+        migrations.AlterField(
+            model_name='journalentry',
+            name='workspace',
+            field=models.ForeignKey(help_text='Workspace of the expense group', on_delete=django.db.models.deletion.PROTECT, to='workspaces.Workspace'),
+        ),
+        migrations.RemoveIndex(
+            model_name='bill',
+            name='bill_keyset_idx',
+        ),
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(fields=['workspace', 'updated_at', 'id'], name='bill_keyset_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='cheque',
+            name='cheque_keyset_idx',
+        ),
+        migrations.AddIndex(
+            model_name='cheque',
+            index=models.Index(fields=['workspace', 'updated_at', 'id'], name='cheque_keyset_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='creditcardpurchase',
+            name='ccp_keyset_idx',
+        ),
+        migrations.AddIndex(
+            model_name='creditcardpurchase',
+            index=models.Index(fields=['workspace', 'updated_at', 'id'], name='ccp_keyset_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='journalentry',
+            name='journal_entry_keyset_idx',
+        ),
+        migrations.AddIndex(
+            model_name='journalentry',
+            index=models.Index(fields=['workspace', 'updated_at', 'id'], name='journal_entry_keyset_idx'),
+        ),
+    ]
@@ -2,101 +2,169 @@
 QBO models
 """
 from datetime import datetime
+from typing import List, Dict, Tuple
 
 from django.db import models
-from django.db.models import Q
 
 from fyle_accounting_mappings.models import Mapping, MappingSetting
 
 from apps.fyle.models import ExpenseGroup, Expense
 from apps.mappings.models import GeneralMapping
+from apps.workspaces.models import Workspace
+from fyle_qbo_api.utils import bulk_upsert
 
 
-def get_class_id_or_none(expense_group: ExpenseGroup, lineitem: Expense):
-    class_setting: MappingSetting = MappingSetting.objects.filter(
-        workspace_id=expense_group.workspace_id,
-        destination_field='CLASS'
-    ).first()
+def get_expense_category(lineitem: Expense) -> str:
+    """
+    Category value of an expense as stored in expense attributes
+    :param lineitem: expense
+    :return: category / sub category
+    """
+    return lineitem.category if lineitem.category == lineitem.sub_category else '{0} / {1}'.format(
+        lineitem.category, lineitem.sub_category)
 
-    class_id = None
 
-    if class_setting:
-        source_value = None
+def bulk_upsert_lineitems(lineitem_model, lineitems: List[Dict]) -> List:
+    """
+    Persist lineitems of an export object in bulk, keyed on expense_id
+    :param lineitem_model: lineitem model (BillLineitem / ChequeLineitem / ...)
+    :param lineitems: list of lineitem field dicts
+    :return: lineitem objects
+    """
+    return bulk_upsert(lineitem_model, lineitems, conflict_field='expense_id')
 
-        if class_setting.source_field == 'PROJECT':
-            source_value = lineitem.project
-        elif class_setting.source_field == 'COST_CENTER':
-            source_value = lineitem.cost_center
 
-        mapping: Mapping = Mapping.objects.filter(
-            source_type=class_setting.source_field,
-            destination_type='CLASS',
-            source__value=source_value,
-            workspace_id=expense_group.workspace_id
-        ).first()
+class MappingResolver:
+    """
+    Workspace scoped mapping lookups for an export, mapping settings and mappings are loaded once
+    """
+    def __init__(self, workspace_id: int, expense_groups: List[ExpenseGroup]):
+        self.workspace_id = workspace_id
 
-        if mapping:
-            class_id = mapping.destination.destination_id
-    return class_id
+        self.mapping_settings: Dict[str, MappingSetting] = {}
+        for mapping_setting in MappingSetting.objects.filter(workspace_id=workspace_id).order_by('id'):
+            self.mapping_settings.setdefault(mapping_setting.destination_field, mapping_setting)
 
+        department_setting = self.mapping_settings.get('DEPARTMENT')
 
-def get_customer_id_or_none(expense_group: ExpenseGroup, lineitem: Expense):
-    customer_setting: MappingSetting = MappingSetting.objects.filter(
-        workspace_id=expense_group.workspace_id,
-        destination_field='CUSTOMER'
-    ).first()
+        source_values = set()
+        for expense_group in expense_groups:
+            source_values.add(expense_group.description.get('employee_email'))
 
-    customer_id = None
+            if department_setting:
+                source_values.add(expense_group.description.get(department_setting.source_field.lower()))
 
-    if customer_setting:
-        source_value = None
+            for lineitem in expense_group.expenses.all():
+                source_values.update([get_expense_category(lineitem), lineitem.project, lineitem.cost_center])
 
-        if customer_setting.source_field == 'PROJECT':
-            source_value = lineitem.project
-        elif customer_setting.source_field == 'COST_CENTER':
-            source_value = lineitem.cost_center
+        source_values.discard(None)
 
-        mapping: Mapping = Mapping.objects.filter(
-            source_type=customer_setting.source_field,
-            destination_type='CUSTOMER',
-            source__value=source_value,
-            workspace_id=expense_group.workspace_id
-        ).first()
+        mappings = Mapping.objects.filter(
+            workspace_id=workspace_id,
+            source__value__in=source_values
+        ).select_related('source', 'destination').order_by('id')
 
-        if mapping:
-            customer_id = mapping.destination.destination_id
-    return customer_id
+        self.mappings: Dict[Tuple[str, str, str], Mapping] = {}
+        self.category_mappings: Dict[str, Mapping] = {}
+        for mapping in mappings:
+            self.mappings.setdefault((mapping.source_type, mapping.destination_type, mapping.source.value), mapping)
+            if mapping.source_type == 'CATEGORY':
+                self.category_mappings.setdefault(mapping.source.value, mapping)
 
+    def get_mapping_or_none(self, source_type: str, destination_types: List[str], source_value: str) -> Mapping:
+        """
+        Get the mapping of a source value to the first matching destination type
+        :param source_type: source type (EMPLOYEE / CATEGORY / PROJECT / COST_CENTER)
+        :param destination_types: destination types in order of preference
+        :param source_value: source value
+        :return: mapping or None
+        """
+        for destination_type in destination_types:
+            mapping = self.mappings.get((source_type, destination_type, source_value))
+            if mapping:
+                return mapping
+        return None
+
+    def get_mapping(self, source_type: str, destination_types: List[str], source_value: str) -> Mapping:
+        """
+        Get the mapping of a source value, raises Mapping.DoesNotExist when it is not mapped
+        """
+        mapping = self.get_mapping_or_none(source_type, destination_types, source_value)
 
-def get_department_id_or_none(expense_group: ExpenseGroup, lineitem: Expense = None):
-    department_setting: MappingSetting = MappingSetting.objects.filter(
-        workspace_id=expense_group.workspace_id,
-        destination_field='DEPARTMENT'
-    ).first()
+        if not mapping:
+            raise Mapping.DoesNotExist(
+                '{0} mapping not found for {1}'.format(source_type.lower(), source_value)
+            )
+        return mapping
 
-    department_id = None
+    def get_category_mapping_or_none(self, lineitem: Expense) -> Mapping:
+        """
+        Get the category mapping of an expense irrespective of the destination type
+        """
+        return self.category_mappings.get(get_expense_category(lineitem))
+
+    def get_account_id_or_none(self, lineitem: Expense):
+        """
+        Get the QBO account id mapped to the category of an expense
+        :param lineitem: expense
+        :return: QBO account id or None
+        """
+        mapping = self.get_mapping_or_none('CATEGORY', ['ACCOUNT'], get_expense_category(lineitem))
+
+        return mapping.destination.destination_id if mapping else None
+
+    def __get_destination_id_or_none(self, destination_field: str, lineitem: Expense = None,
+                                     expense_group: ExpenseGroup = None):
+        """
+        Get the QBO id mapped to the source field configured for a destination field
+        :param destination_field: CLASS / CUSTOMER / DEPARTMENT
+        :param lineitem: expense, the source value is read from it when given
+        :param expense_group: expense group, the source value is read from its description otherwise
+        :return: QBO destination id or None
+        """
+        mapping_setting = self.mapping_settings.get(destination_field)
+
+        if not mapping_setting:
+            return None
 
-    if department_setting:
         source_value = None
 
         if lineitem:
-            if department_setting.source_field == 'PROJECT':
+            if mapping_setting.source_field == 'PROJECT':
                 source_value = lineitem.project
-            elif department_setting.source_field == 'COST_CENTER':
+            elif mapping_setting.source_field == 'COST_CENTER':
                 source_value = lineitem.cost_center
         else:
-            source_value = expense_group.description[department_setting.source_field.lower()]
+            source_value = expense_group.description[mapping_setting.source_field.lower()]
 
-        mapping: Mapping = Mapping.objects.filter(
-            source_type=department_setting.source_field,
-            destination_type='DEPARTMENT',
-            source__value=source_value,
-            workspace_id=expense_group.workspace_id
-        ).first()
+        mapping = self.get_mapping_or_none(mapping_setting.source_field, [destination_field], source_value)
 
-        if mapping:
-            department_id = mapping.destination.destination_id
-    return department_id
+        return mapping.destination.destination_id if mapping else None
+
+    def get_class_id_or_none(self, lineitem: Expense):
+        """
+        Get the QBO class id of an expense
+        :param lineitem: expense
+        :return: QBO class id or None
+        """
+        return self.__get_destination_id_or_none('CLASS', lineitem=lineitem)
+
+    def get_customer_id_or_none(self, lineitem: Expense):
+        """
+        Get the QBO customer id of an expense
+        :param lineitem: expense
+        :return: QBO customer id or None
+        """
+        return self.__get_destination_id_or_none('CUSTOMER', lineitem=lineitem)
+
+    def get_department_id_or_none(self, expense_group: ExpenseGroup, lineitem: Expense = None):
+        """
+        Get the QBO department id of an expense, or of the expense group when no expense is given
+        :param expense_group: expense group
+        :param lineitem: expense
+        :return: QBO department id or None
+        """
+        return self.__get_destination_id_or_none('DEPARTMENT', lineitem=lineitem, expense_group=expense_group)
 
 
 class Bill(models.Model):
@@ -105,6 +173,7 @@ class Bill(models.Model):
     """
     id = models.AutoField(primary_key=True)
     expense_group = models.OneToOneField(ExpenseGroup, on_delete=models.PROTECT, help_text='Expense group reference')
+    workspace = models.ForeignKey(Workspace, on_delete=models.PROTECT, help_text='Workspace of the expense group')
     accounts_payable_id = models.CharField(max_length=255, help_text='QBO Accounts Payable account id')
     vendor_id = models.CharField(max_length=255, help_text='QBO vendor id')
     department_id = models.CharField(max_length=255, help_text='QBO department id', null=True)
@@ -112,32 +181,44 @@ class Bill(models.Model):
     currency = models.CharField(max_length=255, help_text='Bill Currency')
     private_note = models.TextField(help_text='Bill Description')
     bill_number = models.CharField(max_length=255, unique=True)
+    qbo_id = models.CharField(max_length=255, help_text='QBO object id', null=True)
+    qbo_request_id = models.CharField(max_length=255, help_text='QBO request id used to post the export', null=True)
+    qbo_batch_request_id = models.CharField(
+        max_length=255, help_text='QBO request id of the batch the export was posted in', null=True
+    )
+    export_state = models.CharField(max_length=255, help_text='Export state - PREPARED / EXPORTED', default='PREPARED')
     created_at = models.DateTimeField(auto_now_add=True, help_text='Created at')
     updated_at = models.DateTimeField(auto_now=True, help_text='Updated at')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['workspace', 'updated_at', 'id'], name='bill_keyset_idx')
+        ]
+
     @staticmethod
-    def create_bill(expense_group: ExpenseGroup):
+    def create_bill(expense_group: ExpenseGroup, mapping_resolver: MappingResolver = None):
         """
         Create bill
         :param expense_group: expense group
+        :param mapping_resolver: mapping resolver of the export
         :return: bill object
         """
+        mapping_resolver = mapping_resolver or MappingResolver(expense_group.workspace_id, [expense_group])
+
         description = expense_group.description
 
         expense = expense_group.expenses.first()
 
-        department_id = get_department_id_or_none(expense_group)
+        department_id = mapping_resolver.get_department_id_or_none(expense_group)
 
         general_mappings = GeneralMapping.objects.get(workspace_id=expense_group.workspace_id)
         bill_object, _ = Bill.objects.update_or_create(
             expense_group=expense_group,
             defaults={
+                'workspace_id': expense_group.workspace_id,
                 'accounts_payable_id': general_mappings.accounts_payable_id,
-                'vendor_id': Mapping.objects.get(
-                    source_type='EMPLOYEE',
-                    destination_type='VENDOR',
-                    source__value=description.get('employee_email'),
-                    workspace_id=expense_group.workspace_id
+                'vendor_id': mapping_resolver.get_mapping(
+                    'EMPLOYEE', ['VENDOR'], description.get('employee_email')
                 ).destination.destination_id,
                 'department_id': department_id,
                 'transaction_date': datetime.now().strftime("%Y-%m-%d"),
@@ -166,47 +247,38 @@ class BillLineitem(models.Model):
     updated_at = models.DateTimeField(auto_now=True, help_text='Updated at')
 
     @staticmethod
-    def create_bill_lineitems(expense_group: ExpenseGroup):
+    def create_bill_lineitems(expense_group: ExpenseGroup, mapping_resolver: MappingResolver = None):
         """
         Create bill lineitems
         :param expense_group: expense group
+        :param mapping_resolver: mapping resolver of the export
         :return: lineitems objects
         """
+        mapping_resolver = mapping_resolver or MappingResolver(expense_group.workspace_id, [expense_group])
+
         expenses = expense_group.expenses.all()
         bill = Bill.objects.get(expense_group=expense_group)
 
-        bill_lineitem_objects = []
+        bill_lineitems = []
 
         for lineitem in expenses:
-            category = lineitem.category if lineitem.category == lineitem.sub_category else '{0} / {1}'.format(
-                lineitem.category, lineitem.sub_category)
-
-            account: Mapping = Mapping.objects.filter(
-                source_type='CATEGORY',
-                destination_type='ACCOUNT',
-                source__value=category,
-                workspace_id=expense_group.workspace_id
-            ).first()
-
-            class_id = get_class_id_or_none(expense_group, lineitem)
-
-            customer_id = get_customer_id_or_none(expense_group, lineitem)
-
-            bill_lineitem_object, _ = BillLineitem.objects.update_or_create(
-                bill=bill,
-                expense_id=lineitem.id,
-                defaults={
-                    'account_id': account.destination.destination_id if account else None,
-                    'class_id': class_id,
-                    'customer_id': customer_id,
-                    'amount': lineitem.amount,
-                    'description': lineitem.purpose
-                }
-            )
+            account_id = mapping_resolver.get_account_id_or_none(lineitem)
+
+            class_id = mapping_resolver.get_class_id_or_none(lineitem)
 
-            bill_lineitem_objects.append(bill_lineitem_object)
+            customer_id = mapping_resolver.get_customer_id_or_none(lineitem)
 
-        return bill_lineitem_objects
+            bill_lineitems.append({
+                'bill_id': bill.id,
+                'expense_id': lineitem.id,
+                'account_id': account_id,
+                'class_id': class_id,
+                'customer_id': customer_id,
+                'amount': lineitem.amount,
+                'description': lineitem.purpose
+            })
+
+        return bulk_upsert_lineitems(BillLineitem, bill_lineitems)
 
 
 class Cheque(models.Model):
@@ -215,6 +287,7 @@ class Cheque(models.Model):
     """
     id = models.AutoField(primary_key=True)
     expense_group = models.OneToOneField(ExpenseGroup, on_delete=models.PROTECT, help_text='Expense group reference')
+    workspace = models.ForeignKey(Workspace, on_delete=models.PROTECT, help_text='Workspace of the expense group')
     bank_account_id = models.CharField(max_length=255, help_text='QBO Bank account id')
     entity_id = models.CharField(max_length=255, help_text='QBO entity id')
     department_id = models.CharField(max_length=255, help_text='QBO department id', null=True)
@@ -222,33 +295,45 @@ class Cheque(models.Model):
     currency = models.CharField(max_length=255, help_text='Cheque Currency')
     private_note = models.TextField(help_text='Cheque Description')
     cheque_number = models.CharField(max_length=255, unique=True)
+    qbo_id = models.CharField(max_length=255, help_text='QBO object id', null=True)
+    qbo_request_id = models.CharField(max_length=255, help_text='QBO request id used to post the export', null=True)
+    qbo_batch_request_id = models.CharField(
+        max_length=255, help_text='QBO request id of the batch the export was posted in', null=True
+    )
+    export_state = models.CharField(max_length=255, help_text='Export state - PREPARED / EXPORTED', default='PREPARED')
     created_at = models.DateTimeField(auto_now_add=True, help_text='Created at')
     updated_at = models.DateTimeField(auto_now=True, help_text='Updated at')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['workspace', 'updated_at', 'id'], name='cheque_keyset_idx')
+        ]
+
     @staticmethod
-    def create_cheque(expense_group: ExpenseGroup):
+    def create_cheque(expense_group: ExpenseGroup, mapping_resolver: MappingResolver = None):
         """
         Create Cheque
         :param expense_group: expense group
+        :param mapping_resolver: mapping resolver of the export
         :return: Cheque object
         """
+        mapping_resolver = mapping_resolver or MappingResolver(expense_group.workspace_id, [expense_group])
+
         description = expense_group.description
 
         expense = expense_group.expenses.first()
 
         general_mappings = GeneralMapping.objects.get(workspace_id=expense_group.workspace_id)
 
-        department_id = get_department_id_or_none(expense_group)
+        department_id = mapping_resolver.get_department_id_or_none(expense_group)
 
         cheque_object, _ = Cheque.objects.update_or_create(
             expense_group=expense_group,
             defaults={
+                'workspace_id': expense_group.workspace_id,
                 'bank_account_id': general_mappings.bank_account_id,
-                'entity_id': Mapping.objects.get(
-                    source_type='EMPLOYEE',
-                    destination_type='EMPLOYEE',
-                    source__value=description.get('employee_email'),
-                    workspace_id=expense_group.workspace_id
+                'entity_id': mapping_resolver.get_mapping(
+                    'EMPLOYEE', ['EMPLOYEE'], description.get('employee_email')
                 ).destination.destination_id,
                 'department_id': department_id,
                 'transaction_date': datetime.now().strftime("%Y-%m-%d"),
@@ -277,47 +362,38 @@ class ChequeLineitem(models.Model):
     updated_at = models.DateTimeField(auto_now=True, help_text='Updated at')
 
     @staticmethod
-    def create_cheque_lineitems(expense_group: ExpenseGroup):
+    def create_cheque_lineitems(expense_group: ExpenseGroup, mapping_resolver: MappingResolver = None):
         """
         Create cheque lineitems
         :param expense_group: expense group
+        :param mapping_resolver: mapping resolver of the export
         :return: lineitems objects
         """
+        mapping_resolver = mapping_resolver or MappingResolver(expense_group.workspace_id, [expense_group])
+
         expenses = expense_group.expenses.all()
         cheque = Cheque.objects.get(expense_group=expense_group)
 
-        cheque_lineitem_objects = []
+        cheque_lineitems = []
 
         for lineitem in expenses:
-            category = lineitem.category if lineitem.category == lineitem.sub_category else '{0} / {1}'.format(
-                lineitem.category, lineitem.sub_category)
-
-            account: Mapping = Mapping.objects.filter(
-                source_type='CATEGORY',
-                destination_type='ACCOUNT',
-                source__value=category,
-                workspace_id=expense_group.workspace_id
-            ).first()
-
-            class_id = get_class_id_or_none(expense_group, lineitem)
-
-            customer_id = get_customer_id_or_none(expense_group, lineitem)
-
-            cheque_lineitem_object, _ = ChequeLineitem.objects.update_or_create(
-                cheque=cheque,
-                expense_id=lineitem.id,
-                defaults={
-                    'account_id': account.destination.destination_id if account else None,
-                    'class_id': class_id,
-                    'customer_id': customer_id,
-                    'amount': lineitem.amount,
-                    'description': lineitem.purpose
-                }
-            )
+            account_id = mapping_resolver.get_account_id_or_none(lineitem)
+
+            class_id = mapping_resolver.get_class_id_or_none(lineitem)
+
+            customer_id = mapping_resolver.get_customer_id_or_none(lineitem)
 
-            cheque_lineitem_objects.append(cheque_lineitem_object)
+            cheque_lineitems.append({
+                'cheque_id': cheque.id,
+                'expense_id': lineitem.id,
+                'account_id': account_id,
+                'class_id': class_id,
+                'customer_id': customer_id,
+                'amount': lineitem.amount,
+                'description': lineitem.purpose
+            })
 
-        return cheque_lineitem_objects
+        return bulk_upsert_lineitems(ChequeLineitem, cheque_lineitems)
 
 
 class CreditCardPurchase(models.Model):
@@ -326,6 +402,7 @@ class CreditCardPurchase(models.Model):
     """
     id = models.AutoField(primary_key=True)
     expense_group = models.OneToOneField(ExpenseGroup, on_delete=models.PROTECT, help_text='Expense group reference')
+    workspace = models.ForeignKey(Workspace, on_delete=models.PROTECT, help_text='Workspace of the expense group')
     ccc_account_id = models.CharField(max_length=255, help_text='QBO CCC account id')
     entity_id = models.CharField(max_length=255, help_text='QBO entity id')
     department_id = models.CharField(max_length=255, help_text='QBO department id', null=True)
@@ -333,36 +410,45 @@ class CreditCardPurchase(models.Model):
     currency = models.CharField(max_length=255, help_text='CreditCardPurchase Currency')
     private_note = models.TextField(help_text='CreditCardPurchase Description')
     credit_card_purchase_number = models.CharField(max_length=255, unique=True)
+    qbo_id = models.CharField(max_length=255, help_text='QBO object id', null=True)
+    qbo_request_id = models.CharField(max_length=255, help_text='QBO request id used to post the export', null=True)
+    qbo_batch_request_id = models.CharField(
+        max_length=255, help_text='QBO request id of the batch the export was posted in', null=True
+    )
+    export_state = models.CharField(max_length=255, help_text='Export state - PREPARED / EXPORTED', default='PREPARED')
     created_at = models.DateTimeField(auto_now_add=True, help_text='Created at')
     updated_at = models.DateTimeField(auto_now=True, help_text='Updated at')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['workspace', 'updated_at', 'id'], name='ccp_keyset_idx')
+        ]
+
     @staticmethod
-    def create_credit_card_purchase(expense_group: ExpenseGroup):
+    def create_credit_card_purchase(expense_group: ExpenseGroup, mapping_resolver: MappingResolver = None):
         """
         Create CreditCardPurchase
         :param expense_group: expense group
+        :param mapping_resolver: mapping resolver of the export
         :return: CreditCardPurchase object
         """
+        mapping_resolver = mapping_resolver or MappingResolver(expense_group.workspace_id, [expense_group])
+
         description = expense_group.description
         expense = expense_group.expenses.first()
 
-        department_id = get_department_id_or_none(expense_group)
+        department_id = mapping_resolver.get_department_id_or_none(expense_group)
 
         credit_card_purchase_object, _ = CreditCardPurchase.objects.update_or_create(
             expense_group=expense_group,
             defaults={
-                'ccc_account_id': Mapping.objects.get(
-                    destination_type='CREDIT_CARD_ACCOUNT',
-                    source_type='EMPLOYEE',
-                    source__value=description.get('employee_email'),
-                    workspace_id=expense_group.workspace_id
+                'workspace_id': expense_group.workspace_id,
+                'ccc_account_id': mapping_resolver.get_mapping(
+                    'EMPLOYEE', ['CREDIT_CARD_ACCOUNT'], description.get('employee_email')
                 ).destination.destination_id,
                 'department_id': department_id,
-                'entity_id': Mapping.objects.get(
-                    Q(destination_type='EMPLOYEE') | Q(destination_type='VENDOR'),
-                    source_type='EMPLOYEE',
-                    source__value=description.get('employee_email'),
-                    workspace_id=expense_group.workspace_id
+                'entity_id': mapping_resolver.get_mapping(
+                    'EMPLOYEE', ['EMPLOYEE', 'VENDOR'], description.get('employee_email')
                 ).destination.destination_id,
                 'transaction_date': datetime.now().strftime("%Y-%m-%d"),
                 'private_note': 'Report {0} / {1} exported on {2}'.format(
@@ -391,47 +477,38 @@ class CreditCardPurchaseLineitem(models.Model):
     updated_at = models.DateTimeField(auto_now=True, help_text='Updated at')
 
     @staticmethod
-    def create_credit_card_purchase_lineitems(expense_group: ExpenseGroup):
+    def create_credit_card_purchase_lineitems(expense_group: ExpenseGroup, mapping_resolver: MappingResolver = None):
         """
         Create credit card purchase lineitems
         :param expense_group: expense group
+        :param mapping_resolver: mapping resolver of the export
         :return: lineitems objects
         """
+        mapping_resolver = mapping_resolver or MappingResolver(expense_group.workspace_id, [expense_group])
+
         expenses = expense_group.expenses.all()
         credit_card_purchase = CreditCardPurchase.objects.get(expense_group=expense_group)
 
-        credit_card_purchase_lineitem_objects = []
+        credit_card_purchase_lineitems = []
 
         for lineitem in expenses:
-            category = lineitem.category if lineitem.category == lineitem.sub_category else '{0} / {1}'.format(
-                lineitem.category, lineitem.sub_category)
-
-            account: Mapping = Mapping.objects.filter(
-                source_type='CATEGORY',
-                destination_type='ACCOUNT',
-                source__value=category,
-                workspace_id=expense_group.workspace_id
-            ).first()
-
-            class_id = get_class_id_or_none(expense_group, lineitem)
-
-            customer_id = get_customer_id_or_none(expense_group, lineitem)
-
-            credit_card_purchase_lineitem_object, _ = CreditCardPurchaseLineitem.objects.update_or_create(
-                credit_card_purchase=credit_card_purchase,
-                expense_id=lineitem.id,
-                defaults={
-                    'account_id': account.destination.destination_id if account else None,
-                    'class_id': class_id,
-                    'customer_id': customer_id,
-                    'amount': lineitem.amount,
-                    'description': lineitem.purpose
-                }
-            )
+            account_id = mapping_resolver.get_account_id_or_none(lineitem)
 
-            credit_card_purchase_lineitem_objects.append(credit_card_purchase_lineitem_object)
+            class_id = mapping_resolver.get_class_id_or_none(lineitem)
 
-        return credit_card_purchase_lineitem_objects
+            customer_id = mapping_resolver.get_customer_id_or_none(lineitem)
+
+            credit_card_purchase_lineitems.append({
+                'credit_card_purchase_id': credit_card_purchase.id,
+                'expense_id': lineitem.id,
+                'account_id': account_id,
+                'class_id': class_id,
+                'customer_id': customer_id,
+                'amount': lineitem.amount,
+                'description': lineitem.purpose
+            })
+
+        return bulk_upsert_lineitems(CreditCardPurchaseLineitem, credit_card_purchase_lineitems)
 
 
 class JournalEntry(models.Model):
@@ -440,13 +517,25 @@ class JournalEntry(models.Model):
     """
     id = models.AutoField(primary_key=True)
     expense_group = models.OneToOneField(ExpenseGroup, on_delete=models.PROTECT, help_text='Expense group reference')
+    workspace = models.ForeignKey(Workspace, on_delete=models.PROTECT, help_text='Workspace of the expense group')
     transaction_date = models.DateField(help_text='JournalEntry transaction date')
     currency = models.CharField(max_length=255, help_text='JournalEntry Currency')
     private_note = models.TextField(help_text='JournalEntry Description')
     journal_entry_number = models.CharField(max_length=255, unique=True)
+    qbo_id = models.CharField(max_length=255, help_text='QBO object id', null=True)
+    qbo_request_id = models.CharField(max_length=255, help_text='QBO request id used to post the export', null=True)
+    qbo_batch_request_id = models.CharField(
+        max_length=255, help_text='QBO request id of the batch the export was posted in', null=True
+    )
+    export_state = models.CharField(max_length=255, help_text='Export state - PREPARED / EXPORTED', default='PREPARED')
     created_at = models.DateTimeField(auto_now_add=True, help_text='Created at')
     updated_at = models.DateTimeField(auto_now=True, help_text='Updated at')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['workspace', 'updated_at', 'id'], name='journal_entry_keyset_idx')
+        ]
+
     @staticmethod
     def create_journal_entry(expense_group: ExpenseGroup):
         """
@@ -459,6 +548,7 @@ class JournalEntry(models.Model):
         journal_entry_object, _ = JournalEntry.objects.update_or_create(
             expense_group=expense_group,
             defaults={
+                'workspace_id': expense_group.workspace_id,
                 'transaction_date': datetime.now().strftime("%Y-%m-%d"),
                 'private_note': 'Report {0} / {1} exported on {2}'.format(
                     expense.claim_number, expense.report_id, datetime.now().strftime("%Y-%m-%d")
@@ -490,12 +580,15 @@ class JournalEntryLineitem(models.Model):
     updated_at = models.DateTimeField(auto_now=True, help_text='Updated at')
 
     @staticmethod
-    def create_journal_entry_lineitems(expense_group: ExpenseGroup):
+    def create_journal_entry_lineitems(expense_group: ExpenseGroup, mapping_resolver: MappingResolver = None):
         """
         Create journal_entry lineitems
         :param expense_group: expense group
+        :param mapping_resolver: mapping resolver of the export
         :return: lineitems objects
         """
+        mapping_resolver = mapping_resolver or MappingResolver(expense_group.workspace_id, [expense_group])
+
         expenses = expense_group.expenses.all()
         qbo_journal_entry = JournalEntry.objects.get(expense_group=expense_group)
 
@@ -504,12 +597,7 @@ class JournalEntryLineitem(models.Model):
         debit_account_id = None
         entity_type = None
 
-        entity = Mapping.objects.get(
-            Q(destination_type='EMPLOYEE') | Q(destination_type='VENDOR'),
-            source_type='EMPLOYEE',
-            source__value=description.get('employee_email'),
-            workspace_id=expense_group.workspace_id
-        )
+        entity = mapping_resolver.get_mapping('EMPLOYEE', ['EMPLOYEE', 'VENDOR'], description.get('employee_email'))
 
         if expense_group.fund_source == 'PERSONAL':
             if entity.destination_type == 'VENDOR':
@@ -519,11 +607,8 @@ class JournalEntryLineitem(models.Model):
                 debit_account_id = GeneralMapping.objects.get(
                     workspace_id=expense_group.workspace_id).bank_account_id
         elif expense_group.fund_source == 'CCC':
-            debit_account_id = Mapping.objects.get(
-                source_type='EMPLOYEE',
-                destination_type='CREDIT_CARD_ACCOUNT',
-                source__value=description.get('employee_email'),
-                workspace_id=expense_group.workspace_id
+            debit_account_id = mapping_resolver.get_mapping(
+                'EMPLOYEE', ['CREDIT_CARD_ACCOUNT'], description.get('employee_email')
             ).destination.destination_id
 
         if entity.destination_type == 'EMPLOYEE':
@@ -531,40 +616,29 @@ class JournalEntryLineitem(models.Model):
         elif entity.destination_type == 'VENDOR':
             entity_type = 'Vendor'
 
-        journal_entry_lineitem_objects = []
+        journal_entry_lineitems = []
 
         for lineitem in expenses:
-            category = lineitem.category if lineitem.category == lineitem.sub_category else '{0} / {1}'.format(
-                lineitem.category, lineitem.sub_category)
-
-            account: Mapping = Mapping.objects.filter(
-                source_type='CATEGORY',
-                destination_type='ACCOUNT',
-                source__value=category,
-                workspace_id=expense_group.workspace_id
-            ).first()
-
-            class_id = get_class_id_or_none(expense_group, lineitem)
-
-            customer_id = get_customer_id_or_none(expense_group, lineitem)
-
-            department_id = get_department_id_or_none(expense_group)
-
-            journal_entry_lineitem_object, _ = JournalEntryLineitem.objects.update_or_create(
-                journal_entry=qbo_journal_entry,
-                expense_id=lineitem.id,
-                defaults={
-                    'debit_account_id': debit_account_id,
-                    'account_id': account.destination.destination_id if account else None,
-                    'class_id': class_id,
-                    'entity_id': entity.destination.destination_id,
-                    'entity_type': entity_type,
-                    'customer_id': customer_id,
-                    'amount': lineitem.amount,
-                    'department_id': department_id,
-                    'description': lineitem.purpose
-                }
-            )
+            account_id = mapping_resolver.get_account_id_or_none(lineitem)
+
+            class_id = mapping_resolver.get_class_id_or_none(lineitem)
+
+            customer_id = mapping_resolver.get_customer_id_or_none(lineitem)
+
+            department_id = mapping_resolver.get_department_id_or_none(expense_group)
+
+            journal_entry_lineitems.append({
+                'journal_entry_id': qbo_journal_entry.id,
+                'expense_id': lineitem.id,
+                'debit_account_id': debit_account_id,
+                'account_id': account_id,
+                'class_id': class_id,
+                'entity_id': entity.destination.destination_id,
+                'entity_type': entity_type,
+                'customer_id': customer_id,
+                'amount': lineitem.amount,
+                'department_id': department_id,
+                'description': lineitem.purpose
+            })
 
-            journal_entry_lineitem_objects.append(journal_entry_lineitem_object)
-        return journal_entry_lineitem_objects
+        return bulk_upsert_lineitems(JournalEntryLineitem, journal_entry_lineitems)
@@ -1,18 +1,24 @@
 import logging
 import json
+import os
+import socket
+import threading
 import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from typing import List
 
 from django.conf import settings
-from django.db import transaction
-from django.db.models import Q
+from django.db import transaction, connection
+from django.utils import timezone
+from django_q.tasks import async_task
 
 from qbosdk.exceptions import WrongParamsError
 
-from fyle_accounting_mappings.models import Mapping
-
 from fyle_jobs import FyleJobsSDK
-from fyle_qbo_api.exceptions import BulkError
+from fyle_qbo_api.exceptions import BulkError, BatchError
+from fyle_qbo_api.utils import InFlightBytesLimiter, chunk_list
 
 from apps.fyle.models import ExpenseGroup
 from apps.tasks.models import TaskLog
@@ -21,15 +27,55 @@ from apps.workspaces.models import QBOCredential, FyleCredential
 from apps.fyle.utils import FyleConnector
 
 from .models import Bill, BillLineitem, Cheque, ChequeLineitem, CreditCardPurchase, CreditCardPurchaseLineitem,\
-    JournalEntry, JournalEntryLineitem
+    JournalEntry, JournalEntryLineitem, MappingResolver, get_expense_category
 from .utils import QBOConnector
 
 logger = logging.getLogger(__name__)
 
+EXPORTED_OBJECT_TYPES = {
+    Bill: 'BILL',
+    Cheque: 'CHECK',
+    CreditCardPurchase: 'CREDIT CARD PURCHASE',
+    JournalEntry: 'JOURNAL ENTRY'
+}
+
+
+def __load_attachment(fyle_connector: FyleConnector, qbo_connection: QBOConnector, ref_id: str, ref_type: str,
+                      expense_id: str, limiter: InFlightBytesLimiter):
+    """
+    Stream the attachment of an expense from Fyle into QBO
+    :param fyle_connector: Fyle connector
+    :param qbo_connection: QBO Connection
+    :param ref_id: object id
+    :param ref_type: type of object
+    :param expense_id: Fyle expense id
+    :param limiter: limiter of the bytes in flight
+    :return: None
+    """
+    # Fyle returns the file content with its metadata, reserve the largest expected size before downloading
+    reserved_size = settings.ATTACHMENT_MAX_BYTES
+    limiter.acquire(reserved_size)
+
+    try:
+        attachment = fyle_connector.get_attachment(expense_id)
+
+        if attachment:
+            size = len(attachment['content'])
+
+            if size < reserved_size:
+                limiter.release(reserved_size - size)
+            elif size > reserved_size:
+                limiter.acquire(size - reserved_size, block=False)
+            reserved_size = size
+
+            qbo_connection.post_attachment(ref_id, ref_type, attachment)
+    finally:
+        limiter.release(reserved_size)
+
 
 def load_attachments(qbo_connection: QBOConnector, ref_id: str, ref_type: str, expense_group: ExpenseGroup):
     """
-    Get attachments from fyle
+    Get attachments from fyle and upload them to QBO, ATTACHMENT_WORKERS expenses at a time
     :param qbo_connection: QBO Connection
     :param ref_id: object id
     :param ref_type: type of object
@@ -37,10 +83,26 @@ def load_attachments(qbo_connection: QBOConnector, ref_id: str, ref_type: str, e
     """
     try:
         fyle_credentials = FyleCredential.objects.get(workspace_id=expense_group.workspace_id)
-        expense_ids = expense_group.expenses.values_list('expense_id', flat=True)
+        expense_ids = list(expense_group.expenses.values_list('expense_id', flat=True))
         fyle_connector = FyleConnector(fyle_credentials.refresh_token, expense_group.workspace_id)
-        attachments = fyle_connector.get_attachments(expense_ids)
-        qbo_connection.post_attachments(ref_id, ref_type, attachments)
+        limiter = InFlightBytesLimiter(settings.ATTACHMENT_MAX_IN_FLIGHT_BYTES)
+
+        with ThreadPoolExecutor(max_workers=settings.ATTACHMENT_WORKERS) as executor:
+            futures = {
+                executor.submit(
+                    __load_attachment, fyle_connector, qbo_connection, ref_id, ref_type, expense_id, limiter
+                ): expense_id for expense_id in expense_ids
+            }
+
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception:
+                    error = traceback.format_exc()
+                    logger.error(
+                        'Attachment failed for expense id %s / expense group id %s / workspace id %s \n Error: %s',
+                        futures[future], expense_group.id, expense_group.workspace_id, error
+                    )
     except Exception:
         error = traceback.format_exc()
         logger.error(
@@ -49,6 +111,334 @@ def load_attachments(qbo_connection: QBOConnector, ref_id: str, ref_type: str, e
         )
 
 
+def __create_export_task_logs(expense_groups: List[ExpenseGroup], task_type: str) -> List[TaskLog]:
+    """
+    Mark the export task logs of expense groups as in progress, creating the missing ones in bulk
+    :param expense_groups: expense groups of one workspace
+    :param task_type: export task type
+    :return: task logs in the order of expense groups
+    """
+    expense_groups = list(expense_groups)
+
+    if not expense_groups:
+        return []
+
+    existing_task_logs = {
+        task_log.expense_group_id: task_log for task_log in TaskLog.objects.filter(
+            workspace_id=expense_groups[0].workspace_id,
+            expense_group_id__in=[expense_group.id for expense_group in expense_groups]
+        )
+    }
+
+    now = timezone.now()
+    new_task_logs = []
+
+    for expense_group in expense_groups:
+        task_log = existing_task_logs.get(expense_group.id)
+
+        if task_log:
+            task_log.status = 'IN_PROGRESS'
+            task_log.type = task_type
+            task_log.updated_at = now
+        else:
+            new_task_logs.append(TaskLog(
+                workspace_id=expense_group.workspace_id,
+                expense_group=expense_group,
+                status='IN_PROGRESS',
+                type=task_type
+            ))
+
+    TaskLog.objects.bulk_update(
+        existing_task_logs.values(), ['status', 'type', 'updated_at'], batch_size=settings.BULK_UPSERT_CHUNK_SIZE
+    )
+    new_task_logs = {
+        task_log.expense_group_id: task_log for task_log in TaskLog.objects.bulk_create(
+            new_task_logs, batch_size=settings.BULK_UPSERT_CHUNK_SIZE
+        )
+    }
+
+    return [
+        existing_task_logs.get(expense_group.id) or new_task_logs[expense_group.id] for expense_group in expense_groups
+    ]
+
+
+def __trigger_export_jobs(jobs: FyleJobsSDK, task_logs: List[TaskLog], callback_path: str, export_name: str,
+                          workspace_id: int, user: str):
+    """
+    Trigger Fyle Jobs callbacks for export task logs, one for the whole run in batch callback mode
+    or one per expense group otherwise
+    :param jobs: Fyle Jobs SDK
+    :param task_logs: task logs of the expense groups to export
+    :param callback_path: path of the export view under /qbo/
+    :param export_name: export object name used in job descriptions
+    :param workspace_id: workspace id
+    :param user: user email
+    :return: None
+    """
+    if not task_logs:
+        return
+
+    callback_url = '{0}{1}'.format(settings.API_URL, '/workspaces/{0}/qbo/{1}/'.format(workspace_id, callback_path))
+
+    if settings.FYLE_JOBS_BATCH_CALLBACK:
+        created_job = jobs.trigger_now(
+            callback_url=callback_url,
+            callback_method='POST', object_id=task_logs[0].id, payload={
+                'task_logs': [
+                    {
+                        'expense_group_id': task_log.expense_group_id,
+                        'task_log_id': task_log.id
+                    } for task_log in task_logs
+                ]
+            }, job_description='Create {0}: Workspace id - {1}, user - {2}, expense groups - {3}'.format(
+                export_name, workspace_id, user, len(task_logs)
+            )
+        )
+
+        TaskLog.objects.filter(id__in=[task_log.id for task_log in task_logs]).update(task_id=created_job['id'])
+    else:
+        for task_log in task_logs:
+            created_job = jobs.trigger_now(
+                callback_url=callback_url,
+                callback_method='POST', object_id=task_log.id, payload={
+                    'expense_group_id': task_log.expense_group_id,
+                    'task_log_id': task_log.id
+                }, job_description='Create {0}: Workspace id - {1}, user - {2}, expense group id - {3}'.format(
+                    export_name, workspace_id, user, task_log.expense_group_id
+                )
+            )
+            task_log.task_id = created_job['id']
+            task_log.save(update_fields=['task_id'])
+
+
+def __prepare_request_id(export_object):
+    """
+    Give a prepared export object the QBO request id it keeps until QBO rejects it
+    :param export_object: Bill / Cheque / CreditCardPurchase / JournalEntry
+    :return: None
+    """
+    if not export_object.qbo_request_id:
+        export_object.qbo_request_id = str(uuid.uuid4())
+        export_object.save(update_fields=['qbo_request_id', 'updated_at'])
+
+
+def __prepare_batch_request_ids(export_objects: List):
+    """
+    Put prepared export objects that are in no batch yet into new batches of upto QBO_BATCH_SIZE,
+    an export object keeps its batch until QBO rejects it so that a repeated batch is never a different one
+    :param export_objects: Bill / Cheque / CreditCardPurchase / JournalEntry objects of one type
+    :return: None
+    """
+    unbatched_export_objects = [
+        export_object for export_object in export_objects if not export_object.qbo_batch_request_id
+    ]
+
+    for chunk in chunk_list(unbatched_export_objects, settings.QBO_BATCH_SIZE):
+        batch_request_id = str(uuid.uuid4())
+        updated_at = timezone.now()
+
+        for export_object in chunk:
+            export_object.qbo_batch_request_id = batch_request_id
+            export_object.updated_at = updated_at
+
+        type(chunk[0]).objects.filter(id__in=[export_object.id for export_object in chunk]).update(
+            qbo_batch_request_id=batch_request_id, updated_at=updated_at
+        )
+
+
+def __reset_request_id(export_object):
+    """
+    Drop the QBO request ids of a rejected export so that the next attempt is not answered with the rejection
+    :param export_object: Bill / Cheque / CreditCardPurchase / JournalEntry
+    :return: None
+    """
+    export_object.qbo_request_id = None
+    export_object.qbo_batch_request_id = None
+    export_object.save(update_fields=['qbo_request_id', 'qbo_batch_request_id', 'updated_at'])
+
+
+def __fail_unposted_export(export_object, task_log: TaskLog, batch_error: BatchError, in_failed_batch: bool):
+    """
+    Fail the task log of an export whose batch got no response. Only an export QBO rejected loses its request ids,
+    one whose batch may have gone through or was never sent keeps them so that the next attempt is not a duplicate
+    :param export_object: Bill / Cheque / CreditCardPurchase / JournalEntry
+    :param task_log: task log of the export
+    :param batch_error: batch error
+    :param in_failed_batch: whether the export was in the failed batch, later batches were not sent
+    :return: None
+    """
+    if in_failed_batch and isinstance(batch_error.error, WrongParamsError):
+        __reset_request_id(export_object)
+        task_log.status = 'FAILED'
+        task_log.detail = json.loads(batch_error.error.response)
+        return
+
+    task_log.status = 'FATAL'
+    task_log.detail = {
+        'error': ''.join(traceback.format_exception(
+            type(batch_error.error), batch_error.error, batch_error.error.__traceback__
+        )) if in_failed_batch else 'Not exported, an earlier batch request failed'
+    }
+
+
+def __post_export(post, export_object, lineitems):
+    """
+    Post a prepared export object to QBO, outside of any transaction
+    :param post: QBOConnector method posting the export object
+    :param export_object: Bill / Cheque / CreditCardPurchase / JournalEntry
+    :param lineitems: lineitems of the export object
+    :return: created QBO object
+    """
+    try:
+        return post(export_object, lineitems)
+    except WrongParamsError:
+        __reset_request_id(export_object)
+        raise
+
+
+def __record_export(export_object, qbo_id: str):
+    """
+    Record the QBO id of a posted export object and mark its expense group exported
+    :param export_object: Bill / Cheque / CreditCardPurchase / JournalEntry
+    :param qbo_id: QBO object id
+    :return: None
+    """
+    export_object.qbo_id = qbo_id
+    export_object.export_state = 'EXPORTED'
+    export_object.save(update_fields=['qbo_id', 'export_state', 'updated_at'])
+
+    ExpenseGroup.mark_exported(export_object.expense_group_id, EXPORTED_OBJECT_TYPES[type(export_object)])
+
+
+def __create_exports_batch(expense_groups: List[ExpenseGroup], task_logs: List[TaskLog], prepare_export,
+                           post_batch, object_type: str, task_log_field: str):
+    """
+    Export expense groups to QBO through batch requests, preparing, posting and recording them in separate phases
+    :param expense_groups: expense groups of one workspace
+    :param task_logs: task logs of the expense groups
+    :param prepare_export: function creating the export object and its lineitems for an expense group
+    :param post_batch: QBOConnector method posting (export object, lineitems) pairs in batches
+    :param object_type: QBO object type of the export object
+    :param task_log_field: task log field referencing the export object
+    :return: None
+    """
+    task_logs = {task_log.expense_group_id: task_log for task_log in task_logs}
+    prepared_exports = []
+    exported_objects = []
+
+    try:
+        qbo_credentials = QBOCredential.objects.get(workspace_id=expense_groups[0].workspace_id)
+
+        qbo_connection = QBOConnector.get_connector(qbo_credentials, expense_groups[0].workspace_id)
+
+        mapping_resolver = MappingResolver(expense_groups[0].workspace_id, expense_groups)
+
+        for expense_group in expense_groups:
+            task_log = task_logs[expense_group.id]
+            try:
+                with transaction.atomic():
+                    __validate_expense_group(expense_group, mapping_resolver)
+
+                    export_object, lineitems = prepare_export(expense_group, mapping_resolver)
+
+                    __prepare_request_id(export_object)
+
+                prepared_exports.append((expense_group, export_object, lineitems))
+
+            except BulkError as exception:
+                logger.error(exception.response)
+                task_log.status = 'FAILED'
+                task_log.detail = exception.response
+
+            except Exception:
+                error = traceback.format_exc()
+                task_log.detail = {
+                    'error': error
+                }
+                task_log.status = 'FATAL'
+                logger.exception('Something unexpected happened workspace_id: %s\n%s', task_log.workspace_id, error)
+
+        if prepared_exports:
+            __prepare_batch_request_ids([export_object for _, export_object, _ in prepared_exports])
+
+            batch_error = None
+
+            try:
+                batch_item_responses = post_batch(
+                    qbo_connection, [(export_object, lineitems) for _, export_object, lineitems in prepared_exports]
+                )
+            except BatchError as exception:
+                # the batches posted before the failed one are recorded, their objects exist in QBO
+                batch_error = exception
+                batch_item_responses = exception.responses
+                logger.error('Batch export failed workspace_id: %s %s', expense_groups[0].workspace_id,
+                             getattr(exception.error, 'response', exception.error))
+
+            for index, ((expense_group, export_object, _), response) in enumerate(
+                    zip(prepared_exports, batch_item_responses)):
+                task_log = task_logs[expense_group.id]
+
+                if response is None:
+                    __fail_unposted_export(export_object, task_log, batch_error, index in batch_error.failed_indexes)
+                    continue
+
+                if 'Fault' in response:
+                    logger.error(response['Fault'])
+                    __reset_request_id(export_object)
+
+                    task_log.status = 'FAILED'
+                    task_log.detail = {
+                        'Fault': response['Fault']
+                    }
+                    continue
+
+                with transaction.atomic():
+                    __record_export(export_object, response[object_type]['Id'])
+
+                    task_log.detail = {
+                        object_type: response[object_type]
+                    }
+                    setattr(task_log, task_log_field, export_object)
+                    task_log.status = 'COMPLETE'
+                    task_log.save()
+
+                exported_objects.append((response[object_type]['Id'], expense_group))
+
+        for ref_id, expense_group in exported_objects:
+            load_attachments(qbo_connection, ref_id, object_type, expense_group)
+
+    except QBOCredential.DoesNotExist:
+        logger.exception('QBO Credentials not found for workspace_id %s', expense_groups[0].workspace_id)
+        for task_log in task_logs.values():
+            if task_log.status == 'IN_PROGRESS':
+                task_log.status = 'FAILED'
+                task_log.detail = {
+                    'expense_group_id': task_log.expense_group_id,
+                    'message': 'QBO Account not connected'
+                }
+
+    except WrongParamsError as exception:
+        logger.error(exception.response)
+        for task_log in task_logs.values():
+            if task_log.status == 'IN_PROGRESS':
+                task_log.status = 'FAILED'
+                task_log.detail = json.loads(exception.response)
+
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception('Something unexpected happened workspace_id: %s\n%s', expense_groups[0].workspace_id, error)
+        for task_log in task_logs.values():
+            if task_log.status == 'IN_PROGRESS':
+                task_log.status = 'FATAL'
+                task_log.detail = {
+                    'error': error
+                }
+
+    for task_log in task_logs.values():
+        if task_log.status != 'COMPLETE':
+            task_log.save()
+
+
 def schedule_bills_creation(workspace_id: int, expense_group_ids: List[str], user):
     """
     Schedule bills creation
@@ -59,57 +449,45 @@ def schedule_bills_creation(workspace_id: int, expense_group_ids: List[str], use
     """
     if expense_group_ids:
         expense_groups = ExpenseGroup.objects.filter(
-            workspace_id=workspace_id, id__in=expense_group_ids, bill__id__isnull=True
-        ).all()
+            workspace_id=workspace_id, id__in=expense_group_ids
+        ).exclude(export_status='EXPORTED').all()
     else:
         expense_groups = ExpenseGroup.objects.filter(
-            workspace_id=workspace_id, bill__id__isnull=True
-        ).all()
+            workspace_id=workspace_id
+        ).exclude(export_status='EXPORTED').all()
 
     fyle_credentials = FyleCredential.objects.get(
         workspace_id=workspace_id)
     fyle_connector = FyleConnector(fyle_credentials.refresh_token, workspace_id)
     fyle_sdk_connection = fyle_connector.connection
-    jobs = FyleJobsSDK(settings.FYLE_JOBS_URL, fyle_sdk_connection)
+    jobs = FyleJobsSDK(settings.FYLE_JOBS_URL, fyle_sdk_connection, workspace_id)
 
-    for expense_group in expense_groups:
-        task_log, _ = TaskLog.objects.update_or_create(
-            workspace_id=expense_group.workspace_id,
-            expense_group=expense_group,
-            defaults={
-                'status': 'IN_PROGRESS',
-                'type': 'CREATING_BILL'
-            }
-        )
-        created_job = jobs.trigger_now(
-            callback_url='{0}{1}'.format(settings.API_URL, '/workspaces/{0}/qbo/bills/'.format(workspace_id)),
-            callback_method='POST', object_id=task_log.id, payload={
-                'expense_group_id': expense_group.id,
-                'task_log_id': task_log.id
-            }, job_description='Create Bill: Workspace id - {0}, user - {1}, expense group id - {2}'.format(
-                workspace_id, user, expense_group.id
-            )
-        )
-        task_log.task_id = created_job['id']
-        task_log.save()
+    task_logs = __create_export_task_logs(expense_groups, 'CREATING_BILL')
+
+    __trigger_export_jobs(jobs, task_logs, 'bills', 'Bill', workspace_id, user)
 
 
 def create_bill(expense_group, task_log):
     try:
+        qbo_credentials = QBOCredential.objects.get(workspace_id=expense_group.workspace_id)
+
+        qbo_connection = QBOConnector.get_connector(qbo_credentials, expense_group.workspace_id)
+
         with transaction.atomic():
-            __validate_expense_group(expense_group)
+            mapping_resolver = MappingResolver(expense_group.workspace_id, [expense_group])
 
-            bill_object = Bill.create_bill(expense_group)
+            __validate_expense_group(expense_group, mapping_resolver)
 
-            bill_lineitems_objects = BillLineitem.create_bill_lineitems(expense_group)
+            bill_object = Bill.create_bill(expense_group, mapping_resolver)
 
-            qbo_credentials = QBOCredential.objects.get(workspace_id=expense_group.workspace_id)
+            bill_lineitems_objects = BillLineitem.create_bill_lineitems(expense_group, mapping_resolver)
 
-            qbo_connection = QBOConnector(qbo_credentials, expense_group.workspace_id)
+            __prepare_request_id(bill_object)
 
-            created_bill = qbo_connection.post_bill(bill_object, bill_lineitems_objects)
+        created_bill = __post_export(qbo_connection.post_bill, bill_object, bill_lineitems_objects)
 
-            load_attachments(qbo_connection, created_bill['Bill']['Id'], 'Bill', expense_group)
+        with transaction.atomic():
+            __record_export(bill_object, created_bill['Bill']['Id'])
 
             task_log.detail = created_bill
             task_log.bill = bill_object
@@ -117,6 +495,8 @@ def create_bill(expense_group, task_log):
 
             task_log.save(update_fields=['detail', 'bill', 'status'])
 
+        load_attachments(qbo_connection, created_bill['Bill']['Id'], 'Bill', expense_group)
+
     except QBOCredential.DoesNotExist:
         logger.exception(
             'QBO Credentials not found for workspace_id %s / expense group %s',
@@ -158,7 +538,27 @@ def create_bill(expense_group, task_log):
         logger.exception('Something unexpected happened workspace_id: %s\n%s', task_log.workspace_id, error)
 
 
-def __validate_expense_group(expense_group: ExpenseGroup):
+def __prepare_bill(expense_group: ExpenseGroup, mapping_resolver: MappingResolver):
+    bill_object = Bill.create_bill(expense_group, mapping_resolver)
+
+    bill_lineitems_objects = BillLineitem.create_bill_lineitems(expense_group, mapping_resolver)
+
+    return bill_object, bill_lineitems_objects
+
+
+def create_bills_batch(expense_groups: List[ExpenseGroup], task_logs: List[TaskLog]):
+    """
+    Create bills in QBO through batch requests
+    :param expense_groups: expense groups
+    :param task_logs: task logs of the expense groups
+    :return: None
+    """
+    __create_exports_batch(
+        expense_groups, task_logs, __prepare_bill, QBOConnector.post_bills_batch, 'Bill', 'bill'
+    )
+
+
+def __validate_expense_group(expense_group: ExpenseGroup, mapping_resolver: MappingResolver):
     bulk_errors = []
     row = 0
 
@@ -173,14 +573,8 @@ def __validate_expense_group(expense_group: ExpenseGroup):
             'message': 'General mapping not found'
         })
 
-    try:
-        Mapping.objects.get(
-            Q(destination_type='VENDOR') | Q(destination_type='EMPLOYEE'),
-            source_type='EMPLOYEE',
-            source__value=expense_group.description.get('employee_email'),
-            workspace_id=expense_group.workspace_id
-        )
-    except Mapping.DoesNotExist:
+    if not mapping_resolver.get_mapping_or_none(
+            'EMPLOYEE', ['VENDOR', 'EMPLOYEE'], expense_group.description.get('employee_email')):
         bulk_errors.append({
             'row': None,
             'expense_group_id': expense_group.id,
@@ -192,19 +586,12 @@ def __validate_expense_group(expense_group: ExpenseGroup):
     expenses = expense_group.expenses.all()
 
     for lineitem in expenses:
-        category = lineitem.category if lineitem.category == lineitem.sub_category else '{0} / {1}'.format(
-            lineitem.category, lineitem.sub_category)
-
-        account = Mapping.objects.filter(
-            source_type='CATEGORY',
-            source__value=category,
-            workspace_id=expense_group.workspace_id
-        ).first()
+        account = mapping_resolver.get_category_mapping_or_none(lineitem)
         if not account:
             bulk_errors.append({
                 'row': row,
                 'expense_group_id': expense_group.id,
-                'value': category,
+                'value': get_expense_category(lineitem),
                 'type': 'Category Mapping',
                 'message': 'Category Mapping not found'
             })
@@ -225,53 +612,41 @@ def schedule_cheques_creation(workspace_id: int, expense_group_ids: List[str], u
     """
     if expense_group_ids:
         expense_groups = ExpenseGroup.objects.filter(
-            workspace_id=workspace_id, id__in=expense_group_ids, cheque__id__isnull=True
-        ).all()
+            workspace_id=workspace_id, id__in=expense_group_ids
+        ).exclude(export_status='EXPORTED').all()
 
         fyle_credentials = FyleCredential.objects.get(
             workspace_id=workspace_id)
-        fyle_connector = FyleConnector(fyle_credentials.refresh_token)
+        fyle_connector = FyleConnector(fyle_credentials.refresh_token, workspace_id)
         fyle_sdk_connection = fyle_connector.connection
-        jobs = FyleJobsSDK(settings.FYLE_JOBS_URL, fyle_sdk_connection)
+        jobs = FyleJobsSDK(settings.FYLE_JOBS_URL, fyle_sdk_connection, workspace_id)
 
-        for expense_group in expense_groups:
-            task_log, _ = TaskLog.objects.update_or_create(
-                workspace_id=expense_group.workspace_id,
-                expense_group=expense_group,
-                defaults={
-                    'status': 'IN_PROGRESS',
-                    'type': 'CREATING_CHECK'
-                }
-            )
-            created_job = jobs.trigger_now(
-                callback_url='{0}{1}'.format(settings.API_URL, '/workspaces/{0}/qbo/checks/'.format(workspace_id)),
-                callback_method='POST', object_id=task_log.id, payload={
-                    'expense_group_id': expense_group.id,
-                    'task_log_id': task_log.id
-                }, job_description='Create Check: Workspace id - {0}, user - {1}, expense group id - {2}'.format(
-                    workspace_id, user, expense_group.id
-                )
-            )
-            task_log.task_id = created_job['id']
-            task_log.save()
+        task_logs = __create_export_task_logs(expense_groups, 'CREATING_CHECK')
+
+        __trigger_export_jobs(jobs, task_logs, 'checks', 'Check', workspace_id, user)
 
 
 def create_cheque(expense_group, task_log):
     try:
+        qbo_credentials = QBOCredential.objects.get(workspace_id=expense_group.workspace_id)
+
+        qbo_connection = QBOConnector.get_connector(qbo_credentials, expense_group.workspace_id)
+
         with transaction.atomic():
-            __validate_expense_group(expense_group)
+            mapping_resolver = MappingResolver(expense_group.workspace_id, [expense_group])
 
-            cheque_object = Cheque.create_cheque(expense_group)
+            __validate_expense_group(expense_group, mapping_resolver)
 
-            cheque_line_item_objects = ChequeLineitem.create_cheque_lineitems(expense_group)
+            cheque_object = Cheque.create_cheque(expense_group, mapping_resolver)
 
-            qbo_credentials = QBOCredential.objects.get(workspace_id=expense_group.workspace_id)
+            cheque_line_item_objects = ChequeLineitem.create_cheque_lineitems(expense_group, mapping_resolver)
 
-            qbo_connection = QBOConnector(qbo_credentials, expense_group.workspace_id)
+            __prepare_request_id(cheque_object)
 
-            created_cheque = qbo_connection.post_cheque(cheque_object, cheque_line_item_objects)
+        created_cheque = __post_export(qbo_connection.post_cheque, cheque_object, cheque_line_item_objects)
 
-            load_attachments(qbo_connection, created_cheque['Purchase']['Id'], 'Purchase', expense_group)
+        with transaction.atomic():
+            __record_export(cheque_object, created_cheque['Purchase']['Id'])
 
             task_log.detail = created_cheque
             task_log.cheque = cheque_object
@@ -279,6 +654,8 @@ def create_cheque(expense_group, task_log):
 
             task_log.save(update_fields=['detail', 'cheque', 'status'])
 
+        load_attachments(qbo_connection, created_cheque['Purchase']['Id'], 'Purchase', expense_group)
+
     except QBOCredential.DoesNotExist:
         logger.exception(
             'QBO Credentials not found for workspace_id %s / expense group %s',
@@ -320,6 +697,26 @@ def create_cheque(expense_group, task_log):
         logger.exception('Something unexpected happened workspace_id: %s\n%s', task_log.workspace_id, error)
 
 
+def __prepare_cheque(expense_group: ExpenseGroup, mapping_resolver: MappingResolver):
+    cheque_object = Cheque.create_cheque(expense_group, mapping_resolver)
+
+    cheque_line_item_objects = ChequeLineitem.create_cheque_lineitems(expense_group, mapping_resolver)
+
+    return cheque_object, cheque_line_item_objects
+
+
+def create_cheques_batch(expense_groups: List[ExpenseGroup], task_logs: List[TaskLog]):
+    """
+    Create cheques in QBO through batch requests
+    :param expense_groups: expense groups
+    :param task_logs: task logs of the expense groups
+    :return: None
+    """
+    __create_exports_batch(
+        expense_groups, task_logs, __prepare_cheque, QBOConnector.post_cheques_batch, 'Purchase', 'cheque'
+    )
+
+
 def schedule_credit_card_purchase_creation(workspace_id: int, expense_group_ids: List[str], user: str):
     """
     Schedule credit card purchase creation
@@ -330,59 +727,48 @@ def schedule_credit_card_purchase_creation(workspace_id: int, expense_group_ids:
     """
     if expense_group_ids:
         expense_groups = ExpenseGroup.objects.filter(
-            workspace_id=workspace_id, id__in=expense_group_ids, creditcardpurchase__id__isnull=True
-        ).all()
+            workspace_id=workspace_id, id__in=expense_group_ids
+        ).exclude(export_status='EXPORTED').all()
 
         fyle_credentials = FyleCredential.objects.get(
             workspace_id=workspace_id)
-        fyle_connector = FyleConnector(fyle_credentials.refresh_token)
+        fyle_connector = FyleConnector(fyle_credentials.refresh_token, workspace_id)
         fyle_sdk_connection = fyle_connector.connection
-        jobs = FyleJobsSDK(settings.FYLE_JOBS_URL, fyle_sdk_connection)
+        jobs = FyleJobsSDK(settings.FYLE_JOBS_URL, fyle_sdk_connection, workspace_id)
 
-        for expense_group in expense_groups:
-            task_log, _ = TaskLog.objects.update_or_create(
-                workspace_id=expense_group.workspace_id,
-                expense_group=expense_group,
-                defaults={
-                    'status': 'IN_PROGRESS',
-                    'type': 'CREATING_CREDIT_CARD_PURCHASE'
-                }
-            )
-            created_job = jobs.trigger_now(
-                callback_url='{0}{1}'.format(settings.API_URL, '/workspaces/{0}/qbo/credit_card_purchases/'.format(
-                    workspace_id
-                )),
-                callback_method='POST', object_id=task_log.id, payload={
-                    'expense_group_id': expense_group.id,
-                    'task_log_id': task_log.id
-                }, job_description=
-                'Create Credit Card Purchase: Workspace id - {0}, user - {1}, expense group id - {2}'.format(
-                    workspace_id, user, expense_group.id
-                )
-            )
-            task_log.task_id = created_job['id']
-            task_log.save()
+        task_logs = __create_export_task_logs(expense_groups, 'CREATING_CREDIT_CARD_PURCHASE')
+
+        __trigger_export_jobs(jobs, task_logs, 'credit_card_purchases', 'Credit Card Purchase', workspace_id, user)
 
 
 def create_credit_card_purchase(expense_group, task_log):
     try:
+        qbo_credentials = QBOCredential.objects.get(workspace_id=expense_group.workspace_id)
+
+        qbo_connection = QBOConnector.get_connector(qbo_credentials, expense_group.workspace_id)
+
         with transaction.atomic():
-            __validate_expense_group(expense_group)
+            mapping_resolver = MappingResolver(expense_group.workspace_id, [expense_group])
+
+            __validate_expense_group(expense_group, mapping_resolver)
 
-            credit_card_purchase_object = CreditCardPurchase.create_credit_card_purchase(expense_group)
+            credit_card_purchase_object = CreditCardPurchase.create_credit_card_purchase(
+                expense_group, mapping_resolver
+            )
 
             credit_card_purchase_lineitems_objects = CreditCardPurchaseLineitem.create_credit_card_purchase_lineitems(
-                expense_group
+                expense_group, mapping_resolver
             )
-            qbo_credentials = QBOCredential.objects.get(workspace_id=expense_group.workspace_id)
 
-            qbo_connection = QBOConnector(qbo_credentials, expense_group.workspace_id)
+            __prepare_request_id(credit_card_purchase_object)
 
-            created_credit_card_purchase = qbo_connection.post_credit_card_purchase(
-                credit_card_purchase_object, credit_card_purchase_lineitems_objects
-            )
+        created_credit_card_purchase = __post_export(
+            qbo_connection.post_credit_card_purchase, credit_card_purchase_object,
+            credit_card_purchase_lineitems_objects
+        )
 
-            load_attachments(qbo_connection, created_credit_card_purchase['Purchase']['Id'], 'Purchase', expense_group)
+        with transaction.atomic():
+            __record_export(credit_card_purchase_object, created_credit_card_purchase['Purchase']['Id'])
 
             task_log.detail = created_credit_card_purchase
             task_log.credit_card_purchase = credit_card_purchase_object
@@ -390,6 +776,8 @@ def create_credit_card_purchase(expense_group, task_log):
 
             task_log.save(update_fields=['detail', 'credit_card_purchase', 'status'])
 
+        load_attachments(qbo_connection, created_credit_card_purchase['Purchase']['Id'], 'Purchase', expense_group)
+
     except QBOCredential.DoesNotExist:
         logger.exception(
             'QBO Credentials not found for workspace_id %s / expense group %s',
@@ -431,6 +819,29 @@ def create_credit_card_purchase(expense_group, task_log):
         logger.exception('Something unexpected happened workspace_id: %s\n%s', task_log.workspace_id, error)
 
 
+def __prepare_credit_card_purchase(expense_group: ExpenseGroup, mapping_resolver: MappingResolver):
+    credit_card_purchase_object = CreditCardPurchase.create_credit_card_purchase(expense_group, mapping_resolver)
+
+    credit_card_purchase_lineitems_objects = CreditCardPurchaseLineitem.create_credit_card_purchase_lineitems(
+        expense_group, mapping_resolver
+    )
+
+    return credit_card_purchase_object, credit_card_purchase_lineitems_objects
+
+
+def create_credit_card_purchases_batch(expense_groups: List[ExpenseGroup], task_logs: List[TaskLog]):
+    """
+    Create credit card purchases in QBO through batch requests
+    :param expense_groups: expense groups
+    :param task_logs: task logs of the expense groups
+    :return: None
+    """
+    __create_exports_batch(
+        expense_groups, task_logs, __prepare_credit_card_purchase, QBOConnector.post_credit_card_purchases_batch,
+        'Purchase', 'credit_card_purchase'
+    )
+
+
 def schedule_journal_entry_creation(workspace_id: int, expense_group_ids: List[str], user: str):
     """
     Schedule journal_entry creation
@@ -441,58 +852,45 @@ def schedule_journal_entry_creation(workspace_id: int, expense_group_ids: List[s
     """
     if expense_group_ids:
         expense_groups = ExpenseGroup.objects.filter(
-            workspace_id=workspace_id, id__in=expense_group_ids, journalentry__id__isnull=True
-        ).all()
+            workspace_id=workspace_id, id__in=expense_group_ids
+        ).exclude(export_status='EXPORTED').all()
 
         fyle_credentials = FyleCredential.objects.get(
             workspace_id=workspace_id)
-        fyle_connector = FyleConnector(fyle_credentials.refresh_token)
+        fyle_connector = FyleConnector(fyle_credentials.refresh_token, workspace_id)
         fyle_sdk_connection = fyle_connector.connection
-        jobs = FyleJobsSDK(settings.FYLE_JOBS_URL, fyle_sdk_connection)
+        jobs = FyleJobsSDK(settings.FYLE_JOBS_URL, fyle_sdk_connection, workspace_id)
 
-        for expense_group in expense_groups:
-            task_log, _ = TaskLog.objects.update_or_create(
-                workspace_id=expense_group.workspace_id,
-                expense_group=expense_group,
-                defaults={
-                    'status': 'IN_PROGRESS',
-                    'type': 'CREATING_JOURNAL_ENTRY'
-                }
-            )
-            created_job = jobs.trigger_now(
-                callback_url='{0}{1}'.format(settings.API_URL, '/workspaces/{0}/qbo/journal_entries/'.format(
-                    workspace_id)),
-                callback_method='POST', object_id=task_log.id, payload={
-                    'expense_group_id': expense_group.id,
-                    'task_log_id': task_log.id
-                },
-                job_description='Create Journal Entry: Workspace id - {0}, user - {1}, expense group id - {2}'.format(
-                    workspace_id, user, expense_group.id
-                )
-            )
-            task_log.task_id = created_job['id']
-            task_log.save()
+        task_logs = __create_export_task_logs(expense_groups, 'CREATING_JOURNAL_ENTRY')
+
+        __trigger_export_jobs(jobs, task_logs, 'journal_entries', 'Journal Entry', workspace_id, user)
 
 
 def create_journal_entry(expense_group, task_log):
     try:
+        qbo_credentials = QBOCredential.objects.get(workspace_id=expense_group.workspace_id)
+
+        qbo_connection = QBOConnector.get_connector(qbo_credentials, expense_group.workspace_id)
+
         with transaction.atomic():
-            __validate_expense_group(expense_group)
+            mapping_resolver = MappingResolver(expense_group.workspace_id, [expense_group])
+
+            __validate_expense_group(expense_group, mapping_resolver)
 
             journal_entry_object = JournalEntry.create_journal_entry(expense_group)
 
             journal_entry_lineitems_objects = JournalEntryLineitem.create_journal_entry_lineitems(
-                expense_group
+                expense_group, mapping_resolver
             )
 
-            qbo_credentials = QBOCredential.objects.get(workspace_id=expense_group.workspace_id)
-
-            qbo_connection = QBOConnector(qbo_credentials, expense_group.workspace_id)
+            __prepare_request_id(journal_entry_object)
 
-            created_journal_entry = qbo_connection.post_journal_entry(journal_entry_object,
-                                                                      journal_entry_lineitems_objects)
+        created_journal_entry = __post_export(
+            qbo_connection.post_journal_entry, journal_entry_object, journal_entry_lineitems_objects
+        )
 
-            load_attachments(qbo_connection, created_journal_entry['JournalEntry']['Id'], 'JournalEntry', expense_group)
+        with transaction.atomic():
+            __record_export(journal_entry_object, created_journal_entry['JournalEntry']['Id'])
 
             task_log.detail = created_journal_entry
             task_log.journal_entry = journal_entry_object
@@ -500,6 +898,8 @@ def create_journal_entry(expense_group, task_log):
 
             task_log.save(update_fields=['detail', 'journal_entry', 'status'])
 
+        load_attachments(qbo_connection, created_journal_entry['JournalEntry']['Id'], 'JournalEntry', expense_group)
+
     except QBOCredential.DoesNotExist:
         logger.exception(
             'QBO Credentials not found for workspace_id %s / expense group %s',
@@ -539,3 +939,137 @@ def create_journal_entry(expense_group, task_log):
         task_log.status = 'FATAL'
         task_log.save(update_fields=['detail', 'status'])
         logger.exception('Something unexpected happened workspace_id: %s\n%s', task_log.workspace_id, error)
+
+
+def __prepare_journal_entry(expense_group: ExpenseGroup, mapping_resolver: MappingResolver):
+    journal_entry_object = JournalEntry.create_journal_entry(expense_group)
+
+    journal_entry_lineitems_objects = JournalEntryLineitem.create_journal_entry_lineitems(
+        expense_group, mapping_resolver
+    )
+
+    return journal_entry_object, journal_entry_lineitems_objects
+
+
+def create_journal_entries_batch(expense_groups: List[ExpenseGroup], task_logs: List[TaskLog]):
+    """
+    Create journal entries in QBO through batch requests
+    :param expense_groups: expense groups
+    :param task_logs: task logs of the expense groups
+    :return: None
+    """
+    __create_exports_batch(
+        expense_groups, task_logs, __prepare_journal_entry, QBOConnector.post_journal_entries_batch,
+        'JournalEntry', 'journal_entry'
+    )
+
+
+EXPORT_FUNCTIONS = {
+    'CREATING_BILL': (create_bill, create_bills_batch),
+    'CREATING_CHECK': (create_cheque, create_cheques_batch),
+    'CREATING_CREDIT_CARD_PURCHASE': (create_credit_card_purchase, create_credit_card_purchases_batch),
+    'CREATING_JOURNAL_ENTRY': (create_journal_entry, create_journal_entries_batch)
+}
+
+
+@contextmanager
+def __hold_leases(task_log_ids: List[int], owner: str):
+    """
+    Renew the leases of claimed task logs every EXPORT_HEARTBEAT_SECONDS until the block exits, then release them
+    :param task_log_ids: claimed task log ids
+    :param owner: worker holding the leases
+    """
+    stop_heartbeat = threading.Event()
+
+    def heartbeat():
+        try:
+            while not stop_heartbeat.wait(settings.EXPORT_HEARTBEAT_SECONDS):
+                TaskLog.renew_leases(task_log_ids, owner, settings.EXPORT_LEASE_SECONDS)
+        finally:
+            connection.close()
+
+    heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+    heartbeat_thread.start()
+
+    try:
+        yield
+    finally:
+        stop_heartbeat.set()
+        heartbeat_thread.join()
+        TaskLog.release_leases(task_log_ids, owner)
+
+
+def export_task_logs(workspace_id: int, task_type: str, task_log_ids: List[int] = None,
+                     attempted_task_log_ids: List[int] = None):
+    """
+    Claim upto EXPORT_CLAIM_BATCH_SIZE in progress export task logs and export their expense groups,
+    then enqueue the next chunk as a new task so that no task runs into the cluster timeout.
+    Task logs leased by other workers are skipped.
+    :param workspace_id: workspace id
+    :param task_type: export task type
+    :param task_log_ids: only export these task logs
+    :param attempted_task_log_ids: task logs exported by earlier tasks of the chain, not claimed again
+    :return: None
+    """
+    create_export, create_exports_batch = EXPORT_FUNCTIONS[task_type]
+    owner = '{0}:{1}:{2}'.format(socket.gethostname(), os.getpid(), uuid.uuid4())
+    attempted_task_log_ids = attempted_task_log_ids or []
+
+    task_logs = TaskLog.claim_task_logs(
+        workspace_id, task_type, owner, settings.EXPORT_LEASE_SECONDS, settings.EXPORT_CLAIM_BATCH_SIZE,
+        task_log_ids, attempted_task_log_ids
+    )
+
+    if not task_logs:
+        return
+
+    claimed_task_log_ids = [task_log.id for task_log in task_logs]
+
+    with __hold_leases(claimed_task_log_ids, owner):
+        expense_groups = ExpenseGroup.objects.filter(
+            id__in=[task_log.expense_group_id for task_log in task_logs]
+        ).prefetch_related('expenses')
+        expense_groups = {expense_group.id: expense_group for expense_group in expense_groups}
+
+        if settings.QBO_BATCH_EXPORT:
+            create_exports_batch(
+                [expense_groups[task_log.expense_group_id] for task_log in task_logs], task_logs
+            )
+        else:
+            for task_log in task_logs:
+                create_export(expense_groups[task_log.expense_group_id], task_log)
+
+    # a short chunk means nothing else was claimable
+    if len(task_logs) < settings.EXPORT_CLAIM_BATCH_SIZE:
+        return
+
+    if task_log_ids is not None:
+        task_log_ids = [task_log_id for task_log_id in task_log_ids if task_log_id not in claimed_task_log_ids]
+
+        if not task_log_ids:
+            return
+
+    async_task(
+        export_task_logs, workspace_id, task_type, task_log_ids, attempted_task_log_ids + claimed_task_log_ids
+    )
+
+
+def resume_expired_exports():
+    """
+    Enqueue the exports of task logs whose lease expired before they finished, the worker holding them died.
+    Runs every few minutes through a django-q schedule
+    :return: None
+    """
+    expired_task_logs = TaskLog.objects.filter(
+        status='IN_PROGRESS', type__in=EXPORT_FUNCTIONS.keys(), lease_expires_at__lt=timezone.now()
+    ).values_list('workspace_id', 'type', 'id')
+
+    expired_task_log_ids = {}
+    for workspace_id, task_type, task_log_id in expired_task_logs:
+        expired_task_log_ids.setdefault((workspace_id, task_type), []).append(task_log_id)
+
+    for (workspace_id, task_type), task_log_ids in expired_task_log_ids.items():
+        logger.warning(
+            'Resuming %s expired %s task logs of workspace_id %s', len(task_log_ids), task_type, workspace_id
+        )
+        async_task(export_task_logs, workspace_id, task_type, task_log_ids)
@@ -1,78 +1,337 @@
-from typing import List, Dict
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Tuple, Callable
 
 from django.conf import settings
+from django.db import transaction
 
 from qbosdk import QuickbooksOnlineSDK
+from qbosdk.apis import api_base
+from qbosdk.exceptions import InvalidTokenError
 
 from apps.workspaces.models import QBOCredential
 from fyle_accounting_mappings.models import DestinationAttribute
+from fyle_qbo_api.exceptions import BatchError
+from fyle_qbo_api.utils import chunk_list, TokenBucketRateLimiter, call_with_retry, get_http_session, \
+    get_retry_after
 
 from .models import BillLineitem, Bill, ChequeLineitem, Cheque, CreditCardPurchase, CreditCardPurchaseLineitem, \
     JournalEntry, JournalEntryLineitem
 
+# workspace id -> connector, least recently used first
+_connector_pool = OrderedDict()
+_connector_pool_lock = threading.Lock()
+
+# rate limiter and last response of the connector whose SDK call is running in this thread
+_request_context = threading.local()
+
+_refresh_locks = {}
+_refresh_locks_lock = threading.Lock()
+
+
+def _get_refresh_lock(realm_id: str) -> threading.Lock:
+    """
+    Get the lock serializing token refreshes of a QBO realm
+    :param realm_id: QBO realm id
+    :return: lock
+    """
+    with _refresh_locks_lock:
+        if realm_id not in _refresh_locks:
+            _refresh_locks[realm_id] = threading.Lock()
+
+        return _refresh_locks[realm_id]
+
+
+class _QBOTransport:
+    """
+    Stands in for the requests module inside qbosdk so that every QBO API request goes through
+    the shared keep-alive session and takes a rate limit token of the realm making it
+    """
+    @staticmethod
+    def __send(method: str, url: str, **kwargs):
+        """
+        Send a request through the shared session, one rate limit token per HTTP request
+        so that SDK calls paging through results are limited page by page
+        """
+        rate_limiter = getattr(_request_context, 'rate_limiter', None)
+
+        if rate_limiter is not None:
+            _request_context.wait_seconds += rate_limiter.acquire()
+
+        kwargs.setdefault('timeout', settings.HTTP_TIMEOUT)
+        # kept for the retry loop, qbosdk raises errors without the response
+        _request_context.last_response = None
+        _request_context.last_response = get_http_session().request(method, url, **kwargs)
+
+        return _request_context.last_response
+
+    @staticmethod
+    def get(url: str, **kwargs):
+        """
+        Send a GET request
+        """
+        return _QBOTransport.__send('GET', url, **kwargs)
+
+    @staticmethod
+    def post(url: str, **kwargs):
+        """
+        Send a POST request
+        """
+        return _QBOTransport.__send('POST', url, **kwargs)
+
+
+def _get_last_retry_after() -> float or None:
+    """
+    Get the Retry-After of the last QBO response of this thread
+    :return: seconds, None if there was no response or it did not ask to wait
+    """
+    response = getattr(_request_context, 'last_response', None)
+
+    if response is None:
+        return None
+
+    return get_retry_after(response)
+
+
+# qbosdk calls requests.get / requests.post of its api_base module and takes no session
+api_base.requests = _QBOTransport
+
 
 class QBOConnector:
     """
     QBO utility functions
     """
+    POST_BATCH = '/batch?minorversion=38'
+
+    # QBO AccountType -> (destination attribute type, display name)
+    ACCOUNT_ATTRIBUTE_TYPES = {
+        'Expense': ('ACCOUNT', 'Account'),
+        'Credit Card': ('CREDIT_CARD_ACCOUNT', 'Credit Card Account'),
+        'Bank': ('BANK_ACCOUNT', 'Bank Account'),
+        'Accounts Payable': ('ACCOUNTS_PAYABLE', 'Accounts Payable')
+    }
+
     def __init__(self, credentials_object: QBOCredential, workspace_id: int):
         client_id = settings.QBO_CLIENT_ID
         client_secret = settings.QBO_CLIENT_SECRET
         environment = settings.QBO_ENVIRONMENT
 
-        self.connection = QuickbooksOnlineSDK(
-            client_id=client_id,
-            client_secret=client_secret,
-            refresh_token=credentials_object.refresh_token,
-            realm_id=credentials_object.realm_id,
-            environment=environment
-        )
-
         self.workspace_id = workspace_id
+        self.realm_id = credentials_object.realm_id
+
+        with _get_refresh_lock(self.realm_id):
+            with transaction.atomic():
+                credentials_object = QBOCredential.objects.select_for_update().get(pk=credentials_object.pk)
+
+                self.connection = QuickbooksOnlineSDK(
+                    client_id=client_id,
+                    client_secret=client_secret,
+                    refresh_token=credentials_object.refresh_token,
+                    realm_id=credentials_object.realm_id,
+                    environment=environment
+                )
 
-        credentials_object.refresh_token = self.connection.refresh_token
-        credentials_object.save()
+                self.__save_refresh_token(credentials_object)
 
-    def sync_accounts(self, account_type: str):
+        self.access_token_expires_at = time.monotonic() + settings.QBO_ACCESS_TOKEN_LIFETIME
+
+        self.rate_limiter = TokenBucketRateLimiter(
+            'qbo_rate_limit:{0}'.format(self.realm_id),
+            capacity=settings.QBO_RATE_LIMIT_BURST,
+            refill_rate=settings.QBO_RATE_LIMIT_PER_MINUTE / 60
+        )
+        self.rate_limit_wait_seconds = 0
+        # pooled connectors are shared by threads, e.g. the attachment upload pool
+        self.__rate_limit_wait_lock = threading.Lock()
+
+    @staticmethod
+    def get_connector(credentials_object: QBOCredential, workspace_id: int) -> 'QBOConnector':
         """
-        Get accounts
+        Get the pooled connector of a workspace, creating it on first use, the pool keeps the
+        QBO_CONNECTOR_POOL_SIZE most recently used connectors whose access token has not expired
+        :param credentials_object: QBO credentials of the workspace
+        :param workspace_id: workspace id
+        :return: QBOConnector with an access token valid beyond the refresh margin
         """
-        accounts = self.connection.accounts.get()
+        with _connector_pool_lock:
+            now = time.monotonic()
 
-        accounts = list(filter(lambda current_account: current_account['AccountType'] == account_type, accounts))
+            # a connector whose access token has expired costs as much to refresh as to rebuild
+            for pooled_workspace_id, pooled_connector in list(_connector_pool.items()):
+                if pooled_connector.access_token_expires_at <= now:
+                    del _connector_pool[pooled_workspace_id]
 
-        account_attributes = []
+            qbo_connector = _connector_pool.get(workspace_id)
 
-        if account_type == 'Expense':
-            attribute_type = 'ACCOUNT'
-            display_name = 'Account'
-        elif account_type == 'Credit Card':
-            attribute_type = 'CREDIT_CARD_ACCOUNT'
-            display_name = 'Credit Card Account'
-        elif account_type == 'Bank':
-            attribute_type = 'BANK_ACCOUNT'
-            display_name = 'Bank Account'
+            if qbo_connector is not None:
+                _connector_pool.move_to_end(workspace_id)
+
+        if qbo_connector is None or qbo_connector.realm_id != credentials_object.realm_id:
+            qbo_connector = QBOConnector(credentials_object, workspace_id)
+
+            with _connector_pool_lock:
+                _connector_pool[workspace_id] = qbo_connector
+                _connector_pool.move_to_end(workspace_id)
+
+                while len(_connector_pool) > settings.QBO_CONNECTOR_POOL_SIZE:
+                    _connector_pool.popitem(last=False)
         else:
-            attribute_type = 'ACCOUNTS_PAYABLE'
-            display_name = 'Accounts Payable'
+            qbo_connector.refresh_access_token()
+
+        return qbo_connector
+
+    def __request(self, func: Callable, idempotent: bool = True):
+        """
+        Make QBO requests rate limited per HTTP request, retrying transient failures and refreshing
+        a rejected access token once
+        :param func: function without arguments making the request
+        :param idempotent: True if repeating the request has no extra effect
+        :return: result of func
+        """
+        _request_context.rate_limiter = self.rate_limiter
+        _request_context.wait_seconds = 0
+        _request_context.last_response = None
+        access_token_expires_at = self.access_token_expires_at
+
+        try:
+            try:
+                return call_with_retry(func, idempotent=idempotent, retry_after=_get_last_retry_after)
+            except InvalidTokenError:
+                self.refresh_access_token(force=True, rejected_token_expires_at=access_token_expires_at)
+                return call_with_retry(func, idempotent=idempotent, retry_after=_get_last_retry_after)
+        finally:
+            with self.__rate_limit_wait_lock:
+                self.rate_limit_wait_seconds += _request_context.wait_seconds
+            _request_context.rate_limiter = None
+            _request_context.last_response = None
+
+    def __post_object(self, api, url: str, payload: Dict, request_id: str = None) -> Dict:
+        """
+        Post an object to QBO, repeating a request id makes QBO return the response of the original request
+        :param api: qbosdk API used to make the request
+        :param url: post url
+        :param payload: request body
+        :param request_id: request id
+        :return: response
+        """
+        if request_id:
+            url = '{0}&requestid={1}'.format(url, request_id)
+
+        return self.__request(
+            lambda: api._post_request(payload, url),  # pylint: disable=protected-access
+            idempotent=request_id is not None
+        )
+
+    def is_access_token_expiring(self) -> bool:
+        """
+        Check if the access token expires within the refresh margin
+        :return: True if the access token has to be refreshed
+        """
+        return time.monotonic() >= self.access_token_expires_at - settings.QBO_TOKEN_REFRESH_MARGIN
+
+    def refresh_access_token(self, force: bool = False, rejected_token_expires_at: float = None):
+        """
+        Refresh the access token when it is near expiry, one refresh per realm at a time
+        :param force: refresh even if the access token is still valid
+        :param rejected_token_expires_at: expiry of the access token QBO rejected, a forced refresh is skipped
+                                          when another thread sharing the connector already replaced it
+        :return: None
+        """
+        if not force and not self.is_access_token_expiring():
+            return
+
+        with _get_refresh_lock(self.realm_id):
+            if not force and not self.is_access_token_expiring():
+                return
+
+            if force and rejected_token_expires_at is not None \
+                    and self.access_token_expires_at != rejected_token_expires_at:
+                return
+
+            with transaction.atomic():
+                # Another process may have rotated the refresh token, always refresh with the stored one
+                credentials_object = QBOCredential.objects.select_for_update().get(workspace_id=self.workspace_id)
+
+                self.connection.refresh_token = credentials_object.refresh_token
+                self.connection.update_access_token()
+
+                self.__save_refresh_token(credentials_object)
+
+            self.access_token_expires_at = time.monotonic() + settings.QBO_ACCESS_TOKEN_LIFETIME
+
+    def __save_refresh_token(self, credentials_object: QBOCredential):
+        """
+        Save the refresh token rotated by QBO
+        :param credentials_object: QBO credentials of the workspace
+        :return: None
+        """
+        if credentials_object.refresh_token != self.connection.refresh_token:
+            credentials_object.refresh_token = self.connection.refresh_token
+            credentials_object.save(update_fields=['refresh_token', 'updated_at'])
+
+    @staticmethod
+    def __partition_account_attributes(accounts: List[Dict]) -> Dict[str, List[Dict]]:
+        """
+        Partition accounts into destination attributes by account type in one pass
+        :param accounts: QBO accounts
+        :return: attribute type -> account attributes
+        """
+        account_attributes = {
+            attribute_type: [] for attribute_type, _ in QBOConnector.ACCOUNT_ATTRIBUTE_TYPES.values()
+        }
 
         for account in accounts:
-            account_attributes.append({
+            if account['AccountType'] not in QBOConnector.ACCOUNT_ATTRIBUTE_TYPES:
+                continue
+
+            attribute_type, display_name = QBOConnector.ACCOUNT_ATTRIBUTE_TYPES[account['AccountType']]
+
+            account_attributes[attribute_type].append({
                 'attribute_type': attribute_type,
                 'display_name': display_name,
                 'value': account['Name'],
                 'destination_id': account['Id']
             })
 
+        return account_attributes
+
+    def sync_accounts(self, account_type: str):
+        """
+        Get accounts
+        """
+        accounts = self.__request(self.connection.accounts.get)
+
+        attribute_type, _ = QBOConnector.ACCOUNT_ATTRIBUTE_TYPES.get(
+            account_type, QBOConnector.ACCOUNT_ATTRIBUTE_TYPES['Accounts Payable']
+        )
+        account_attributes = self.__partition_account_attributes(accounts)[attribute_type]
+
         account_attributes = DestinationAttribute.bulk_upsert_destination_attributes(
             account_attributes, self.workspace_id)
         return account_attributes
 
+    def sync_all_accounts(self) -> Dict[str, List[DestinationAttribute]]:
+        """
+        Get accounts once and sync account, credit card account, bank account and accounts payable attributes
+        :return: attribute type -> synced destination attributes
+        """
+        accounts = self.__request(self.connection.accounts.get)
+
+        synced_attributes = {}
+
+        with transaction.atomic():
+            for attribute_type, account_attributes in self.__partition_account_attributes(accounts).items():
+                synced_attributes[attribute_type] = DestinationAttribute.bulk_upsert_destination_attributes(
+                    account_attributes, self.workspace_id) if account_attributes else []
+
+        return synced_attributes
+
     def sync_departments(self):
         """
         Get departments
         """
-        departments = self.connection.departments.get()
+        departments = self.__request(self.connection.departments.get)
 
         department_attributes = []
 
@@ -92,7 +351,7 @@ class QBOConnector:
         """
         Get vendors
         """
-        vendors = self.connection.vendors.get()
+        vendors = self.__request(self.connection.vendors.get)
 
         vendor_attributes = []
 
@@ -112,7 +371,7 @@ class QBOConnector:
         """
         Get employees
         """
-        employees = self.connection.employees.get()
+        employees = self.__request(self.connection.employees.get)
 
         employee_attributes = []
 
@@ -132,7 +391,7 @@ class QBOConnector:
         """
         Get classes
         """
-        classes = self.connection.classes.get()
+        classes = self.__request(self.connection.classes.get)
 
         class_attributes = []
 
@@ -152,7 +411,7 @@ class QBOConnector:
         """
         Get customers
         """
-        customers = self.connection.customers.get()
+        customers = self.__request(self.connection.customers.get)
 
         customer_attributes = []
 
@@ -254,7 +513,9 @@ class QBOConnector:
         Post bills to QBO
         """
         bills_payload = self.__construct_bill(bill, bill_lineitems)
-        created_bill = self.connection.bills.post(bills_payload)
+        created_bill = self.__post_object(
+            self.connection.bills, self.connection.bills.POST_BILL, bills_payload, bill.qbo_request_id
+        )
         return created_bill
 
     @staticmethod
@@ -303,7 +564,9 @@ class QBOConnector:
         Post cheque to QBO
         """
         cheques_payload = self.__construct_cheque(cheque, cheque_lineitems)
-        created_cheque = self.connection.purchases.post(cheques_payload)
+        created_cheque = self.__post_object(
+            self.connection.purchases, self.connection.purchases.POST_PURCHASE, cheques_payload, cheque.qbo_request_id
+        )
         return created_cheque
 
     @staticmethod
@@ -359,7 +622,10 @@ class QBOConnector:
         """
         credit_card_purchase_payload = self.__construct_credit_card_purchase(credit_card_purchase,
                                                                              credit_card_purchase_lineitems)
-        created_credit_card_purchase = self.connection.purchases.post(credit_card_purchase_payload)
+        created_credit_card_purchase = self.__post_object(
+            self.connection.purchases, self.connection.purchases.POST_PURCHASE, credit_card_purchase_payload,
+            credit_card_purchase.qbo_request_id
+        )
         return created_credit_card_purchase
 
     @staticmethod
@@ -435,15 +701,118 @@ class QBOConnector:
         Post journal entries to QBO
         """
         journal_entry_payload = self.__construct_journal_entry(journal_entry, journal_entry_lineitems)
-        created_journal_entry = self.connection.journal_entries.post(journal_entry_payload)
+        created_journal_entry = self.__post_object(
+            self.connection.journal_entries, self.connection.journal_entries.POST_JOURNAL_ENTRY, journal_entry_payload,
+            journal_entry.qbo_request_id
+        )
         return created_journal_entry
 
+    def post_batch(self, object_type: str, payloads: List[Dict], request_ids: List[str] = None,
+                   batch_request_ids: List[str] = None) -> List[Dict]:
+        """
+        Create objects in QBO through batch requests of upto QBO_BATCH_SIZE items each.
+        QBO has no request id per batch item, so objects sharing a batch request id are posted together
+        and a repeated batch is answered with the response of the original one, items matched by bId
+        :param object_type: QBO object type (Bill / Purchase / JournalEntry)
+        :param payloads: object payloads
+        :param request_ids: request ids of the objects, used as their bId
+        :param batch_request_ids: request ids of the batches the objects were put in
+        :return: batch item responses in the order of payloads, each holding either the object or a Fault
+        :raises BatchError: holding the responses of the batches posted before the failed one
+        """
+        request_ids = request_ids or [None] * len(payloads)
+        batch_request_ids = batch_request_ids or [None] * len(payloads)
+
+        batches = OrderedDict()
+        for index, (payload, request_id, batch_request_id) in enumerate(zip(payloads, request_ids, batch_request_ids)):
+            batches.setdefault(batch_request_id, []).append((index, request_id or str(index), payload))
+
+        batch_item_responses = [None] * len(payloads)
+
+        for batch_request_id, batch_items in batches.items():
+            for chunk in chunk_list(batch_items, settings.QBO_BATCH_SIZE):
+                batch_payload = {
+                    'BatchItemRequest': [
+                        {
+                            'bId': batch_item_id,
+                            'operation': 'create',
+                            object_type: payload
+                        } for _, batch_item_id, payload in chunk
+                    ]
+                }
+
+                try:
+                    # qbosdk has no batch API, reuse the authenticated post request of one of its APIs
+                    batch_response = self.__post_object(
+                        self.connection.bills, QBOConnector.POST_BATCH, batch_payload, batch_request_id
+                    )
+                except Exception as exception:
+                    raise BatchError(
+                        'Batch request failed', batch_item_responses, [index for index, _, _ in chunk], exception
+                    ) from exception
+
+                responses = {response['bId']: response for response in batch_response['BatchItemResponse']}
+                for index, batch_item_id, _ in chunk:
+                    batch_item_responses[index] = responses[batch_item_id]
+
+        return batch_item_responses
+
+    def post_bills_batch(self, bills: List[Tuple[Bill, List[BillLineitem]]]) -> List[Dict]:
+        """
+        Post bills to QBO in batches
+        """
+        payloads = [self.__construct_bill(bill, bill_lineitems) for bill, bill_lineitems in bills]
+        return self.post_batch(
+            'Bill', payloads, [bill.qbo_request_id for bill, _ in bills],
+            [bill.qbo_batch_request_id for bill, _ in bills]
+        )
+
+    def post_cheques_batch(self, cheques: List[Tuple[Cheque, List[ChequeLineitem]]]) -> List[Dict]:
+        """
+        Post cheques to QBO in batches
+        """
+        payloads = [self.__construct_cheque(cheque, cheque_lineitems) for cheque, cheque_lineitems in cheques]
+        return self.post_batch(
+            'Purchase', payloads, [cheque.qbo_request_id for cheque, _ in cheques],
+            [cheque.qbo_batch_request_id for cheque, _ in cheques]
+        )
+
+    def post_credit_card_purchases_batch(
+            self, credit_card_purchases: List[Tuple[CreditCardPurchase, List[CreditCardPurchaseLineitem]]]
+    ) -> List[Dict]:
+        """
+        Post credit card purchases to QBO in batches
+        """
+        payloads = [
+            self.__construct_credit_card_purchase(credit_card_purchase, credit_card_purchase_lineitems)
+            for credit_card_purchase, credit_card_purchase_lineitems in credit_card_purchases
+        ]
+        return self.post_batch(
+            'Purchase', payloads,
+            [credit_card_purchase.qbo_request_id for credit_card_purchase, _ in credit_card_purchases],
+            [credit_card_purchase.qbo_batch_request_id for credit_card_purchase, _ in credit_card_purchases]
+        )
+
+    def post_journal_entries_batch(
+            self, journal_entries: List[Tuple[JournalEntry, List[JournalEntryLineitem]]]) -> List[Dict]:
+        """
+        Post journal entries to QBO in batches
+        """
+        payloads = [
+            self.__construct_journal_entry(journal_entry, journal_entry_lineitems)
+            for journal_entry, journal_entry_lineitems in journal_entries
+        ]
+        return self.post_batch(
+            'JournalEntry', payloads, [journal_entry.qbo_request_id for journal_entry, _ in journal_entries],
+            [journal_entry.qbo_batch_request_id for journal_entry, _ in journal_entries]
+        )
+
     def get_company_preference(self):
         """
         Get QBO company preferences
         :return:
         """
-        return self.connection.preferences.get()
+        return self.__request(self.connection.preferences.get)
         
     def post_attachments(self, ref_id: str, ref_type: str, attachments: List[Dict]) -> List:
         """
@@ -458,12 +827,25 @@ class QBOConnector:
         if len(attachments):
             responses = []
             for attachment in attachments:
-                response = self.connection.attachments.post(
-                    ref_id=ref_id,
-                    ref_type=ref_type,
-                    content=attachment['content'],
-                    file_name=attachment['filename']
-                )
+                response = self.post_attachment(ref_id, ref_type, attachment)
                 responses.append(response)
             return responses
         return []
+
+    def post_attachment(self, ref_id: str, ref_type: str, attachment: Dict) -> Dict:
+        """
+        Link an attachment to an object in Quickbooks
+        :param ref_id: object id
+        :param ref_type: type of object
+        :param attachment: attachment dict with content and filename
+        :return: response
+        """
+        return self.__request(
+            lambda: self.connection.attachments.post(
+                ref_id=ref_id,
+                ref_type=ref_type,
+                content=attachment['content'],
+                file_name=attachment['filename']
+            ),
+            idempotent=False
+        )
@@ -4,23 +4,44 @@ from rest_framework import generics
 
 from qbosdk.exceptions import WrongParamsError
 
+from django_q.tasks import async_task
+
 from fyle_accounting_mappings.models import DestinationAttribute
 from fyle_accounting_mappings.serializers import DestinationAttributeSerializer
 
+from fyle_qbo_api.pagination import KeysetPagination
 from fyle_qbo_api.utils import assert_valid
 
-from apps.fyle.models import ExpenseGroup
-from apps.tasks.models import TaskLog
 from apps.workspaces.models import QBOCredential
 
 from .utils import QBOConnector
-from .tasks import create_bill, schedule_bills_creation, create_cheque, schedule_cheques_creation, \
-    create_credit_card_purchase, schedule_credit_card_purchase_creation, create_journal_entry,\
-    schedule_journal_entry_creation
+from .tasks import schedule_bills_creation, schedule_cheques_creation, schedule_credit_card_purchase_creation, \
+    schedule_journal_entry_creation, export_task_logs
 from .models import Bill, Cheque, CreditCardPurchase, JournalEntry
 from .serializers import BillSerializer, ChequeSerializer, CreditCardPurchaseSerializer, JournalEntrySerializer
 
 
+def get_task_log_ids(data) -> list:
+    """
+    Get the export task log ids of a Fyle Jobs callback, a single task_log_id or a batch of task_logs
+    :param data: request data
+    :return: task log ids
+    """
+    if 'task_logs' not in data:
+        task_log_id = data.get('task_log_id')
+        assert_valid(task_log_id is not None, 'Task Log id not found')
+        return [task_log_id]
+
+    task_logs = data.get('task_logs')
+    assert_valid(isinstance(task_logs, list) and bool(task_logs), 'Task logs should be a non empty list')
+    assert_valid(
+        all(isinstance(task_log, dict) and task_log.get('task_log_id') is not None for task_log in task_logs),
+        'Task Log id not found'
+    )
+
+    return [task_log['task_log_id'] for task_log in task_logs]
+
+
 class VendorView(generics.ListCreateAPIView):
     """
     Vendor view
@@ -39,7 +60,7 @@ class VendorView(generics.ListCreateAPIView):
         try:
             qbo_credentials = QBOCredential.objects.get(workspace_id=kwargs['workspace_id'])
 
-            qbo_connector = QBOConnector(qbo_credentials, workspace_id=kwargs['workspace_id'])
+            qbo_connector = QBOConnector.get_connector(qbo_credentials, workspace_id=kwargs['workspace_id'])
 
             vendors = qbo_connector.sync_vendors()
 
@@ -74,7 +95,7 @@ class EmployeeView(generics.ListCreateAPIView):
         try:
             qbo_credentials = QBOCredential.objects.get(workspace_id=kwargs['workspace_id'])
 
-            qbo_connector = QBOConnector(qbo_credentials, workspace_id=kwargs['workspace_id'])
+            qbo_connector = QBOConnector.get_connector(qbo_credentials, workspace_id=kwargs['workspace_id'])
 
             employees = qbo_connector.sync_employees()
 
@@ -104,14 +125,14 @@ class AccountView(generics.ListCreateAPIView):
 
     def post(self, request, *args, **kwargs):
         """
-        Get accounts from QBO
+        Get accounts from QBO, syncing every account type at once
         """
         try:
             qbo_credentials = QBOCredential.objects.get(workspace_id=kwargs['workspace_id'])
 
-            qbo_connector = QBOConnector(qbo_credentials, workspace_id=kwargs['workspace_id'])
+            qbo_connector = QBOConnector.get_connector(qbo_credentials, workspace_id=kwargs['workspace_id'])
 
-            accounts = qbo_connector.sync_accounts(account_type='Expense')
+            accounts = qbo_connector.sync_all_accounts()['ACCOUNT']
 
             return Response(
                 data=self.serializer_class(accounts, many=True).data,
@@ -139,14 +160,14 @@ class CreditCardAccountView(generics.ListCreateAPIView):
 
     def post(self, request, *args, **kwargs):
         """
-        Get accounts from QBO
+        Get accounts from QBO, syncing every account type at once
         """
         try:
             qbo_credentials = QBOCredential.objects.get(workspace_id=kwargs['workspace_id'])
 
-            qbo_connector = QBOConnector(qbo_credentials, workspace_id=kwargs['workspace_id'])
+            qbo_connector = QBOConnector.get_connector(qbo_credentials, workspace_id=kwargs['workspace_id'])
 
-            accounts = qbo_connector.sync_accounts(account_type='Credit Card')
+            accounts = qbo_connector.sync_all_accounts()['CREDIT_CARD_ACCOUNT']
 
             return Response(
                 data=self.serializer_class(accounts, many=True).data,
@@ -174,14 +195,14 @@ class BankAccountView(generics.ListCreateAPIView):
 
     def post(self, request, *args, **kwargs):
         """
-        Get accounts from QBO
+        Get accounts from QBO, syncing every account type at once
         """
         try:
             qbo_credentials = QBOCredential.objects.get(workspace_id=kwargs['workspace_id'])
 
-            qbo_connector = QBOConnector(qbo_credentials, workspace_id=kwargs['workspace_id'])
+            qbo_connector = QBOConnector.get_connector(qbo_credentials, workspace_id=kwargs['workspace_id'])
 
-            accounts = qbo_connector.sync_accounts(account_type='Bank')
+            accounts = qbo_connector.sync_all_accounts()['BANK_ACCOUNT']
 
             return Response(
                 data=self.serializer_class(accounts, many=True).data,
@@ -209,14 +230,14 @@ class AccountsPayableView(generics.ListCreateAPIView):
 
     def post(self, request, *args, **kwargs):
         """
-        Get accounts from QBO
+        Get accounts from QBO, syncing every account type at once
         """
         try:
             qbo_credentials = QBOCredential.objects.get(workspace_id=kwargs['workspace_id'])
 
-            qbo_connector = QBOConnector(qbo_credentials, workspace_id=kwargs['workspace_id'])
+            qbo_connector = QBOConnector.get_connector(qbo_credentials, workspace_id=kwargs['workspace_id'])
 
-            accounts = qbo_connector.sync_accounts(account_type='Accounts Payable')
+            accounts = qbo_connector.sync_all_accounts()['ACCOUNTS_PAYABLE']
 
             return Response(
                 data=self.serializer_class(accounts, many=True).data,
@@ -250,7 +271,7 @@ class ClassView(generics.ListCreateAPIView):
         try:
             qbo_credentials = QBOCredential.objects.get(workspace_id=kwargs['workspace_id'])
 
-            qbo_connector = QBOConnector(qbo_credentials, workspace_id=kwargs['workspace_id'])
+            qbo_connector = QBOConnector.get_connector(qbo_credentials, workspace_id=kwargs['workspace_id'])
 
             classes = qbo_connector.sync_classes()
 
@@ -275,7 +296,7 @@ class PreferencesView(generics.RetrieveAPIView):
         try:
             qbo_credentials = QBOCredential.objects.get(workspace_id=kwargs['workspace_id'])
 
-            qbo_connector = QBOConnector(qbo_credentials, workspace_id=kwargs['workspace_id'])
+            qbo_connector = QBOConnector.get_connector(qbo_credentials, workspace_id=kwargs['workspace_id'])
 
             preferences = qbo_connector.get_company_preference()
 
@@ -317,7 +338,7 @@ class DepartmentView(generics.ListCreateAPIView):
         try:
             qbo_credentials = QBOCredential.objects.get(workspace_id=kwargs['workspace_id'])
 
-            qbo_connector = QBOConnector(qbo_credentials, workspace_id=kwargs['workspace_id'])
+            qbo_connector = QBOConnector.get_connector(qbo_credentials, workspace_id=kwargs['workspace_id'])
 
             departments = qbo_connector.sync_departments()
 
@@ -353,7 +374,7 @@ class CustomerView(generics.ListCreateAPIView):
         try:
             qbo_credentials = QBOCredential.objects.get(workspace_id=kwargs['workspace_id'])
 
-            qbo_connector = QBOConnector(qbo_credentials, workspace_id=kwargs['workspace_id'])
+            qbo_connector = QBOConnector.get_connector(qbo_credentials, workspace_id=kwargs['workspace_id'])
 
             customers = qbo_connector.sync_customers()
 
@@ -375,28 +396,22 @@ class BillView(generics.ListCreateAPIView):
     Create Bill
     """
     serializer_class = BillSerializer
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        return Bill.objects.filter(expense_group__workspace_id=self.kwargs['workspace_id']).order_by('-updated_at')
+        return Bill.objects.filter(workspace_id=self.kwargs['workspace_id']).order_by('-updated_at')
 
     def post(self, request, *args, **kwargs):
         """
         Create bill from expense group
         """
-        expense_group_id = request.data.get('expense_group_id')
-        task_log_id = request.data.get('task_log_id')
-
-        assert_valid(expense_group_id is not None, 'expense group id not found')
-        assert_valid(task_log_id is not None, 'Task Log id not found')
-
-        expense_group = ExpenseGroup.objects.get(pk=expense_group_id)
-        task_log = TaskLog.objects.get(pk=task_log_id)
+        task_log_ids = get_task_log_ids(request.data)
 
-        create_bill(expense_group, task_log)
+        async_task(export_task_logs, kwargs['workspace_id'], 'CREATING_BILL', task_log_ids)
 
         return Response(
             data={},
-            status=status.HTTP_200_OK
+            status=status.HTTP_202_ACCEPTED
         )
 
 
@@ -421,9 +436,10 @@ class ChequeView(generics.ListCreateAPIView):
     Create Cheque
     """
     serializer_class = ChequeSerializer
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        return Cheque.objects.filter(expense_group__workspace_id=self.kwargs['workspace_id']).order_by(
+        return Cheque.objects.filter(workspace_id=self.kwargs['workspace_id']).order_by(
             '-updated_at'
         )
 
@@ -431,20 +447,13 @@ class ChequeView(generics.ListCreateAPIView):
         """
         Create cheque from expense group
         """
-        expense_group_id = request.data.get('expense_group_id')
-        task_log_id = request.data.get('task_log_id')
+        task_log_ids = get_task_log_ids(request.data)
 
-        assert_valid(expense_group_id is not None, 'expense group id not found')
-        assert_valid(task_log_id is not None, 'Task Log id not found')
-
-        expense_group = ExpenseGroup.objects.get(pk=expense_group_id)
-        task_log = TaskLog.objects.get(pk=task_log_id)
-
-        create_cheque(expense_group, task_log)
+        async_task(export_task_logs, kwargs['workspace_id'], 'CREATING_CHECK', task_log_ids)
 
         return Response(
             data={},
-            status=status.HTTP_200_OK
+            status=status.HTTP_202_ACCEPTED
         )
 
 
@@ -469,30 +478,24 @@ class CreditCardPurchaseView(generics.ListCreateAPIView):
     Create CreditCardPurchase
     """
     serializer_class = CreditCardPurchaseSerializer
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         return CreditCardPurchase.objects.filter(
-            expense_group__workspace_id=self.kwargs['workspace_id']
+            workspace_id=self.kwargs['workspace_id']
         ).order_by('-updated_at')
 
     def post(self, request, *args, **kwargs):
         """
         Create credit_card_purchase from expense group
         """
-        expense_group_id = request.data.get('expense_group_id')
-        task_log_id = request.data.get('task_log_id')
-
-        assert_valid(expense_group_id is not None, 'Expense ids not found')
-        assert_valid(task_log_id is not None, 'Task Log id not found')
+        task_log_ids = get_task_log_ids(request.data)
 
-        expense_group = ExpenseGroup.objects.get(pk=expense_group_id)
-        task_log = TaskLog.objects.get(pk=task_log_id)
-
-        create_credit_card_purchase(expense_group, task_log)
+        async_task(export_task_logs, kwargs['workspace_id'], 'CREATING_CREDIT_CARD_PURCHASE', task_log_ids)
 
         return Response(
             data={},
-            status=status.HTTP_200_OK
+            status=status.HTTP_202_ACCEPTED
         )
 
 
@@ -517,30 +520,24 @@ class JournalEntryView(generics.ListCreateAPIView):
     Create JournalEntry
     """
     serializer_class = JournalEntrySerializer
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         return JournalEntry.objects.filter(
-            expense_group__workspace_id=self.kwargs['workspace_id']
+            workspace_id=self.kwargs['workspace_id']
         ).order_by('-updated_at')
 
     def post(self, request, *args, **kwargs):
         """
         Create JournalEntry from expense group
         """
-        expense_group_id = request.data.get('expense_group_id')
-        task_log_id = request.data.get('task_log_id')
-
-        assert_valid(expense_group_id is not None, 'Expense ids not found')
-        assert_valid(task_log_id is not None, 'Task Log id not found')
-
-        expense_group = ExpenseGroup.objects.get(pk=expense_group_id)
-        task_log = TaskLog.objects.get(pk=task_log_id)
+        task_log_ids = get_task_log_ids(request.data)
 
-        create_journal_entry(expense_group, task_log)
+        async_task(export_task_logs, kwargs['workspace_id'], 'CREATING_JOURNAL_ENTRY', task_log_ids)
 
         return Response(
             data={},
-            status=status.HTTP_200_OK
+            status=status.HTTP_202_ACCEPTED
         )
 
 
@@ -0,0 +1,23 @@
+# Generated by Django 3.0.3 on 2026-10-18 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0002_auto_20200420_0434'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tasklog',
+            name='lease_expires_at',
+            field=models.DateTimeField(help_text='Lease expiry, the task can be claimed after it', null=True),
+        ),
+        migrations.AddField(
+            model_name='tasklog',
+            name='lease_owner',
+            field=models.CharField(help_text='Worker holding the task', max_length=255, null=True),
+        ),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0003_tasklog_lease'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tasklog',
+            index=models.Index(fields=['workspace', 'updated_at', 'id'], name='task_log_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.0.3 on 2026-10-18 16:10
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0004_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tasklog',
+            name='counts',
+            field=django.contrib.postgres.fields.jsonb.JSONField(help_text='Task counts, e.g. new / changed / skipped expenses of a fetch', null=True),
+        ),
+    ]
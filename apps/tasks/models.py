@@ -1,5 +1,10 @@
-from django.db import models
+from datetime import timedelta
+from typing import List
+
+from django.db import models, transaction
+from django.db.models import Q
 from django.contrib.postgres.fields import JSONField
+from django.utils import timezone
 
 from apps.workspaces.models import Workspace
 from apps.fyle.models import ExpenseGroup
@@ -30,5 +35,78 @@ class TaskLog(models.Model):
                                              help_text='Reference to CreditCardPurchase', null=True)
     status = models.CharField(max_length=255, help_text='Task Status')
     detail = JSONField(help_text='Task response', null=True, default=get_default)
+    counts = JSONField(help_text='Task counts, e.g. new / changed / skipped expenses of a fetch', null=True)
+    lease_owner = models.CharField(max_length=255, null=True, help_text='Worker holding the task')
+    lease_expires_at = models.DateTimeField(null=True, help_text='Lease expiry, the task can be claimed after it')
     created_at = models.DateTimeField(auto_now_add=True, help_text='Created at datetime')
     updated_at = models.DateTimeField(auto_now=True, help_text='Updated at datetime')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['workspace', 'updated_at', 'id'], name='task_log_keyset_idx')
+        ]
+
+    @staticmethod
+    def claim_task_logs(workspace_id: int, task_type: str, owner: str, lease_seconds: int, batch_size: int,
+                        task_log_ids: List[int] = None, exclude_task_log_ids: List[int] = None) -> List['TaskLog']:
+        """
+        Lease in progress task logs that no other worker holds, skipping rows locked by concurrent claims
+        :param workspace_id: workspace id
+        :param task_type: task type
+        :param owner: worker claiming the task logs
+        :param lease_seconds: lease duration
+        :param batch_size: maximum number of task logs claimed
+        :param task_log_ids: only claim these task logs
+        :param exclude_task_log_ids: never claim these task logs
+        :return: claimed task logs
+        """
+        now = timezone.now()
+
+        with transaction.atomic():
+            task_logs = TaskLog.objects.select_for_update(skip_locked=True).filter(
+                Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=now),
+                workspace_id=workspace_id, type=task_type, status='IN_PROGRESS'
+            )
+
+            if task_log_ids is not None:
+                task_logs = task_logs.filter(id__in=task_log_ids)
+
+            if exclude_task_log_ids:
+                task_logs = task_logs.exclude(id__in=exclude_task_log_ids)
+
+            task_logs = list(task_logs.order_by('id')[:batch_size])
+
+            TaskLog.objects.filter(id__in=[task_log.id for task_log in task_logs]).update(
+                lease_owner=owner, lease_expires_at=now + timedelta(seconds=lease_seconds)
+            )
+
+        for task_log in task_logs:
+            task_log.lease_owner = owner
+            task_log.lease_expires_at = now + timedelta(seconds=lease_seconds)
+
+        return task_logs
+
+    @staticmethod
+    def renew_leases(task_log_ids: List[int], owner: str, lease_seconds: int) -> int:
+        """
+        Extend the leases a worker holds
+        :param task_log_ids: task log ids
+        :param owner: worker holding the leases
+        :param lease_seconds: lease duration from now
+        :return: number of leases renewed
+        """
+        return TaskLog.objects.filter(id__in=task_log_ids, lease_owner=owner).update(
+            lease_expires_at=timezone.now() + timedelta(seconds=lease_seconds)
+        )
+
+    @staticmethod
+    def release_leases(task_log_ids: List[int], owner: str) -> int:
+        """
+        Release the leases a worker holds
+        :param task_log_ids: task log ids
+        :param owner: worker holding the leases
+        :return: number of leases released
+        """
+        return TaskLog.objects.filter(id__in=task_log_ids, lease_owner=owner).update(
+            lease_owner=None, lease_expires_at=None
+        )
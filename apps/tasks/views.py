@@ -2,6 +2,7 @@ from rest_framework import generics
 from rest_framework.response import Response
 from rest_framework.views import status
 
+from fyle_qbo_api.pagination import KeysetPagination
 from fyle_qbo_api.utils import assert_valid
 
 from .models import TaskLog
@@ -13,6 +14,7 @@ class TasksView(generics.ListAPIView):
     Tasks view
     """
     serializer_class = TaskLogSerializer
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         """
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+def backfill_expenses_synced_till(apps, schema_editor):
+    """
+    Start the watermark of existing workspaces from their last sync
+    """
+    workspace_model = apps.get_model('workspaces', 'Workspace')
+    workspace_model.objects.filter(last_synced_at__isnull=False).update(
+        expenses_synced_till=models.F('last_synced_at')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspaces', '0003_auto_20200506_0739'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workspace',
+            name='expenses_synced_till',
+            field=models.DateTimeField(help_text='Latest expense updated at datetime ingested from Fyle', null=True),
+        ),
+        migrations.RunPython(backfill_expenses_synced_till, migrations.RunPython.noop),
+    ]
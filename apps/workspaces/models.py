@@ -17,6 +17,9 @@ class Workspace(models.Model):
     fyle_org_id = models.CharField(max_length=255, help_text='org id', unique=True)
     qbo_realm_id = models.CharField(max_length=255, help_text='qbo realm id')
     last_synced_at = models.DateTimeField(help_text='Datetime when expenses were pulled last', null=True)
+    expenses_synced_till = models.DateTimeField(
+        help_text='Latest expense updated at datetime ingested from Fyle', null=True
+    )
     created_at = models.DateTimeField(auto_now_add=True, help_text='Created at datetime')
     updated_at = models.DateTimeField(auto_now=True, help_text='Updated at datetime')
 
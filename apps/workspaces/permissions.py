@@ -1,21 +1,184 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from rest_framework import permissions
 
 from apps.workspaces.models import Workspace
+from fyle_qbo_api.utils import get_redis_connection
+
+logger = logging.getLogger(__name__)
 
 User = get_user_model()
 
+# (user_id, workspace_id) -> expiry of the cached membership, only members are cached in the process.
+# Entries are kept in expiry order, every ttl is the same
+_membership_cache = OrderedDict()
+_membership_cache_lock = threading.Lock()
+
+
+def _get_membership_key(user_id, workspace_id) -> tuple:
+    """
+    Key of a membership in the process cache
+    :param user_id: user id
+    :param workspace_id: workspace id
+    :return: key
+    """
+    return str(user_id), str(workspace_id)
+
+
+def _is_cached_member(user_id, workspace_id) -> bool:
+    """
+    Check the process cache for a membership, dropping it once expired
+    :param user_id: user id
+    :param workspace_id: workspace id
+    :return: True if the membership is cached and not expired
+    """
+    key = _get_membership_key(user_id, workspace_id)
+
+    with _membership_cache_lock:
+        expires_at = _membership_cache.get(key)
+
+        if expires_at is None:
+            return False
+
+        if expires_at <= time.monotonic():
+            del _membership_cache[key]
+            return False
+
+        return True
+
+
+def _cache_member(user_id, workspace_id):
+    """
+    Cache a membership in the process for WORKSPACE_MEMBERSHIP_CACHE_TTL seconds,
+    evicting expired entries and the oldest ones beyond WORKSPACE_MEMBERSHIP_CACHE_SIZE
+    :param user_id: user id
+    :param workspace_id: workspace id
+    :return: None
+    """
+    key = _get_membership_key(user_id, workspace_id)
+    now = time.monotonic()
+
+    with _membership_cache_lock:
+        _membership_cache[key] = now + settings.WORKSPACE_MEMBERSHIP_CACHE_TTL
+        _membership_cache.move_to_end(key)
+
+        while _membership_cache:
+            oldest_key, oldest_expires_at = next(iter(_membership_cache.items()))
+
+            if oldest_expires_at > now and len(_membership_cache) <= settings.WORKSPACE_MEMBERSHIP_CACHE_SIZE:
+                break
+
+            del _membership_cache[oldest_key]
+
+
+def _uncache_member(user_id, workspace_id):
+    """
+    Drop a membership from the process cache
+    :param user_id: user id
+    :param workspace_id: workspace id
+    :return: None
+    """
+    with _membership_cache_lock:
+        _membership_cache.pop(_get_membership_key(user_id, workspace_id), None)
+
 
 class WorkspacePermissions(permissions.BasePermission):
     """
     Permission check for users <> workspaces
     """
+    MEMBERSHIP_CACHE_KEY = 'workspace_membership:{0}:{1}'
+
+    @staticmethod
+    def __get_cached_membership(user_id, workspace_id):
+        """
+        Get the cached membership of a user in a workspace
+        :param user_id: user id
+        :param workspace_id: workspace id
+        :return: True / False, None when not cached
+        """
+        if _is_cached_member(user_id, workspace_id):
+            return True
+
+        redis_connection = get_redis_connection()
+
+        if redis_connection is None:
+            return None
+
+        try:
+            is_member = redis_connection.get(WorkspacePermissions.MEMBERSHIP_CACHE_KEY.format(user_id, workspace_id))
+        except redis.RedisError:
+            logger.exception('Reading workspace membership from redis failed')
+            return None
+
+        if is_member is None:
+            return None
+
+        if is_member == b'1':
+            _cache_member(user_id, workspace_id)
+            return True
+
+        return False
+
+    @staticmethod
+    def __cache_membership(user_id, workspace_id, is_member: bool):
+        """
+        Cache the membership of a user in a workspace for WORKSPACE_MEMBERSHIP_CACHE_TTL seconds
+        :param user_id: user id
+        :param workspace_id: workspace id
+        :param is_member: whether the user belongs to the workspace
+        :return: None
+        """
+        if is_member:
+            _cache_member(user_id, workspace_id)
+
+        redis_connection = get_redis_connection()
+
+        if redis_connection is None:
+            return
+
+        try:
+            redis_connection.setex(
+                WorkspacePermissions.MEMBERSHIP_CACHE_KEY.format(user_id, workspace_id),
+                settings.WORKSPACE_MEMBERSHIP_CACHE_TTL, '1' if is_member else '0'
+            )
+        except redis.RedisError:
+            logger.exception('Writing workspace membership to redis failed')
+
+    @staticmethod
+    def invalidate_membership(user_id, workspace_id):
+        """
+        Drop the cached membership of a user in a workspace
+        :param user_id: user id
+        :param workspace_id: workspace id
+        :return: None
+        """
+        _uncache_member(user_id, workspace_id)
+
+        redis_connection = get_redis_connection()
+
+        if redis_connection is None:
+            return
+
+        try:
+            redis_connection.delete(WorkspacePermissions.MEMBERSHIP_CACHE_KEY.format(user_id, workspace_id))
+        except redis.RedisError:
+            logger.exception('Deleting workspace membership from redis failed')
 
     def has_permission(self, request, view):
         workspace_id = view.kwargs.get('workspace_id')
         user_id = request.user
-        user = User.objects.get(user_id=user_id)
-        workspaces = Workspace.objects.filter(user__in=[user], pk=workspace_id).all()
-        if not workspaces:
-            return False
-        return True
+
+        is_member = self.__get_cached_membership(user_id, workspace_id)
+
+        if is_member is None:
+            user = User.objects.get(user_id=user_id)
+            is_member = Workspace.objects.filter(user__in=[user], pk=workspace_id).exists()
+            self.__cache_membership(user_id, workspace_id, is_member)
+
+        return is_member
@@ -3,7 +3,7 @@ from datetime import datetime
 from django.conf import settings
 
 from apps.fyle.models import ExpenseGroup
-from apps.fyle.tasks import create_expense_groups
+from apps.fyle.tasks import async_create_expense_groups
 from apps.fyle.utils import FyleConnector
 from apps.quickbooks_online.tasks import schedule_bills_creation, schedule_cheques_creation,\
     schedule_journal_entry_creation, schedule_credit_card_purchase_creation
@@ -49,7 +49,7 @@ def schedule_sync(workspace_id: int, schedule_enabled: bool, hours: int, next_ru
         fyle_connector = FyleConnector(fyle_credentials.refresh_token, workspace_id)
         fyle_sdk_connection = fyle_connector.connection
 
-        jobs = FyleJobsSDK(settings.FYLE_JOBS_URL, fyle_sdk_connection)
+        jobs = FyleJobsSDK(settings.FYLE_JOBS_URL, fyle_sdk_connection, workspace_id)
         if ws_settings.schedule.fyle_job_id:
             jobs.delete_job(ws_settings.schedule.fyle_job_id)
 
@@ -76,7 +76,7 @@ def create_schedule_job(workspace_id: int, schedule: WorkspaceSchedule, user: st
     fyle_connector = FyleConnector(fyle_credentials.refresh_token, workspace_id)
     fyle_sdk_connection = fyle_connector.connection
 
-    jobs = FyleJobsSDK(settings.FYLE_JOBS_URL, fyle_sdk_connection)
+    jobs = FyleJobsSDK(settings.FYLE_JOBS_URL, fyle_sdk_connection, workspace_id)
 
     created_job = jobs.trigger_interval(
         callback_url='{0}{1}'.format(
@@ -96,7 +96,7 @@ def create_schedule_job(workspace_id: int, schedule: WorkspaceSchedule, user: st
 
 def run_sync_schedule(workspace_id, user: str):
     """
-    Run schedule
+    Run schedule, fetching expenses and exporting only the expense groups touched by this fetch
     :param user: user email
     :param workspace_id: workspace id
     :return: None
@@ -112,16 +112,21 @@ def run_sync_schedule(workspace_id, user: str):
     fund_source = ['PERSONAL']
     if general_settings.corporate_credit_card_expenses_object:
         fund_source.append('CCC')
+
+    synced_expense_group_ids = []
     if general_settings.reimbursable_expenses_object:
-        task_log: TaskLog = create_expense_groups(
+        synced_expense_group_ids = async_create_expense_groups(
             workspace_id=workspace_id, state=['PAYMENT_PROCESSING'], fund_source=fund_source, task_log=task_log
         )
 
-    if task_log.status == 'COMPLETE':
+    if task_log.status == 'COMPLETE' and synced_expense_group_ids:
+        synced_expense_groups = ExpenseGroup.objects.filter(workspace_id=workspace_id, id__in=synced_expense_group_ids)
 
         if general_settings.reimbursable_expenses_object:
 
-            expense_group_ids = ExpenseGroup.objects.filter(fund_source='PERSONAL').values_list('id', flat=True)
+            expense_group_ids = list(
+                synced_expense_groups.filter(fund_source='PERSONAL').values_list('id', flat=True)
+            )
 
             if general_settings.reimbursable_expenses_object == 'BILL':
                 schedule_bills_creation(
@@ -139,7 +144,7 @@ def run_sync_schedule(workspace_id, user: str):
                 )
 
         if general_settings.corporate_credit_card_expenses_object:
-            expense_group_ids = ExpenseGroup.objects.filter(fund_source='CCC').values_list('id', flat=True)
+            expense_group_ids = list(synced_expense_groups.filter(fund_source='CCC').values_list('id', flat=True))
 
             if general_settings.corporate_credit_card_expenses_object == 'JOURNAL ENTRY':
                 schedule_journal_entry_creation(
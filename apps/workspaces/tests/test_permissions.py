@@ -0,0 +1,36 @@
+"""
+Workspace permission tests
+"""
+import threading
+
+from django.test import SimpleTestCase, override_settings
+
+from apps.workspaces import permissions
+from apps.workspaces.permissions import WorkspacePermissions
+
+
+@override_settings(REDIS_URL=None, WORKSPACE_MEMBERSHIP_CACHE_TTL=60, WORKSPACE_MEMBERSHIP_CACHE_SIZE=2)
+class MembershipCacheTest(SimpleTestCase):
+    """
+    The process cache of workspace memberships
+    """
+    def setUp(self):
+        permissions._membership_cache.clear()
+
+    def test_invalidate_membership_evicts_entry(self):
+        permissions._cache_member('usTest', 1)
+
+        invalidate = threading.Thread(target=WorkspacePermissions.invalidate_membership, args=('usTest', 1))
+        invalidate.start()
+        invalidate.join(timeout=5)
+
+        self.assertFalse(invalidate.is_alive())
+        self.assertFalse(permissions._is_cached_member('usTest', 1))
+
+    def test_cache_is_bounded(self):
+        for workspace_id in range(5):
+            permissions._cache_member('usTest', workspace_id)
+
+        self.assertEqual(len(permissions._membership_cache), 2)
+        self.assertTrue(permissions._is_cached_member('usTest', 4))
+        self.assertFalse(permissions._is_cached_member('usTest', 0))
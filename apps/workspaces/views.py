@@ -2,6 +2,8 @@ import json
 
 from django.contrib.auth import get_user_model
 
+from django_q.tasks import async_task
+
 from rest_framework.response import Response
 from rest_framework.views import status
 from rest_framework import viewsets
@@ -14,8 +16,10 @@ from qbosdk import exceptions as qbo_exc
 from fyle_rest_auth.utils import AuthUtils
 from fyle_rest_auth.models import AuthToken
 
+from fyle_jobs import FyleJobsSDK
 from fyle_qbo_api.utils import assert_valid
 
+from .permissions import WorkspacePermissions
 from .models import Workspace, FyleCredential, QBOCredential, WorkspaceSettings, WorkspaceGeneralSettings
 from .utils import generate_qbo_refresh_token, create_or_update_general_settings
 from .tasks import schedule_sync, run_sync_schedule
@@ -57,6 +61,8 @@ class WorkspaceView(viewsets.ViewSet):
                 workspace_id=workspace.id
             )
 
+        WorkspacePermissions.invalidate_membership(request.user, workspace.id)
+
         return Response(
             data=WorkspaceSerializer(workspace).data,
             status=status.HTTP_200_OK
@@ -150,6 +156,8 @@ class ConnectFyleView(viewsets.ViewSet):
                 }
             )
 
+            FyleJobsSDK.invalidate_user_profile(kwargs['workspace_id'])
+
             return Response(
                 data=FyleCredentialSerializer(fyle_credentials).data,
                 status=status.HTTP_200_OK
@@ -320,9 +328,9 @@ class ScheduledSyncView(viewsets.ViewSet):
         """
         Scheduled sync
         """
-        run_sync_schedule(kwargs['workspace_id'], request.user)
+        async_task(run_sync_schedule, kwargs['workspace_id'], request.user)
         return Response(
-            status=status.HTTP_200_OK
+            status=status.HTTP_202_ACCEPTED
         )
 
 
@@ -1,23 +1,96 @@
 """
 Fyle Jobs
 """
+import json
+import logging
 from typing import Dict
 
+import redis
+from django.conf import settings
+from django.core.cache import cache
+
 from fylesdk import FyleSDK
 
+from fyle_qbo_api.utils import get_redis_connection
+
 from .utils import post_request, delete_request
 
+logger = logging.getLogger(__name__)
+
 
 class FyleJobsSDK:
     """
     Fyle Jobs SDK
     """
 
-    def __init__(self, jobs_url: str, fyle_sdk_connection: FyleSDK):
-        self.user_profile = fyle_sdk_connection.Employees.get_my_profile()['data']
+    USER_PROFILE_CACHE_KEY = 'fyle_jobs_user_profile_{0}'
+
+    def __init__(self, jobs_url: str, fyle_sdk_connection: FyleSDK, workspace_id: int = None):
+        self.user_profile = FyleJobsSDK.get_user_profile(fyle_sdk_connection, workspace_id)
         self.jobs_url = jobs_url
         self.access_token = fyle_sdk_connection.access_token
 
+    @staticmethod
+    def get_user_profile(fyle_sdk_connection: FyleSDK, workspace_id: int = None) -> Dict:
+        """
+        Get the employee profile of the connected user, cached per workspace for FYLE_PROFILE_CACHE_TTL seconds
+        in Redis so that every web and django-q process sees the same profile and its invalidation
+        :param fyle_sdk_connection: Fyle SDK connection
+        :param workspace_id: workspace id, the profile is not cached without it
+        :returns: employee profile
+        """
+        if workspace_id is None:
+            return fyle_sdk_connection.Employees.get_my_profile()['data']
+
+        cache_key = FyleJobsSDK.USER_PROFILE_CACHE_KEY.format(workspace_id)
+        redis_connection = get_redis_connection()
+
+        if redis_connection is not None:
+            try:
+                user_profile = redis_connection.get(cache_key)
+            except redis.RedisError:
+                logger.exception('Reading user profile from redis failed')
+                user_profile = None
+
+            if user_profile is not None:
+                return json.loads(user_profile)
+
+            user_profile = fyle_sdk_connection.Employees.get_my_profile()['data']
+
+            try:
+                redis_connection.setex(cache_key, settings.FYLE_PROFILE_CACHE_TTL, json.dumps(user_profile))
+            except redis.RedisError:
+                logger.exception('Writing user profile to redis failed')
+
+            return user_profile
+
+        # without Redis the cache and its invalidation are local to the process
+        user_profile = cache.get(cache_key)
+
+        if user_profile is None:
+            user_profile = fyle_sdk_connection.Employees.get_my_profile()['data']
+            cache.set(cache_key, user_profile, settings.FYLE_PROFILE_CACHE_TTL)
+
+        return user_profile
+
+    @staticmethod
+    def invalidate_user_profile(workspace_id: int):
+        """
+        Invalidate the cached employee profile of a workspace
+        :param workspace_id: workspace id
+        :returns: None
+        """
+        cache_key = FyleJobsSDK.USER_PROFILE_CACHE_KEY.format(workspace_id)
+        redis_connection = get_redis_connection()
+
+        if redis_connection is not None:
+            try:
+                redis_connection.delete(cache_key)
+            except redis.RedisError:
+                logger.exception('Deleting user profile from redis failed')
+
+        cache.delete(cache_key)
+
     def trigger_now(self, callback_url: str, callback_method: str,
                     job_description: str, object_id: str, payload: any = None,
                     job_data_url: str = None) -> Dict:
@@ -1,8 +1,9 @@
 import json
-import requests
 from fylesdk import WrongParamsError, InvalidTokenError, NoPrivilegeError, NotFoundItemError, ExpiredTokenError, \
     InternalServerError, FyleSDKError
 
+from fyle_qbo_api.utils import request_with_retry
+
 
 def post_request(jobs_url, access_token, data):
     """
@@ -18,7 +19,8 @@ def post_request(jobs_url, access_token, data):
         'Authorization': 'Bearer {0}'.format(access_token)
     }
 
-    response = requests.post(
+    response = request_with_retry(
+        'POST',
         jobs_url,
         headers=api_headers,
         json=data
@@ -62,7 +64,8 @@ def delete_request(jobs_url, access_token, job_id):
     api_headers = {
         'Authorization': 'Bearer {0}'.format(access_token)
     }
-    response = requests.delete(
+    response = request_with_retry(
+        'DELETE',
         '{0}{1}'.format(jobs_url, job_id),
         headers=api_headers,
     )
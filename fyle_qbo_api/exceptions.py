@@ -19,3 +19,25 @@ class BulkError(Exception):
 
     def __str__(self):
         return repr(self.message)
+
+
+class BatchError(Exception):
+    """
+    Batch Error Exception, raised when a batch request fails after earlier batches went through.
+
+    Parameters:
+        msg (str): Short description of the error.
+        responses: Item responses in the order of the items, None for items of the failed and later batches.
+        failed_indexes: Indexes of the items of the failed batch.
+        error: Exception raised by the failed batch.
+    """
+
+    def __init__(self, msg, responses, failed_indexes, error):
+        super(BatchError, self).__init__(msg)
+        self.message = msg
+        self.responses = responses
+        self.failed_indexes = failed_indexes
+        self.error = error
+
+    def __str__(self):
+        return repr(self.message)
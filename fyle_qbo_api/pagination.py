@@ -0,0 +1,97 @@
+"""
+Pagination
+"""
+import base64
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(LimitOffsetPagination):
+    """
+    Limit / offset pagination that switches to keyset pagination on (updated_at, id), newest first,
+    when the request asks for ?pagination=keyset or carries a cursor
+    """
+    mode_query_param = 'pagination'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    keyset = False
+    next_cursor = None
+
+    @staticmethod
+    def encode_cursor(instance) -> str:
+        """
+        Encode the position of a row
+        :param instance: last row of a page
+        :return: cursor
+        """
+        position = '{0}|{1}'.format(instance.updated_at.isoformat(), instance.id)
+        return base64.urlsafe_b64encode(position.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, cursor: str):
+        """
+        Decode a cursor into the (updated_at, id) position it points after
+        :param cursor: cursor
+        :return: updated_at, id
+        """
+        try:
+            updated_at, row_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+            updated_at = parse_datetime(updated_at)
+            row_id = int(row_id)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if updated_at is None:
+            raise NotFound(self.invalid_cursor_message)
+
+        return updated_at, row_id
+
+    def paginate_queryset(self, queryset, request, view=None):
+        cursor = request.query_params.get(self.cursor_query_param)
+        self.keyset = cursor is not None or request.query_params.get(self.mode_query_param) == 'keyset'
+
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.limit = self.get_limit(request)
+
+        queryset = queryset.order_by('-updated_at', '-id')
+
+        if cursor:
+            updated_at, row_id = self.decode_cursor(cursor)
+            queryset = queryset.filter(Q(updated_at__lt=updated_at) | Q(updated_at=updated_at, id__lt=row_id))
+
+        # one extra row tells whether there is a next page without counting the table
+        results = list(queryset[:self.limit + 1])
+
+        self.next_cursor = self.encode_cursor(results[self.limit - 1]) if len(results) > self.limit else None
+
+        return results[:self.limit]
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+
+        if self.next_cursor is None:
+            return None
+
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.offset_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', None),
+            ('results', data)
+        ]))
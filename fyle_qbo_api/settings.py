@@ -44,6 +44,7 @@ INSTALLED_APPS = [
     'corsheaders',
     'fyle_rest_auth',
     'fyle_accounting_mappings',
+    'django_q',
 
     # User Created Apps
     'apps.users',
@@ -192,6 +193,13 @@ FYLE_CLIENT_ID = os.environ.get('FYLE_CLIENT_ID')
 FYLE_CLIENT_SECRET = os.environ.get('FYLE_CLIENT_SECRET')
 FYLE_BASE_URL = os.environ.get('FYLE_BASE_URL')
 FYLE_JOBS_URL = os.environ.get('FYLE_JOBS_URL')
+FYLE_JOBS_BATCH_CALLBACK = os.environ.get('FYLE_JOBS_BATCH_CALLBACK', 'True') == 'True'
+FYLE_EXPENSES_PAGE_SIZE = int(os.environ.get('FYLE_EXPENSES_PAGE_SIZE', 300))
+FYLE_ACCESS_TOKEN_LIFETIME = int(os.environ.get('FYLE_ACCESS_TOKEN_LIFETIME', 3600))
+FYLE_TOKEN_REFRESH_MARGIN = int(os.environ.get('FYLE_TOKEN_REFRESH_MARGIN', 300))
+FYLE_CONNECTION_CACHE_SIZE = int(os.environ.get('FYLE_CONNECTION_CACHE_SIZE', 100))
+FYLE_PROFILE_CACHE_TTL = int(os.environ.get('FYLE_PROFILE_CACHE_TTL', 3600))
+FYLE_SYNC_OVERLAP_SECONDS = int(os.environ.get('FYLE_SYNC_OVERLAP_SECONDS', 300))
 
 # QBO Settings
 QBO_CLIENT_ID = os.environ.get('QBO_CLIENT_ID')
@@ -199,5 +207,60 @@ QBO_CLIENT_SECRET = os.environ.get('QBO_CLIENT_SECRET')
 QBO_REDIRECT_URI = os.environ.get('QBO_REDIRECT_URI')
 QBO_TOKEN_URI = os.environ.get('QBO_TOKEN_URI')
 QBO_ENVIRONMENT = os.environ.get('QBO_ENVIRONMENT')
+QBO_BATCH_EXPORT = os.environ.get('QBO_BATCH_EXPORT') == 'True'
+QBO_BATCH_SIZE = int(os.environ.get('QBO_BATCH_SIZE', 30))
+QBO_ACCESS_TOKEN_LIFETIME = int(os.environ.get('QBO_ACCESS_TOKEN_LIFETIME', 3600))
+QBO_TOKEN_REFRESH_MARGIN = int(os.environ.get('QBO_TOKEN_REFRESH_MARGIN', 300))
+QBO_CONNECTOR_POOL_SIZE = int(os.environ.get('QBO_CONNECTOR_POOL_SIZE', 100))
+QBO_RATE_LIMIT_PER_MINUTE = int(os.environ.get('QBO_RATE_LIMIT_PER_MINUTE', 450))
+QBO_RATE_LIMIT_BURST = int(os.environ.get('QBO_RATE_LIMIT_BURST', 20))
+
+# Redis Settings
+REDIS_URL = os.environ.get('REDIS_URL')
+WORKSPACE_MEMBERSHIP_CACHE_TTL = int(os.environ.get('WORKSPACE_MEMBERSHIP_CACHE_TTL', 60))
+WORKSPACE_MEMBERSHIP_CACHE_SIZE = int(os.environ.get('WORKSPACE_MEMBERSHIP_CACHE_SIZE', 10000))
+
+# HTTP Settings
+HTTP_POOL_CONNECTIONS = int(os.environ.get('HTTP_POOL_CONNECTIONS', 10))
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 20))
+HTTP_KEEP_ALIVE = os.environ.get('HTTP_KEEP_ALIVE', 'True') == 'True'
+HTTP_TIMEOUT = int(os.environ.get('HTTP_TIMEOUT', 60))
+
+# Retry Settings
+RETRY_MAX_ATTEMPTS = int(os.environ.get('RETRY_MAX_ATTEMPTS', 5))
+RETRY_BASE_BACKOFF = float(os.environ.get('RETRY_BASE_BACKOFF', 1))
+RETRY_MAX_BACKOFF = float(os.environ.get('RETRY_MAX_BACKOFF', 30))
+RETRY_DEADLINE = int(os.environ.get('RETRY_DEADLINE', 120))
+
+# Django-Q Settings
+Q_CLUSTER = {
+    'name': 'fyle_qbo_api',
+    'workers': int(os.environ.get('Q_CLUSTER_WORKERS', 4)),
+    'timeout': int(os.environ.get('Q_CLUSTER_TIMEOUT', 900)),
+    'retry': int(os.environ.get('Q_CLUSTER_RETRY', 1200)),
+    'save_limit': 0
+}
+
+if os.environ.get('Q_CLUSTER_REDIS_HOST'):
+    Q_CLUSTER['redis'] = {
+        'host': os.environ.get('Q_CLUSTER_REDIS_HOST'),
+        'port': int(os.environ.get('Q_CLUSTER_REDIS_PORT', 6379)),
+        'db': int(os.environ.get('Q_CLUSTER_REDIS_DB', 0))
+    }
+else:
+    Q_CLUSTER['orm'] = 'default'
+
+# Export Queue Settings
+EXPORT_CLAIM_BATCH_SIZE = int(os.environ.get('EXPORT_CLAIM_BATCH_SIZE', 30))
+EXPORT_LEASE_SECONDS = int(os.environ.get('EXPORT_LEASE_SECONDS', 600))
+EXPORT_HEARTBEAT_SECONDS = int(os.environ.get('EXPORT_HEARTBEAT_SECONDS', 60))
+
+# Attachment Settings
+ATTACHMENT_WORKERS = int(os.environ.get('ATTACHMENT_WORKERS', 4))
+ATTACHMENT_MAX_IN_FLIGHT_BYTES = int(os.environ.get('ATTACHMENT_MAX_IN_FLIGHT_BYTES', 50 * 1024 * 1024))
+ATTACHMENT_MAX_BYTES = int(os.environ.get('ATTACHMENT_MAX_BYTES', 10 * 1024 * 1024))
+
+# Bulk write Settings
+BULK_UPSERT_CHUNK_SIZE = int(os.environ.get('BULK_UPSERT_CHUNK_SIZE', 500))
 
 CORS_ORIGIN_ALLOW_ALL = True
@@ -1,6 +1,29 @@
+import logging
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import List, Dict, Callable
+
+from django.conf import settings
+from django.db import connection, IntegrityError
+
 from rest_framework.views import Response
 from rest_framework.serializers import ValidationError
 
+import redis
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+_redis_connection = None
+_redis_connection_lock = threading.Lock()
+
 
 def assert_valid(condition: bool, message: str) -> Response or None:
     """
@@ -13,3 +36,455 @@ def assert_valid(condition: bool, message: str) -> Response or None:
         raise ValidationError(detail={
             'message': message
         })
+
+
+def get_http_session() -> requests.Session:
+    """
+    Get the process wide HTTP session, its connection pools are shared by all Fyle, Fyle Jobs and QBO calls
+    :return: requests session
+    """
+    global _http_session  # pylint: disable=global-statement
+
+    with _http_session_lock:
+        if _http_session is None:
+            session = requests.Session()
+
+            adapter = HTTPAdapter(
+                pool_connections=settings.HTTP_POOL_CONNECTIONS, pool_maxsize=settings.HTTP_POOL_SIZE
+            )
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+
+            if not settings.HTTP_KEEP_ALIVE:
+                session.headers['Connection'] = 'close'
+
+            _http_session = session
+
+        return _http_session
+
+
+# Status codes worth retrying, only the ones in UNPROCESSED_STATUS_CODES are safe for non idempotent requests
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+UNPROCESSED_STATUS_CODES = (429, 503)
+
+
+def is_retryable_status_code(status_code: int, idempotent: bool) -> bool:
+    """
+    Check if a request that failed with a status code can be retried
+    :param status_code: HTTP status code
+    :param idempotent: True if repeating the request has no extra effect
+    :return: True if retryable
+    """
+    return status_code in (RETRYABLE_STATUS_CODES if idempotent else UNPROCESSED_STATUS_CODES)
+
+
+def get_retry_after(response: requests.Response) -> float or None:
+    """
+    Get the seconds to wait from the Retry-After header of a response
+    :param response: HTTP response
+    :return: seconds, None if the header is missing or invalid
+    """
+    retry_after = response.headers.get('Retry-After')
+
+    if not retry_after:
+        return None
+
+    if retry_after.isdigit():
+        return float(retry_after)
+
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def get_backoff(attempt: int) -> float:
+    """
+    Exponential backoff with full jitter
+    :param attempt: number of attempts made so far, starting at 1
+    :return: seconds to wait
+    """
+    return random.uniform(0, min(settings.RETRY_MAX_BACKOFF, settings.RETRY_BASE_BACKOFF * 2 ** (attempt - 1)))
+
+
+def request_with_retry(method: str, url: str, idempotent: bool = None, **kwargs) -> requests.Response:
+    """
+    Send a HTTP request through the shared session, retrying connection errors and retryable status codes
+    until RETRY_MAX_ATTEMPTS or RETRY_DEADLINE seconds are reached
+    :param method: HTTP method
+    :param url: request url
+    :param idempotent: True if repeating the request has no extra effect, defaults to True for GET / PUT / DELETE
+    :param kwargs: requests arguments
+    :return: last response
+    """
+    if idempotent is None:
+        idempotent = method.upper() in ('GET', 'PUT', 'DELETE')
+
+    deadline = time.monotonic() + settings.RETRY_DEADLINE
+    attempt = 0
+
+    while True:
+        attempt += 1
+        remaining = deadline - time.monotonic()
+        retry_after = None
+
+        try:
+            response = get_http_session().request(
+                method, url, timeout=min(settings.HTTP_TIMEOUT, max(remaining, 1)), **kwargs
+            )
+
+            if not is_retryable_status_code(response.status_code, idempotent):
+                return response
+
+            retry_after = get_retry_after(response)
+            error = None
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as exception:
+            # A read timeout may come after the server processed the request
+            if not idempotent and not isinstance(exception, requests.exceptions.ConnectTimeout):
+                raise
+            error = exception
+
+        wait = retry_after if retry_after is not None else get_backoff(attempt)
+
+        if attempt >= settings.RETRY_MAX_ATTEMPTS or time.monotonic() + wait > deadline:
+            if error:
+                raise error
+            return response
+
+        logger.warning('Retrying %s %s in %.2f seconds, attempt %s', method, url, wait, attempt)
+        time.sleep(wait)
+
+
+def get_exception_status_code(exception: Exception) -> int or None:
+    """
+    Get the HTTP status code an SDK exception was raised for
+    :param exception: Fyle / QBO SDK exception
+    :return: status code, None if unknown
+    """
+    if exception.__class__.__name__ == 'InternalServerError':
+        return 500
+
+    match = re.match(r'Error: (\d+)', str(getattr(exception, 'message', '')))
+    return int(match.group(1)) if match else None
+
+
+def call_with_retry(func: Callable, idempotent: bool = True, retry_after: Callable = None):
+    """
+    Call an SDK function, retrying connection errors and retryable status codes
+    until RETRY_MAX_ATTEMPTS or RETRY_DEADLINE seconds are reached.
+    The SDKs raise errors without the response, so Retry-After is only honoured
+    when the caller can hand it over through retry_after
+    :param func: function without arguments making the request
+    :param idempotent: True if repeating the request has no extra effect
+    :param retry_after: function without arguments returning the seconds the server asked to wait, or None
+    :return: result of func
+    """
+    deadline = time.monotonic() + settings.RETRY_DEADLINE
+    attempt = 0
+
+    while True:
+        attempt += 1
+
+        try:
+            return func()
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as exception:
+            # A read timeout may come after the server processed the request
+            if not idempotent and not isinstance(exception, requests.exceptions.ConnectTimeout):
+                raise
+            error = exception
+        except Exception as exception:
+            status_code = get_exception_status_code(exception)
+            if status_code is None or not is_retryable_status_code(status_code, idempotent):
+                raise
+            error = exception
+
+        wait = retry_after() if retry_after is not None else None
+
+        if wait is None:
+            wait = get_backoff(attempt)
+
+        if attempt >= settings.RETRY_MAX_ATTEMPTS or time.monotonic() + wait > deadline:
+            raise error
+
+        logger.warning('Retrying %s in %.2f seconds, attempt %s', getattr(func, '__name__', func), wait, attempt)
+        time.sleep(wait)
+
+
+def get_redis_connection() -> redis.Redis or None:
+    """
+    Get the process wide Redis connection
+    :return: Redis connection, None if REDIS_URL is not configured
+    """
+    global _redis_connection  # pylint: disable=global-statement
+
+    if not settings.REDIS_URL:
+        return None
+
+    with _redis_connection_lock:
+        if _redis_connection is None:
+            _redis_connection = redis.Redis.from_url(settings.REDIS_URL)
+
+        return _redis_connection
+
+
+class TokenBucketRateLimiter:
+    """
+    Token bucket rate limiter shared across processes through Redis, or local to the process without Redis
+    """
+    # Refills and takes a token atomically on the Redis clock, returns the seconds to wait when the bucket is empty
+    TAKE_TOKEN_SCRIPT = """
+        redis.replicate_commands()
+        local capacity = tonumber(ARGV[1])
+        local refill_rate = tonumber(ARGV[2])
+        local time = redis.call('TIME')
+        local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+        local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'timestamp')
+        local tokens = tonumber(bucket[1]) or capacity
+        local timestamp = tonumber(bucket[2]) or now
+        tokens = math.min(capacity, tokens + math.max(0, now - timestamp) * refill_rate)
+        local wait = 0
+        if tokens >= 1 then
+            tokens = tokens - 1
+        else
+            wait = (1 - tokens) / refill_rate
+        end
+        redis.call('HMSET', KEYS[1], 'tokens', tostring(tokens), 'timestamp', tostring(now))
+        redis.call('EXPIRE', KEYS[1], math.ceil(capacity / refill_rate) + 1)
+        return tostring(wait)
+    """
+
+    _local_buckets = {}
+    _local_buckets_lock = threading.Lock()
+    _local_bucket_warned = False
+
+    def __init__(self, key: str, capacity: int, refill_rate: float):
+        """
+        :param key: bucket key
+        :param capacity: maximum burst of requests
+        :param refill_rate: tokens added per second
+        """
+        self.key = key
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.redis_connection = get_redis_connection()
+
+        if self.redis_connection is None and not TokenBucketRateLimiter._local_bucket_warned:
+            TokenBucketRateLimiter._local_bucket_warned = True
+            logger.warning(
+                'REDIS_URL is not set, rate limits are enforced per process and every worker gets the full limit'
+            )
+
+    def __take_token(self) -> float:
+        """
+        Take a token if available
+        :return: seconds to wait for the next token, 0 if a token was taken
+        """
+        if self.redis_connection is not None:
+            return float(self.redis_connection.eval(
+                TokenBucketRateLimiter.TAKE_TOKEN_SCRIPT, 1, self.key, self.capacity, self.refill_rate
+            ))
+
+        with TokenBucketRateLimiter._local_buckets_lock:
+            now = time.monotonic()
+            tokens, timestamp = TokenBucketRateLimiter._local_buckets.get(self.key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + max(0, now - timestamp) * self.refill_rate)
+
+            wait = 0
+            if tokens >= 1:
+                tokens = tokens - 1
+            else:
+                wait = (1 - tokens) / self.refill_rate
+
+            TokenBucketRateLimiter._local_buckets[self.key] = (tokens, now)
+            return wait
+
+    def acquire(self) -> float:
+        """
+        Block until a token is taken
+        :return: seconds spent waiting
+        """
+        waited = 0
+        wait = self.__take_token()
+
+        while wait > 0:
+            time.sleep(wait)
+            waited += wait
+            wait = self.__take_token()
+
+        if waited:
+            logger.info('Rate limiter %s waited %.3f seconds', self.key, waited)
+
+            if self.redis_connection is not None:
+                self.redis_connection.incrbyfloat('{0}:wait_seconds'.format(self.key), waited)
+
+        return waited
+
+
+class InFlightBytesLimiter:
+    """
+    Caps the bytes held in memory by concurrent workers, workers reserve bytes before loading them
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.in_flight_bytes = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, size: int, block: bool = True):
+        """
+        Reserve bytes, blocking until they fit under the cap. A reservation larger than the cap
+        is let through once nothing else is in flight
+        :param size: number of bytes
+        :param block: False to account bytes already held without waiting
+        :return: None
+        """
+        with self.condition:
+            if block:
+                self.condition.wait_for(
+                    lambda: self.in_flight_bytes == 0 or self.in_flight_bytes + size <= self.max_bytes
+                )
+
+            self.in_flight_bytes += size
+
+    def release(self, size: int):
+        """
+        Release bytes no longer held in memory
+        :param size: number of bytes
+        :return: None
+        """
+        with self.condition:
+            self.in_flight_bytes -= size
+            self.condition.notify_all()
+
+
+def chunk_list(items: List, chunk_size: int) -> List[List]:
+    """
+    Split a list into chunks
+    :param items: list of items
+    :param chunk_size: maximum size of each chunk
+    :return: list of chunks
+    """
+    return [items[index:index + chunk_size] for index in range(0, len(items), chunk_size)]
+
+
+def bulk_upsert(model, rows: List[Dict], conflict_field: str, update_fields: List[str] = None,
+                skip_unchanged: bool = False, chunk_size: int = None, scope_fields: List[str] = None) -> List:
+    """
+    Insert rows or update them on conflict, one INSERT ... ON CONFLICT statement per chunk
+    :param model: Django model class
+    :param rows: list of field name -> value dicts, all having the same keys
+    :param conflict_field: unique field used as the conflict target
+    :param update_fields: fields overwritten when the row already exists, defaults to every other field
+    :param skip_unchanged: leave existing rows alone when none of the update_fields changed
+    :param chunk_size: number of rows per statement
+    :param scope_fields: fields an existing row must share with the incoming one to be updated, a conflicting
+                         row outside this scope (e.g. another workspace) raises IntegrityError
+    :return: model instances with upsert_action set to INSERTED / UPDATED / UNCHANGED
+    """
+    if not rows:
+        return []
+
+    chunk_size = chunk_size or settings.BULK_UPSERT_CHUNK_SIZE
+
+    # Postgres cannot update the same row twice in one statement, the last occurrence of a key wins
+    rows = list({row[conflict_field]: row for row in rows}.values())
+
+    quote_name = connection.ops.quote_name
+    opts = model._meta
+    table = quote_name(opts.db_table)
+
+    keys = list(rows[0].keys())
+    fields = [opts.get_field(key) for key in keys]
+    timestamp_fields = [
+        field for field in opts.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    # columns left out of the rows get their model default, the database has none for fields added by migrations
+    default_fields = [
+        field for field in opts.concrete_fields
+        if field.has_default() and not field.primary_key and field not in timestamp_fields
+        and field.name not in keys and field.attname not in keys
+    ]
+    conflict_column = quote_name(opts.get_field(conflict_field).column)
+    update_fields = update_fields or [key for key in keys if key != conflict_field]
+    update_columns = [quote_name(opts.get_field(name).column) for name in update_fields]
+
+    columns = [quote_name(field.column) for field in fields + default_fields] + \
+        [quote_name(field.column) for field in timestamp_fields]
+    row_placeholder = '({0})'.format(
+        ', '.join(['%s'] * (len(fields) + len(default_fields)) + ['now()'] * len(timestamp_fields))
+    )
+
+    assignments = ['{0} = EXCLUDED.{0}'.format(column) for column in update_columns]
+    assignments.extend(
+        '{0} = now()'.format(quote_name(field.column)) for field in timestamp_fields if field.auto_now
+    )
+
+    scope_fields = scope_fields or []
+    scope_columns = [quote_name(opts.get_field(name).column) for name in scope_fields]
+
+    conditions = ['{0}.{1} = EXCLUDED.{1}'.format(table, column) for column in scope_columns]
+    if skip_unchanged:
+        conditions.append('({0}) IS DISTINCT FROM ({1})'.format(
+            ', '.join('{0}.{1}'.format(table, column) for column in update_columns),
+            ', '.join('EXCLUDED.{0}'.format(column) for column in update_columns)
+        ))
+
+    condition = 'WHERE {0}'.format(' AND '.join(conditions)) if conditions else ''
+
+    upserted_objects = []
+
+    for chunk in chunk_list(rows, chunk_size):
+        params = []
+        for row in chunk:
+            params.extend(field.get_db_prep_save(row[key], connection) for key, field in zip(keys, fields))
+            params.extend(field.get_db_prep_save(field.get_default(), connection) for field in default_fields)
+
+        sql = """
+            WITH upserted AS (
+                INSERT INTO {table} ({columns}) VALUES {values}
+                ON CONFLICT ({conflict_column}) DO UPDATE SET {assignments} {condition}
+                RETURNING {table}.*, CASE WHEN xmax = 0 THEN 'INSERTED' ELSE 'UPDATED' END AS upsert_action
+            )
+            SELECT * FROM upserted
+        """.format(
+            table=table,
+            columns=', '.join(columns),
+            values=', '.join([row_placeholder] * len(chunk)),
+            conflict_column=conflict_column,
+            assignments=', '.join(assignments),
+            condition=condition
+        )
+
+        if skip_unchanged:
+            # rows filtered out by the WHERE clause are not returned, read them from the statement snapshot
+            sql = """
+                {upsert}
+                UNION ALL
+                SELECT {table}.*, 'UNCHANGED' AS upsert_action FROM {table}
+                WHERE ({key_columns}) IN ({keys})
+                AND {table}.{conflict_column} NOT IN (SELECT {conflict_column} FROM upserted)
+            """.format(
+                upsert=sql,
+                table=table,
+                conflict_column=conflict_column,
+                key_columns=', '.join('{0}.{1}'.format(table, column) for column in [conflict_column] + scope_columns),
+                keys=', '.join(['({0})'.format(', '.join(['%s'] * (1 + len(scope_columns))))] * len(chunk))
+            )
+            for row in chunk:
+                params.extend(
+                    opts.get_field(name).get_db_prep_save(row[name], connection)
+                    for name in [conflict_field] + scope_fields
+                )
+
+        chunk_objects = list(model.objects.raw(sql, params))
+
+        if len(chunk_objects) != len(chunk):
+            upserted_keys = {getattr(chunk_object, conflict_field) for chunk_object in chunk_objects}
+            raise IntegrityError('{0} rows conflict on {1} outside of {2}: {3}'.format(
+                model.__name__, conflict_field, ', '.join(scope_fields),
+                [row[conflict_field] for row in chunk if row[conflict_field] not in upserted_keys]
+            ))
+
+        upserted_objects.extend(chunk_objects)
+
+    return upserted_objects
@@ -18,10 +18,25 @@ export FYLE_CLIENT_ID=FYLE CLIENT ID
 export FYLE_CLIENT_SECRET=FYLE CLIENT SECRET
 export FYLE_TOKEN_URI=FYLE TOKEN URI
 export FYLE_JOBS_URL=FYLE JOBS URL
+export FYLE_JOBS_BATCH_CALLBACK=True/False
 
 # QBO Settings
 export QBO_CLIENT_ID=QBO CLIENT ID
 export QBO_CLIENT_SECRET=QBO CLIENT SECRET
 export QBO_REDIRECT_URI=QBO REDIRECT URI
 export QBO_TOKEN_URI=QBO TOKEN URI
-export QBO_ENVIRONMENT=SANDBOX/PRODUCTION
\ No newline at end of file
+export QBO_ENVIRONMENT=SANDBOX/PRODUCTION
+export QBO_BATCH_EXPORT=True/False
+export QBO_BATCH_SIZE=QBO BATCH SIZE
+
+# HTTP Settings
+export HTTP_POOL_CONNECTIONS=HTTP POOL CONNECTIONS
+export HTTP_POOL_SIZE=HTTP POOL SIZE
+export HTTP_KEEP_ALIVE=True/False
+
+# Django-Q Settings
+export Q_CLUSTER_WORKERS=NUMBER OF WORKERS
+export Q_CLUSTER_REDIS_HOST=REDIS HOST, UNSET TO USE THE DATABASE AS BROKER
+
+# Redis Settings
+export REDIS_URL=REDIS URL